@@ -0,0 +1,171 @@
+# Admission control — per-endpoint concurrency limits with a bounded wait queue
+#
+# Each endpoint group (queries, uploads) runs at most N requests at once; up to
+# M more wait in FIFO order. Once the queue is full a request is turned away
+# immediately with 429, and one that waited ADMISSION_QUEUE_TIMEOUT_SECONDS
+# (or until its deadline) gets 503 — both with a Retry-After estimated from
+# recent service times. Bursts are shed at the door instead of piling up
+# until every request times out together. Limits are per API worker process.
+#
+# Query requests also get their end-to-end deadline here, so time spent
+# queued counts against it.
+
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import Gauge
+
+from mcp_server.config import (
+    QUERY_CONCURRENCY, QUERY_QUEUE_SIZE, UPLOAD_CONCURRENCY, UPLOAD_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT_SECONDS, QUERY_DEADLINE_SECONDS
+)
+from mcp_server.deadlines import Deadline, deadline_var
+from mcp_server.telemetry import count
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ACTIVE = Gauge("deepretrieve_admission_active", "Requests being served", ["endpoint"])
+ADMISSION_QUEUED = Gauge("deepretrieve_admission_queued", "Requests waiting for a slot", ["endpoint"])
+
+_MAX_RETRY_AFTER = 60
+
+
+class Rejected(Exception):
+    """Request turned away by admission control."""
+
+    def __init__(self, status: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """At most `concurrency` requests in flight; at most `queue_size` waiting (FIFO)."""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._service_seconds = 1.0  # EMA of how long a request holds its slot
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free for a new arrival."""
+        estimate = self._service_seconds * (self.queued + 1) / self.concurrency
+        return max(1, min(_MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def _gauges(self):
+        ADMISSION_ACTIVE.labels(self.name).set(self.active)
+        ADMISSION_QUEUED.labels(self.name).set(self.queued)
+
+    async def acquire(self, deadline: Optional[Deadline] = None):
+        """Take a slot, waiting in the queue if needed. Raises Rejected."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        if self._slots.locked() or self.queued:
+            if self.queued >= self.queue_size:
+                count(f"admission.{self.name}.rejected_queue_full")
+                raise Rejected(429, f"Too many {self.name} requests, queue is full", self.retry_after())
+            timeout = self.queue_timeout if deadline is None else min(self.queue_timeout, deadline.remaining())
+            self.queued += 1
+            self._gauges()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                count(f"admission.{self.name}.rejected_queue_timeout")
+                raise Rejected(503, f"Timed out waiting for a {self.name} slot", self.retry_after())
+            finally:
+                self.queued -= 1
+                self._gauges()
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        self._gauges()
+
+    def release(self, held_seconds: float):
+        self._service_seconds = 0.8 * self._service_seconds + 0.2 * held_seconds
+        self.active -= 1
+        self._gauges()
+        self._slots.release()
+
+    def snapshot(self) -> Dict:
+        return {
+            "concurrency": self.concurrency, "queue_size": self.queue_size,
+            "active": self.active, "queued": self.queued, "retry_after": self.retry_after(),
+        }
+
+
+# Endpoint groups — all routes of a group share its limiter; queries also get a deadline
+limiters: Dict[str, AdmissionLimiter] = {
+    "query": AdmissionLimiter("query", QUERY_CONCURRENCY, QUERY_QUEUE_SIZE),
+    "upload": AdmissionLimiter("upload", UPLOAD_CONCURRENCY, UPLOAD_QUEUE_SIZE),
+}
+_DEADLINES = {"query": QUERY_DEADLINE_SECONDS}
+_ROUTES: List[Tuple[str, str, re.Pattern]] = [
+    ("query", "POST", re.compile(r"^/api/v1/query(-stream)?$")),
+    ("upload", "POST", re.compile(r"^/api/v1/upload(-stream)?$")),
+    ("upload", "PUT", re.compile(r"^/api/v1/documents/[^/]+$")),
+]
+
+
+def _group(method: str, path: str) -> Optional[str]:
+    for group, route_method, pattern in _ROUTES:
+        if method == route_method and pattern.match(path):
+            return group
+    return None
+
+
+class AdmissionMiddleware:
+    """Apply the endpoint group's limiter (and deadline) around the whole response.
+
+    Plain ASGI so the slot is held until a streamed response has finished and
+    the deadline context variable reaches the endpoint.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        group = _group(scope.get("method", ""), scope.get("path", "")) if scope["type"] == "http" else None
+        if group is None:
+            return await self.app(scope, receive, send)
+
+        limiter = limiters[group]
+        deadline = Deadline(_DEADLINES[group]) if group in _DEADLINES else None
+        try:
+            await limiter.acquire(deadline)
+        except Rejected as e:
+            logger.warning(f"🚦 [ADMISSION] {group}: {e.status} {e.detail} (retry after {e.retry_after}s)")
+            return await _reject(send, e)
+
+        start = time.monotonic()
+        token = deadline_var.set(deadline) if deadline is not None else None
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if token is not None:
+                deadline_var.reset(token)
+            limiter.release(time.monotonic() - start)
+
+
+async def _reject(send, rejection: Rejected):
+    body = json.dumps({"detail": rejection.detail, "retry_after": rejection.retry_after}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": rejection.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(rejection.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
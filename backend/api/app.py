@@ -1,14 +1,67 @@
 # DeepRetrieve FastAPI Application
 
+import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from mcp_server.telemetry import configure_logging, new_request_id, metrics_payload
+from mcp_server.profiling import PROFILE_HEADER, should_profile, profile_request
+from .admission import AdmissionMiddleware
 from .routes import router
 
 
+class RequestIdMiddleware:
+    """Bind an X-Request-ID (the caller's, or a fresh one) to each request and echo it back.
+
+    Plain ASGI rather than BaseHTTPMiddleware so the context variable is set in
+    the same context the endpoint (and any SSE generator) runs in.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = new_request_id(incoming)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
+
+
+class ProfilingMiddleware:
+    """Profile one API request on demand: X-DeepRetrieve-Profile header or an armed slot.
+
+    Runs inside RequestIdMiddleware so the saved profile is named after the request ID.
+    Admin routes and /metrics never consume an armed slot.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/api/v1/") or path.startswith("/api/v1/admin"):
+            return await self.app(scope, receive, send)
+
+        header = dict(scope["headers"]).get(PROFILE_HEADER.encode(), b"").decode("latin-1")
+        # The event-loop thread serves every request at once, so only the request's
+        # executor threads (run_in_context) are sampled
+        with profile_request(f"{scope['method']} {path}", enabled=should_profile(header), register_thread=False):
+            await self.app(scope, receive, send)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    configure_logging()
     print("🚀 Starting DeepRetrieve API (Local Mode)...")
     print("📦 Initializing services...")
     
@@ -17,9 +70,14 @@ async def lifespan(app: FastAPI):
     client = get_qdrant_client()
     create_collection(COLLECTION_NAME)
     
+    # Start background ingestion workers
+    from .jobs import ingestion_queue
+    await ingestion_queue.start()
+    
     print("✅ All services ready!")
     yield
     print("👋 Shutting down...")
+    await ingestion_queue.stop()
 
 
 app = FastAPI(
@@ -29,20 +87,47 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Innermost of the middlewares: rejections still get CORS headers and a request ID
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
+import re
 from fastapi.staticfiles import StaticFiles
 from mcp_server.config import IMAGES_FOLDER
 
+# Content-hash image names (see api/image_store.py) never change meaning
+_CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{32}\.\w+$")
+
+
+class ImageFiles(StaticFiles):
+    """Serves extracted images; content-addressed files are cached as immutable."""
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _CONTENT_ADDRESSED.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
 app.include_router(router, prefix="/api/v1", tags=["RAG"])
-app.mount("/images", StaticFiles(directory=str(IMAGES_FOLDER)), name="images")
+app.mount("/images", ImageFiles(directory=str(IMAGES_FOLDER)), name="images")
 
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "DeepRetrieve API", "docs": "/docs"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms and pipeline counters."""
+    content, media_type = metrics_payload()
+    return Response(content=content, media_type=media_type)
@@ -0,0 +1,204 @@
+# Bulk directory ingestion with a resumable checkpoint manifest
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_NAME = ".deepretrieve_manifest.jsonl"
+
+
+def _sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def find_pdfs(directory: Path) -> List[Path]:
+    """All PDFs under directory, in a stable order."""
+    return sorted(p for p in directory.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf")
+
+
+class Manifest:
+    """Append-only JSONL checkpoint of processed documents.
+
+    One line per finished document, flushed and fsynced as soon as it is
+    written, so an interrupted run loses at most the documents in flight.
+    The last line for a path wins.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from a crash
+                    self.entries[entry["path"]] = entry
+
+    def is_done(self, rel_path: str, stat: os.stat_result) -> bool:
+        entry = self.entries.get(rel_path)
+        return (
+            entry is not None
+            and entry.get("status") == "done"
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime") == stat.st_mtime
+        )
+
+    def record(self, entry: Dict):
+        with self._lock:
+            self.entries[entry["path"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _ingest_one(pdf_path: Path, rel_path: str, namespace: Optional[str] = None, content_hash: Optional[str] = None) -> Dict:
+    """Process one PDF and return its manifest entry."""
+    import fitz
+    from .documents import get_registry, ingest_document
+    from mcp_server.retriever import find_document_by_hash
+
+    stat = pdf_path.stat()
+    entry = {"path": rel_path, "size": stat.st_size, "mtime": stat.st_mtime}
+    start = time.perf_counter()
+
+    try:
+        content_hash = content_hash or _sha256_file(pdf_path)
+        entry["sha256"] = content_hash
+        with fitz.open(pdf_path) as doc:
+            entry["pages"] = doc.page_count
+
+        if find_document_by_hash(content_hash, namespace=namespace) is not None:
+            entry.update(status="done", skipped="duplicate", texts=0, images=0, tables=0)
+        else:
+            # A changed file replaces the version ingested from the same path on an earlier run
+            previous = get_registry(namespace).active_for_filename(rel_path)
+            stats: Dict[str, int] = {}
+            document = ingest_document(
+                str(pdf_path), rel_path, content_hash=content_hash,
+                replaces=previous["doc_id"] if previous else None, stats=stats, namespace=namespace
+            )
+            entry.update(
+                status="done", doc_id=document["doc_id"], replaced=document["replaced"],
+                texts=document["texts"], images=document["images"], tables=document["tables"], **stats
+            )
+
+    except Exception as e:
+        entry.update(status="failed", error=str(e))
+
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def ingest_directory(
+    directory: str, workers: int = 2, manifest_path: Optional[str] = None, namespace: Optional[str] = None
+) -> Dict:
+    """Ingest every PDF under directory across a worker pool, resuming from the manifest.
+
+    Documents go to the given namespace (default namespace if None).
+    Returns aggregate stats including pages/s and chunks/s over this run.
+    """
+    from mcp_server.retriever import ensure_namespace
+
+    root = Path(directory).resolve()
+    if not root.is_dir():
+        raise NotADirectoryError(f"Not a directory: {root}")
+
+    manifest = Manifest(Path(manifest_path) if manifest_path else root / MANIFEST_NAME)
+    namespace = ensure_namespace(namespace).name
+
+    pending = []
+    duplicates = []  # (pdf_path, rel_path, content_hash, rel_path of the copy that is ingested)
+    first_by_hash: Dict[str, str] = {}
+    skipped = 0
+    for pdf_path in find_pdfs(root):
+        rel_path = pdf_path.relative_to(root).as_posix()
+        if manifest.is_done(rel_path, pdf_path.stat()):
+            skipped += 1
+            continue
+        # Identical files in one run are ingested once: the workers' own duplicate
+        # check can't see documents another worker is still ingesting
+        content_hash = _sha256_file(pdf_path)
+        if content_hash in first_by_hash:
+            duplicates.append((pdf_path, rel_path, content_hash, first_by_hash[content_hash]))
+        else:
+            first_by_hash[content_hash] = rel_path
+            pending.append((pdf_path, rel_path, content_hash))
+
+    print(
+        f"📚 [BULK] {len(pending)} PDFs to ingest, {len(duplicates)} duplicate copies, "
+        f"{skipped} already checkpointed ({manifest.path})"
+    )
+
+    totals = {"documents": 0, "failed": 0, "pages": 0, "texts": 0, "images": 0, "tables": 0,
+              "caption_cache_hits": 0, "caption_cache_misses": 0}
+    start = time.perf_counter()
+
+    status_by_path: Dict[str, str] = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bulk-ingest")
+    try:
+        futures = {executor.submit(_ingest_one, p, rel, namespace, h): rel for p, rel, h in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            entry = future.result()
+            manifest.record(entry)
+            status_by_path[entry["path"]] = entry["status"]
+
+            if entry["status"] == "done":
+                totals["documents"] += 1
+                if not entry.get("skipped"):
+                    totals["pages"] += entry.get("pages", 0)
+                for key in ("texts", "images", "tables", "caption_cache_hits", "caption_cache_misses"):
+                    totals[key] += entry.get(key, 0)
+                print(f"  [{i}/{len(pending)}] ✅ {entry['path']} ({entry.get('pages', 0)} pages, {entry['seconds']}s)")
+            else:
+                totals["failed"] += 1
+                print(f"  [{i}/{len(pending)}] ❌ {entry['path']}: {entry.get('error')}")
+    except KeyboardInterrupt:
+        print("\n🛑 [BULK] Interrupted — completed documents are checkpointed, re-run to resume")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    # A copy is checkpointed only once the file it duplicates was ingested
+    for pdf_path, rel_path, content_hash, original in duplicates:
+        stat = pdf_path.stat()
+        entry = {"path": rel_path, "size": stat.st_size, "mtime": stat.st_mtime, "sha256": content_hash, "seconds": 0.0}
+        if status_by_path.get(original) == "done":
+            entry.update(status="done", skipped="duplicate", duplicate_of=original, texts=0, images=0, tables=0)
+            totals["documents"] += 1
+        else:
+            entry.update(status="failed", error=f"duplicate of {original}, which failed")
+            totals["failed"] += 1
+        manifest.record(entry)
+
+    elapsed = time.perf_counter() - start
+    chunks = totals["texts"] + totals["images"] + totals["tables"]
+    totals.update(
+        skipped=skipped,
+        chunks=chunks,
+        seconds=round(elapsed, 2),
+        pages_per_second=round(totals["pages"] / elapsed, 3) if elapsed else 0.0,
+        chunks_per_second=round(chunks / elapsed, 3) if elapsed else 0.0,
+    )
+
+    print(
+        f"📊 [BULK] {totals['documents']} docs ({totals['failed']} failed) in {elapsed:.1f}s — "
+        f"{totals['pages_per_second']} pages/s, {totals['chunks_per_second']} chunks/s, "
+        f"caption cache {totals['caption_cache_hits']}/{totals['caption_cache_hits'] + totals['caption_cache_misses']} hits"
+    )
+    return totals
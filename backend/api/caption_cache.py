@@ -0,0 +1,139 @@
+# Persistent image caption cache — shared across documents and restarts
+#
+# Keyed by the SHA-256 of the embedded image bytes (exact copies). Only
+# [Figure] captions (BLIP, no text read) also answer for a near-identical
+# image — same size, 256-bit difference hash within a few bits — so the same
+# figure re-encoded in another PDF is still a hit. Text read by OCR is never
+# reused across different bytes: slides and charts from one template look
+# alike but say different things. Entries are tagged with the captioning
+# models that produced them, so a degraded OCR-only caption never answers
+# once BLIP is available again.
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from mcp_server.config import CAPTION_CACHE_PATH
+
+_HASH_SIZE = 16  # 16×16 difference hash → 256 bits
+_MAX_DISTANCE = 8  # Differing bits still treated as the same figure
+_MAX_CANDIDATES = 200  # Same-size figures compared per lookup
+_FIGURE_PREFIX = "[Figure]"
+
+
+def perceptual_hash(pil_image: Image.Image) -> str:
+    """`WxH:dhash` — 256-bit difference hash of a 17×16 grayscale thumbnail, plus the image size."""
+    width = _HASH_SIZE + 1
+    small = pil_image.convert("L").resize((width, _HASH_SIZE), Image.BILINEAR)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(_HASH_SIZE):
+        for col in range(_HASH_SIZE):
+            bits = (bits << 1) | (pixels[row * width + col] > pixels[row * width + col + 1])
+    w, h = pil_image.size
+    return f"{w}x{h}:{bits:0{_HASH_SIZE * _HASH_SIZE // 4}x}"
+
+
+def _distance(a: str, b: str) -> Optional[int]:
+    """Hamming distance of two perceptual_hash() values of the same size, else None."""
+    size_a, _, bits_a = a.partition(":")
+    size_b, _, bits_b = b.partition(":")
+    if size_a != size_b or len(bits_a) != len(bits_b):
+        return None  # Different size, or a hash from an older format
+    return bin(int(bits_a, 16) ^ int(bits_b, 16)).count("1")
+
+
+class CaptionCache:
+    """SQLite-backed map from image hash to caption. Safe to share across threads."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # A forked API worker must open its own connection
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS captions (
+                    image_hash TEXT NOT NULL,
+                    models TEXT NOT NULL,
+                    phash TEXT NOT NULL,
+                    caption TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (image_hash, models)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS captions_phash ON captions (phash, models)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, image_hash: str, phash: str, models: str) -> Optional[str]:
+        """Cached caption for these bytes (or, for [Figure] captions, a near-identical image), else None."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT rowid, caption FROM captions WHERE image_hash = ? AND models = ?",
+                (image_hash, models),
+            ).fetchone()
+            if row is None:
+                row = self._nearest_figure(conn, phash, models)
+            if row is None:
+                return None
+            conn.execute("UPDATE captions SET hits = hits + 1 WHERE rowid = ?", (row[0],))
+            conn.commit()
+            return row[1]
+
+    @staticmethod
+    def _nearest_figure(conn: sqlite3.Connection, phash: str, models: str):
+        """Closest same-size [Figure] entry within _MAX_DISTANCE bits, as (rowid, caption)."""
+        size = phash.partition(":")[0]
+        # Range over the phash index: every hash of this size starts with "WxH:"
+        candidates = conn.execute(
+            "SELECT rowid, caption, phash FROM captions "
+            "WHERE phash >= ? AND phash < ? AND models = ? AND caption LIKE ? LIMIT ?",
+            (f"{size}:", f"{size};", models, f"{_FIGURE_PREFIX}%", _MAX_CANDIDATES),
+        ).fetchall()
+        best = None
+        for rowid, caption, other in candidates:
+            distance = _distance(phash, other)
+            if distance is not None and distance <= _MAX_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, rowid, caption)
+        return None if best is None else best[1:]
+
+    def put(self, image_hash: str, phash: str, models: str, caption: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO captions (image_hash, models, phash, caption, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (image_hash, models, phash, caption, time.time()),
+            )
+            conn.commit()
+
+    def clear(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM captions").rowcount
+            conn.commit()
+            return deleted
+
+
+# Module-level singleton — shared across all calls within a server process
+caption_cache = CaptionCache(CAPTION_CACHE_PATH)
@@ -0,0 +1,70 @@
+# Cheap pre-classifier that picks a captioning model before any model runs
+#
+# Looks only at a downscaled copy of the image: text-dominant images (slides,
+# screenshots, scanned paragraphs) have a large uniform background, little
+# color and dense short strokes; photos and rendered figures have no dominant
+# background or strong color. Anything in between runs both models as before.
+
+from dataclasses import dataclass, field
+from typing import Dict
+
+from PIL import Image
+
+# Routes
+ROUTE_OCR = "ocr"      # EasyOCR only (BLIP if OCR finds too little text)
+ROUTE_BLIP = "blip"    # BLIP only (EasyOCR if BLIP returns nothing)
+ROUTE_BOTH = "both"    # Previous behaviour: EasyOCR, then BLIP
+
+_ANALYSIS_SIZE = 256       # Longest side of the copy the features are computed on
+_EDGE_THRESHOLD = 48       # Luminance step counted as an edge
+_BACKGROUND_TOLERANCE = 10  # ± luminance around the modal value counted as background
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    reason: str
+    features: Dict[str, float] = field(default_factory=dict)
+
+
+def image_features(pil_image: Image.Image) -> Dict[str, float]:
+    """Background share, edge density and colorfulness of a downscaled copy."""
+    import numpy as np
+
+    small = pil_image.convert("RGB")
+    small.thumbnail((_ANALYSIS_SIZE, _ANALYSIS_SIZE), Image.BILINEAR)
+    rgb = np.asarray(small, dtype=np.int32)
+    gray = (rgb[..., 0] * 299 + rgb[..., 1] * 587 + rgb[..., 2] * 114) // 1000
+
+    hist = np.bincount(gray.ravel(), minlength=256)
+    mode = int(hist.argmax())
+    lo, hi = max(0, mode - _BACKGROUND_TOLERANCE), min(255, mode + _BACKGROUND_TOLERANCE)
+    background_share = hist[lo:hi + 1].sum() / gray.size
+
+    dx = np.abs(np.diff(gray, axis=1)) > _EDGE_THRESHOLD
+    dy = np.abs(np.diff(gray, axis=0)) > _EDGE_THRESHOLD
+    edge_density = (dx.sum() + dy.sum()) / max(dx.size + dy.size, 1)
+
+    # Hasler & Süsstrunk colorfulness: ~0 for grayscale, >40 for vivid photos
+    rg = rgb[..., 0] - rgb[..., 1]
+    yb = (rgb[..., 0] + rgb[..., 1]) / 2 - rgb[..., 2]
+    colorfulness = float(np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean()))
+
+    return {
+        "background_share": round(float(background_share), 3),
+        "edge_density": round(float(edge_density), 4),
+        "colorfulness": round(colorfulness, 1),
+    }
+
+
+def route_image(pil_image: Image.Image) -> RouteDecision:
+    """Choose which captioning model to run for an image."""
+    f = image_features(pil_image)
+
+    if f["background_share"] >= 0.6 and f["colorfulness"] < 20 and f["edge_density"] >= 0.03:
+        return RouteDecision(ROUTE_OCR, "uniform background with dense strokes", f)
+    if f["background_share"] < 0.35:
+        return RouteDecision(ROUTE_BLIP, "no dominant background", f)
+    if f["colorfulness"] >= 45 and f["edge_density"] < 0.08:
+        return RouteDecision(ROUTE_BLIP, "colorful with few strokes", f)
+    return RouteDecision(ROUTE_BOTH, "ambiguous", f)
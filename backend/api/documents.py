@@ -0,0 +1,297 @@
+# Document registry — per-document delete and atomic replace
+#
+# Every ingested PDF gets a doc_id that is stored on all of its Qdrant points,
+# plus a registry row (filename, hash, chunk counts) and the list of image,
+# thumbnail and table files it wrote. Images are content-addressed and may be
+# shared between documents, so a file is only removed once no other
+# registered document references it. Each namespace has its own registry,
+# next to its own artifact folders.
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from mcp_server.namespaces import get_namespace
+
+logger = logging.getLogger(__name__)
+
+# Document states
+INDEXING = "indexing"
+ACTIVE = "active"
+
+
+class DocumentBusy(Exception):
+    """The document is still being ingested; cancel its job instead of deleting it."""
+
+
+class DocumentRegistry:
+    """SQLite-backed table of ingested documents and the artifact files they own."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # A forked API worker must open its own connection
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    content_hash TEXT,
+                    status TEXT NOT NULL,
+                    texts INTEGER NOT NULL DEFAULT 0,
+                    images INTEGER NOT NULL DEFAULT 0,
+                    tables INTEGER NOT NULL DEFAULT 0,
+                    replaces TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS artifacts (
+                    doc_id TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (doc_id, path)
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS documents_filename ON documents (filename)")
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_path ON artifacts (path)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add(self, doc_id: str, filename: str, content_hash: Optional[str], replaces: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO documents (doc_id, filename, content_hash, status, replaces, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, filename, content_hash, INDEXING, replaces, now, now),
+            )
+            conn.commit()
+
+    def activate(self, doc_id: str, texts: int, images: int, tables: int):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE documents SET status = ?, texts = ?, images = ?, tables = ?, updated_at = ? WHERE doc_id = ?",
+                (ACTIVE, texts, images, tables, time.time(), doc_id),
+            )
+            conn.commit()
+
+    def add_artifacts(self, doc_id: str, paths: Iterable[str]):
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR IGNORE INTO artifacts (doc_id, path) VALUES (?, ?)",
+                [(doc_id, str(p)) for p in paths],
+            )
+            conn.commit()
+
+    def get(self, doc_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, filename: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            conn = self._connect()
+            if filename is None:
+                rows = conn.execute("SELECT * FROM documents ORDER BY created_at DESC").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM documents WHERE filename = ? ORDER BY created_at DESC", (filename,)
+                ).fetchall()
+        return [dict(r) for r in rows]
+
+    def active_for_filename(self, filename: str) -> Optional[Dict]:
+        """Latest active document with this filename (the one a re-upload replaces)."""
+        return next((d for d in self.list(filename) if d["status"] == ACTIVE), None)
+
+    def artifacts(self, doc_id: str) -> List[str]:
+        with self._lock:
+            rows = self._connect().execute("SELECT path FROM artifacts WHERE doc_id = ?", (doc_id,)).fetchall()
+        return [r["path"] for r in rows]
+
+    def remove(self, doc_id: str) -> int:
+        """Drop a document's row and artifact refs and delete the files no other document references.
+
+        The files are unlinked before the transaction commits: an ingest claiming
+        one of them (add_artifacts, which needs the write lock) either lands first
+        and keeps it, or waits until it is gone and writes it again.
+        Returns the number of files deleted.
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                paths = [r["path"] for r in conn.execute("SELECT path FROM artifacts WHERE doc_id = ?", (doc_id,))]
+                conn.execute("DELETE FROM artifacts WHERE doc_id = ?", (doc_id,))
+                conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+                removed = _unlink_all([
+                    p for p in paths
+                    if conn.execute("SELECT 1 FROM artifacts WHERE path = ? LIMIT 1", (p,)).fetchone() is None
+                ])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            deleted = conn.execute("DELETE FROM documents").rowcount
+            conn.execute("DELETE FROM artifacts")
+            conn.commit()
+            return deleted
+
+
+# One registry per namespace, shared across all calls within a server process
+_registries: Dict[str, DocumentRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(namespace: Optional[str] = None) -> DocumentRegistry:
+    ns = get_namespace(namespace)
+    with _registries_lock:
+        if ns.name not in _registries:
+            _registries[ns.name] = DocumentRegistry(ns.documents_db)
+        return _registries[ns.name]
+
+
+def _unlink_all(paths: List[str]) -> int:
+    removed = 0
+    for path in paths:
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.info(f"⚠️ Could not delete {path}: {e}")
+    return removed
+
+
+def new_doc_id() -> str:
+    return uuid.uuid4().hex
+
+
+def ingest_document(
+    pdf_path: str,
+    filename: str,
+    content_hash: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    replaces: Optional[str] = None,
+    progress_callback: Optional[Callable] = None,
+    stats: Optional[Dict] = None,
+    namespace: Optional[str] = None
+) -> Dict:
+    """Ingest a PDF as a registered document, optionally replacing another one.
+
+    The new version is written as pending (invisible to search) and published
+    together with the deletion of `replaces` only once processing succeeded.
+    On any failure or cancellation the partial version is removed again and
+    the old one stays untouched.
+    """
+    from .pdf_processor import process_pdf
+    from mcp_server.retriever import publish_document
+
+    namespace = get_namespace(namespace).name
+    registry = get_registry(namespace)
+    doc_id = doc_id or new_doc_id()
+    registry.add(doc_id, filename, content_hash, replaces)
+
+    def claim_artifacts(paths: List[str]):
+        # Referenced as they are written, so a concurrent delete of a document sharing them keeps them
+        registry.add_artifacts(doc_id, paths)
+
+    try:
+        texts, images, tables = process_pdf(
+            pdf_path, original_filename=filename, progress_callback=progress_callback,
+            content_hash=content_hash, stats=stats, doc_id=doc_id, claim_artifacts=claim_artifacts,
+            namespace=namespace
+        )
+        # A reset may have dropped the row meanwhile; publishing would leave unregistered points
+        if registry.get(doc_id) is None:
+            raise RuntimeError(f"Document {doc_id} was removed while it was being indexed")
+        publish_document(doc_id, replaces=replaces, namespace=namespace)
+        registry.activate(doc_id, texts, images, tables)
+    except BaseException:
+        discard_document(doc_id, namespace)
+        raise
+
+    if replaces:
+        removed = registry.remove(replaces)
+        logger.info(f"🔁 [DOC {doc_id[:8]}] Replaced {replaces[:8]} ({removed} old file(s) removed)")
+
+    return {"doc_id": doc_id, "texts": texts, "images": images, "tables": tables, "replaced": replaces}
+
+
+def discard_document(doc_id: str, namespace: Optional[str] = None):
+    """Remove a partially ingested document: its points, registry row and unshared files."""
+    from mcp_server.retriever import delete_points
+
+    try:
+        delete_points("doc_id", doc_id, namespace=namespace)
+    except Exception as e:
+        logger.info(f"⚠️ [DOC {doc_id[:8]}] Could not remove partial points: {e}")
+    get_registry(namespace).remove(doc_id)
+
+
+def delete_document(doc_id: str, namespace: Optional[str] = None) -> Optional[Dict]:
+    """Delete one document's points and the files only it referenced. None if unknown.
+
+    Raises DocumentBusy while the document is still being indexed.
+    """
+    from mcp_server.retriever import delete_points
+
+    registry = get_registry(namespace)
+    document = registry.get(doc_id)
+    if document is None:
+        return None
+    if document["status"] == INDEXING:
+        raise DocumentBusy(f"Document {doc_id} is still being indexed")
+    points = delete_points("doc_id", doc_id, namespace=namespace)
+    files = registry.remove(doc_id)
+    logger.info(f"🗑️ [DOC {doc_id[:8]}] Deleted {document['filename']}: {points} points, {files} file(s)")
+    return {"doc_id": doc_id, "filename": document["filename"], "points_deleted": points, "files_deleted": files}
+
+
+def delete_source(source: str, namespace: Optional[str] = None) -> Dict:
+    """Delete every document ingested under this filename, including points from before the registry.
+
+    Documents still being indexed are left to their jobs (see `indexing` in the result).
+    """
+    from mcp_server.retriever import delete_points
+
+    documents = get_registry(namespace).list(source)
+    indexing = [d["doc_id"] for d in documents if d["status"] == INDEXING]
+    deleted = [delete_document(d["doc_id"], namespace) for d in documents if d["status"] != INDEXING]
+    deleted = [d for d in deleted if d]
+    # Points ingested before documents were registered only carry `source`; pending ones belong to running jobs
+    legacy_points = delete_points("source", source, namespace=namespace, skip_pending=True)
+    return {
+        "source": source,
+        "documents_deleted": len(deleted),
+        "points_deleted": sum(d["points_deleted"] for d in deleted) + legacy_points,
+        "files_deleted": sum(d["files_deleted"] for d in deleted),
+        "indexing": indexing,
+    }
@@ -0,0 +1,114 @@
+# Content-addressed storage for images extracted from PDFs
+#
+# Files are named by the SHA-256 of the embedded image bytes, so the same
+# figure in two documents is stored once and names never collide across
+# PDFs with the same stem. Browser-native encodings are written as-is;
+# anything else (JPX, JBIG2, TIFF, PNM, ...) is re-encoded once as WebP.
+
+import hashlib
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from PIL import Image, features
+
+from mcp_server.config import THUMBNAIL_SIZE, IMAGE_WEBP_QUALITY
+
+# Encodings every browser can display, keyed by fitz's extract_image "ext"
+_NATIVE_EXTENSIONS = {"jpeg": "jpg", "jpg": "jpg", "png": "png", "webp": "webp", "gif": "gif"}
+_WEBP = features.check("webp")
+
+THUMBS_SUBFOLDER = "thumbs"
+
+
+@dataclass
+class StoredImage:
+    path: Path
+    thumbnail_path: Path
+    image_hash: str
+    size_bytes: int
+    reused: bool  # True if an earlier document already stored these bytes
+
+
+def _write_atomic(path: Path, data: bytes):
+    # A unique temp file per writer: jobs in several workers may store the same image at once
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600; served files must stay readable
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _encode(pil_image: Image.Image, fmt: str, **params) -> bytes:
+    buf = io.BytesIO()
+    pil_image.save(buf, format=fmt, **params)
+    return buf.getvalue()
+
+
+def store_image(
+    img_bytes: bytes,
+    ext: str,
+    pil_image: Image.Image,
+    folder: Path,
+    claim: Optional[Callable[[List[str]], None]] = None
+) -> StoredImage:
+    """Store one extracted image (and its thumbnail) under its content hash.
+
+    img_bytes / ext come straight from doc.extract_image; pil_image is the
+    decoded RGB image, only used when re-encoding or building the thumbnail.
+    claim is called with both paths before they are checked or written, so
+    the caller can reference them before another document's delete decides
+    whether they are still in use.
+    """
+    image_hash = hashlib.sha256(img_bytes).hexdigest()
+    name = image_hash[:32]
+
+    native_ext = _NATIVE_EXTENSIONS.get(ext.lower())
+    if native_ext:
+        path = folder / f"{name}.{native_ext}"
+    else:
+        path = folder / (f"{name}.webp" if _WEBP else f"{name}.png")
+
+    thumbs = folder / THUMBS_SUBFOLDER
+    thumbnail_path = thumbs / (f"{name}.webp" if _WEBP else f"{name}.jpg")
+
+    if claim:
+        claim([str(path), str(thumbnail_path)])
+
+    reused = path.exists() and thumbnail_path.exists()
+    if not path.exists():
+        if native_ext:
+            data = img_bytes
+        elif _WEBP:
+            data = _encode(pil_image, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+        else:
+            data = _encode(pil_image, "PNG")
+        _write_atomic(path, data)
+
+    if not thumbnail_path.exists():
+        thumbs.mkdir(parents=True, exist_ok=True)
+        thumb = pil_image.copy()
+        thumb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR)
+        if _WEBP:
+            data = _encode(thumb, "WEBP", quality=70, method=4)
+        else:
+            data = _encode(thumb, "JPEG", quality=75)
+        _write_atomic(thumbnail_path, data)
+
+    return StoredImage(
+        path=path,
+        thumbnail_path=thumbnail_path,
+        image_hash=image_hash,
+        size_bytes=path.stat().st_size,
+        reused=reused,
+    )
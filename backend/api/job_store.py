@@ -0,0 +1,262 @@
+# Ingestion job table shared by every API worker process
+#
+# Jobs live in SQLite (WAL) instead of process memory, so with several API
+# workers any of them can accept an upload, run it, report its status or
+# cancel it. Workers claim queued jobs with a single UPDATE, which also caps
+# how many jobs run at once across all processes.
+#
+# A claim is a lease: the owner renews it on every progress update and from
+# its janitor. A running job is orphaned once its lease has expired, its
+# owner ran under a different boot of the host, or its owner PID is gone.
+# The PID alone can't prove the owner is alive — after a crash or restart
+# the number may belong to an unrelated process.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+_COLUMNS = (
+    "id", "filename", "path", "priority", "content_hash", "namespace", "doc_id", "replaces",
+    "status", "progress", "message", "result", "error", "created_at", "started_at",
+    "finished_at", "cancel_requested", "profile", "request_id", "owner_pid", "owner_boot", "lease_expires",
+)
+
+
+def _boot_id() -> str:
+    try:
+        with open("/proc/sys/kernel/random/boot_id", encoding="ascii") as f:
+            return f.read().strip()
+    except OSError:
+        return ""  # Unknown (not Linux): orphans are found by lease and PID only
+
+
+BOOT_ID = _boot_id()
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed job table. Rows are plain dicts with the job fields."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # A forked worker must open its own connection
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    content_hash TEXT,
+                    namespace TEXT NOT NULL,
+                    doc_id TEXT NOT NULL,
+                    replaces TEXT,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    profile INTEGER NOT NULL DEFAULT 0,
+                    request_id TEXT,
+                    owner_pid INTEGER,
+                    owner_boot TEXT,
+                    lease_expires REAL
+                )"""
+            )
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner_boot", "TEXT"), ("lease_expires", "REAL")):
+                if column not in existing:  # Table created before leases
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, created_at)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["profile"] = bool(job["profile"])
+        return job
+
+    def insert(self, job: Dict[str, Any]):
+        values = dict(job, result=json.dumps(job["result"]) if job.get("result") else None)
+        with self._lock:
+            self._connect().execute(
+                f"INSERT INTO jobs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                [values.get(c) for c in _COLUMNS],
+            )
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"]) if fields["result"] is not None else None
+        with self._lock:
+            self._connect().execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                [*fields.values(), job_id],
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._row(self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def _select(self, where: str, params: tuple = (), order: str = "created_at DESC") -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(f"SELECT * FROM jobs WHERE {where} ORDER BY {order}", params).fetchall()
+        return [self._row(r) for r in rows]
+
+    def list(self) -> List[Dict[str, Any]]:
+        return self._select("1")
+
+    def find_active(self, where: str, params: tuple) -> Optional[Dict[str, Any]]:
+        jobs = self._select(f"status IN (?, ?) AND {where}", (QUEUED, RUNNING, *params))
+        return jobs[0] if jobs else None
+
+    def latest_for_filename(self, filename: str, since: float) -> Optional[Dict[str, Any]]:
+        jobs = self._select("filename = ? AND created_at >= ?", (filename, since))
+        return jobs[0] if jobs else None
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim(self, owner_pid: int, max_running: int, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """Atomically move the next queued job to running for owner_pid, unless max_running are running.
+
+        The claim is leased for lease_seconds; see renew().
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (RUNNING,)).fetchone()[0]
+                row = None
+                if running < max_running:
+                    row = conn.execute(
+                        "SELECT id FROM jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1", (QUEUED,)
+                    ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, owner_pid = ?, owner_boot = ?, lease_expires = ?, "
+                        "message = ? WHERE id = ?",
+                        (RUNNING, now, owner_pid, BOOT_ID, now + lease_seconds, "Starting processing...", row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if row is None:
+                return None
+            return self._row(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def cancel_queued(self, job_id: str) -> bool:
+        """Cancel a job that no worker has claimed yet. False if it is no longer queued."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET status = ?, message = ?, progress = 100, finished_at = ?, cancel_requested = 1 "
+                "WHERE id = ? AND status = ?",
+                (CANCELLED, "Cancelled", time.time(), job_id, QUEUED),
+            )
+            return cursor.rowcount == 1
+
+    def request_cancel(self, job_id: str) -> bool:
+        """Flag a running job; its owner sees the flag at the next progress update."""
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._connect().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def renew(self, job_ids: List[str], owner_pid: int, lease_seconds: float) -> int:
+        """Extend the leases of jobs owner_pid is running. Returns how many were renewed."""
+        if not job_ids:
+            return 0
+        with self._lock:
+            cursor = self._connect().execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE id IN ({', '.join('?' for _ in job_ids)}) "
+                "AND status = ? AND owner_pid = ? AND owner_boot = ?",
+                (time.time() + lease_seconds, *job_ids, RUNNING, owner_pid, BOOT_ID),
+            )
+            return cursor.rowcount
+
+    def orphaned(self) -> List[Dict[str, Any]]:
+        """Running jobs whose owner is gone: lease expired, host rebooted, or owner PID exited."""
+        now = time.time()
+        return [
+            job for job in self._select("status = ?", (RUNNING,))
+            if job["lease_expires"] is None or job["lease_expires"] < now
+            or (BOOT_ID and job["owner_boot"] != BOOT_ID)
+            or not _pid_alive(job["owner_pid"])
+        ]
+
+    def adopt(self, job: Dict[str, Any], owner_pid: int, lease_seconds: float) -> bool:
+        """Take over an orphaned job (a row from orphaned()) so only one surviving worker cleans it up.
+
+        Fails if the row changed since it was read, e.g. its owner renewed the lease after all.
+        """
+        with self._lock:
+            cursor = self._connect().execute(
+                "UPDATE jobs SET owner_pid = ?, owner_boot = ?, lease_expires = ? "
+                "WHERE id = ? AND status = ? AND owner_pid IS ? AND owner_boot IS ? AND lease_expires IS ?",
+                (owner_pid, BOOT_ID, time.time() + lease_seconds,
+                 job["id"], RUNNING, job["owner_pid"], job["owner_boot"], job["lease_expires"]),
+            )
+            return cursor.rowcount == 1
+
+    def gc(self, cutoff: float) -> int:
+        """Delete finished jobs older than cutoff. Returns how many were removed."""
+        with self._lock:
+            cursor = self._connect().execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED_STATES)}) AND finished_at < ?",
+                (*FINISHED_STATES, cutoff),
+            )
+            return cursor.rowcount
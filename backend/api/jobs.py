@@ -0,0 +1,393 @@
+# Background ingestion jobs — bounded worker pool with priorities and cancellation
+#
+# Jobs are rows in the shared state database (see job_store.py), so with
+# several API workers any of them can accept an upload, report on it or cancel
+# it, and whichever worker has a free slot runs it. INGEST_WORKERS caps the
+# pipelines running at once across all workers. Every job-table access from
+# the event loop goes through the default executor: a write can wait up to the
+# SQLite busy timeout while another worker holds the lock.
+
+import logging
+import asyncio
+import contextvars
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Any, Set
+
+from prometheus_client import Gauge
+
+from mcp_server.config import (
+    INGEST_WORKERS, JOB_RETENTION_SECONDS, JOB_POLL_SECONDS, JOB_LEASE_SECONDS, DEFAULT_NAMESPACE, STATE_DB_PATH
+)
+from mcp_server.profiling import is_profiling, profile_request
+from mcp_server.telemetry import request_id_var
+from .job_store import JobStore, QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED, FINISHED_STATES
+from .progress import progress_channel
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(BaseException):
+    """Raised from the progress callback to abort a running job.
+
+    Derives from BaseException (like asyncio.CancelledError) so the broad
+    `except Exception` blocks inside the extraction stages don't swallow it.
+    """
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    filename: str
+    path: str
+    priority: int = 0
+    content_hash: Optional[str] = None
+    namespace: str = DEFAULT_NAMESPACE
+    doc_id: str = field(default_factory=lambda: uuid.uuid4().hex)  # Registry ID the document gets
+    replaces: Optional[str] = None  # doc_id of the version this upload replaces
+    status: str = QUEUED
+    progress: int = 0
+    message: str = "Queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: bool = False
+    profile: bool = False  # Submitted by a profiled request: the job gets its own profile
+    request_id: str = field(default_factory=request_id_var.get)  # Upload's request ID, kept in the job's logs
+    owner_pid: Optional[int] = None  # Worker process running the job
+    owner_boot: Optional[str] = None  # Host boot the owner runs under (PIDs are only unique within one)
+    lease_expires: Optional[float] = None  # Owner must renew its claim by then, or the job counts as orphaned
+    # Submitter's context; a job picked up by another worker gets a fresh one carrying request_id
+    context: Optional[contextvars.Context] = field(default=None, repr=False, compare=False)
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any], context: Optional[contextvars.Context] = None) -> "IngestionJob":
+        return cls(**{f.name: row[f.name] for f in fields(cls) if f.name != "context"}, context=context)
+
+    def to_row(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name != "context"}
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def progress_state(self) -> Dict[str, Any]:
+        """Payload published on the progress channel."""
+        return {"status": self.message, "progress": self.progress, "state": self.status}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "namespace": self.namespace,
+            "doc_id": self.doc_id,
+            "replaces": self.replaces,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """Priority queue of PDF ingestion jobs drained by a fixed number of workers.
+
+    Each worker claims the next job from the shared job table and runs
+    process_pdf in a dedicated thread pool sized to the worker count. A claim
+    only succeeds while fewer than max_running jobs run in any API worker, so
+    concurrent uploads never run more pipelines at once than configured.
+    Higher priority runs first; ties run in submission order.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, store: Optional[JobStore] = None):
+        self.workers = max(1, workers)
+        self.max_running = self.workers
+        self.store = store or JobStore(STATE_DB_PATH)
+        self._contexts: Dict[str, contextvars.Context] = {}  # Jobs submitted through this process
+        self._running: Set[str] = set()  # Jobs running in this process, whose leases the janitor renews
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List[asyncio.Task] = []
+        self._submitted: Optional[asyncio.Event] = None
+
+    async def start(self):
+        """Start the worker tasks (called from the app lifespan)."""
+        if self._tasks:
+            return
+        self._submitted = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        loop = asyncio.get_running_loop()
+        progress_channel.bind(loop)
+        await loop.run_in_executor(None, self.recover)
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+        logger.info(f"📥 Ingestion queue started with {self.workers} worker(s) (pid {os.getpid()})")
+
+    async def stop(self):
+        """Stop the workers; jobs running in this process are asked to cancel."""
+        loop = asyncio.get_running_loop()
+        for job_id in list(self._running):
+            await loop.run_in_executor(None, self.store.request_cancel, job_id)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def submit(
+        self, path: str, filename: str, priority: int = 0,
+        content_hash: Optional[str] = None, replaces: Optional[str] = None,
+        namespace: str = DEFAULT_NAMESPACE
+    ) -> IngestionJob:
+        """Queue a PDF on disk for ingestion. The job owns the file and deletes it when done.
+
+        With replaces (a registry doc_id), that document is swapped for the new
+        version once the job completes; it is left untouched if the job fails.
+        """
+        if self._submitted is None:
+            raise RuntimeError("Ingestion queue is not running")
+        job = IngestionJob(
+            id=uuid.uuid4().hex, filename=filename, path=path, priority=priority,
+            content_hash=content_hash, namespace=namespace, replaces=replaces, profile=is_profiling(),
+            context=contextvars.copy_context()
+        )
+        self._contexts[job.id] = job.context
+        await asyncio.get_running_loop().run_in_executor(None, self._enqueue, job)
+
+        # Wake local workers and anyone waiting for a job to appear, then arm a fresh event
+        self._submitted.set()
+        self._submitted = asyncio.Event()
+        return job
+
+    def _enqueue(self, job: IngestionJob):
+        self.store.insert(job.to_row())
+        progress_channel.publish(job.id, job.progress_state())
+
+    def _job(self, row: Optional[Dict[str, Any]]) -> Optional[IngestionJob]:
+        return IngestionJob.from_row(row) if row else None
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._job(self.store.get(job_id))
+
+    def latest_for_filename(self, filename: str, since: float = 0.0) -> Optional[IngestionJob]:
+        """Most recent job for a filename submitted after `since` (for the legacy progress route)."""
+        return self._job(self.store.latest_for_filename(filename, since))
+
+    async def wait_for_filename(self, filename: str, since: float, timeout: float) -> Optional[IngestionJob]:
+        """Wait until a job for filename submitted after `since` exists, or timeout.
+
+        Uploads to this worker wake the wait at once; uploads to other workers
+        are seen within JOB_POLL_SECONDS.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await loop.run_in_executor(None, self.latest_for_filename, filename, since)
+            remaining = deadline - loop.time()
+            if job is not None or remaining <= 0 or self._submitted is None:
+                return job
+            try:
+                await asyncio.wait_for(self._submitted.wait(), timeout=min(remaining, JOB_POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+
+    def active_for_hash(self, content_hash: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[IngestionJob]:
+        """A queued or running job for the same file contents in this namespace, if any."""
+        return self._job(self.store.find_active("content_hash = ? AND namespace = ?", (content_hash, namespace)))
+
+    def active_replacing(self, doc_id: str) -> Optional[IngestionJob]:
+        """A queued or running job that replaces this document, if any (doc_ids are unique across namespaces)."""
+        return self._job(self.store.find_active("replaces = ?", (doc_id,)))
+
+    def list(self) -> List[IngestionJob]:
+        return [IngestionJob.from_row(row) for row in self.store.list()]
+
+    def queue_depth(self) -> int:
+        return self.store.count(QUEUED)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished.
+
+        A running job is flagged and stops at its next progress update, in
+        whichever worker runs it.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        if self.store.cancel_queued(job_id):
+            self._contexts.pop(job_id, None)
+            progress_channel.publish(job_id, {"status": "Cancelled", "progress": 100, "state": CANCELLED}, final=True)
+            _unlink(job.path)
+            return True
+        return self.store.request_cancel(job_id)
+
+    def _finish(self, job: IngestionJob, status: str, message: str):
+        job.status = status
+        job.message = message
+        job.progress = 100
+        job.finished_at = time.time()
+        self.store.update(
+            job.id, status=status, message=message, progress=100, finished_at=job.finished_at,
+            result=job.result, error=job.error
+        )
+        progress_channel.publish(job.id, job.progress_state(), final=True)
+        _unlink(job.path)
+
+    def recover(self) -> int:
+        """Fail jobs whose worker process has exited or stopped renewing its lease. Returns how many."""
+        from .documents import discard_document
+
+        orphans = [
+            IngestionJob.from_row(row) for row in self.store.orphaned()
+            if self.store.adopt(row, os.getpid(), JOB_LEASE_SECONDS)
+        ]
+        for job in orphans:
+            discard_document(job.doc_id, job.namespace)
+            job.error = "Worker exited while processing"
+            self._finish(job, FAILED, f"Error: {job.error}")
+            logger.info(f"❌ [JOB {job.id[:8]}] Failed: worker {job.owner_pid} exited while processing {job.filename}")
+        return len(orphans)
+
+    def gc(self) -> int:
+        """Drop finished jobs older than JOB_RETENTION_SECONDS. Returns how many were removed."""
+        return self.store.gc(time.time() - JOB_RETENTION_SECONDS)
+
+    async def _janitor(self):
+        """Renew the leases of jobs running here, fail orphaned jobs, and garbage-collect finished ones.
+
+        Runs a few times per lease, so a long pipeline step without progress
+        updates never lets a live job's lease expire.
+        """
+        loop = asyncio.get_running_loop()
+        interval = JOB_LEASE_SECONDS / 4
+        while True:
+            await asyncio.sleep(interval)
+            removed = await loop.run_in_executor(None, self._housekeeping, list(self._running))
+            if removed:
+                logger.info(f"🧹 Dropped {removed} finished job(s)")
+
+    def _housekeeping(self, running: List[str]) -> int:
+        """One janitor pass (executor side). Returns how many finished jobs were dropped."""
+        self.store.renew(running, os.getpid(), JOB_LEASE_SECONDS)
+        self.recover()
+        removed = self.gc()
+        progress_channel.gc()
+        return removed
+
+    async def _claim(self) -> IngestionJob:
+        """Wait for a job this worker may run and mark it running."""
+        loop = asyncio.get_running_loop()
+        while True:
+            submitted = self._submitted
+            row = await loop.run_in_executor(None, self.store.claim, os.getpid(), self.max_running, JOB_LEASE_SECONDS)
+            if row is not None:
+                job_id = row["id"]
+                self._running.add(job_id)
+                context = self._contexts.pop(job_id, None)
+                if context is None:
+                    # Submitted through another worker: carry its request ID into this job's logs
+                    context = contextvars.Context()
+                    context.run(request_id_var.set, row["request_id"] or "-")
+                return IngestionJob.from_row(row, context=context)
+            try:
+                await asyncio.wait_for(submitted.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, n: int):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._claim()
+            try:
+                await loop.run_in_executor(None, progress_channel.publish, job.id, job.progress_state())
+                logger.info(f"📥 [JOB {job.id[:8]}] worker {os.getpid()}/{n} processing {job.filename}")
+                await loop.run_in_executor(self._executor, job.context.run, self._run_profiled, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"📥 [JOB {job.id[:8]}] unexpected worker error: {e}")
+            finally:
+                self._running.discard(job.id)
+                # A finished job frees a slot other workers may be waiting for
+                self._submitted.set()
+                self._submitted = asyncio.Event()
+
+    def _run_profiled(self, job: IngestionJob):
+        with profile_request(f"ingest {job.filename}", enabled=job.profile):
+            self._run(job)
+
+    def _run(self, job: IngestionJob):
+        """Executor-side body of a job: runs the full ingestion pipeline for one document."""
+        from .documents import ingest_document
+        from mcp_server.embeddings import embed_summary
+
+        def update_progress(msg: str, pct: int):
+            # The cancel flag may have been set through any worker
+            if self.store.cancel_requested(job.id):
+                raise JobCancelled()
+            job.message = msg
+            job.progress = pct
+            job.lease_expires = time.time() + JOB_LEASE_SECONDS
+            self.store.update(job.id, message=msg, progress=pct, lease_expires=job.lease_expires)
+            progress_channel.publish(job.id, job.progress_state())
+
+        stats: Dict[str, float] = {}
+        try:
+            document = ingest_document(
+                job.path, job.filename, content_hash=job.content_hash, doc_id=job.doc_id,
+                replaces=job.replaces, progress_callback=update_progress, stats=stats,
+                namespace=job.namespace
+            )
+            texts_added, images_added, tables_added = document["texts"], document["images"], document["tables"]
+            hits = stats.get("caption_cache_hits", 0)
+            misses = stats.get("caption_cache_misses", 0)
+            job.result = {
+                "filename": job.filename,
+                "namespace": job.namespace,
+                "doc_id": job.doc_id,
+                "replaced": job.replaces,
+                "texts_added": texts_added,
+                "images_added": images_added,
+                "tables_added": tables_added,
+                "caption_cache_hits": hits,
+                "caption_cache_misses": misses,
+                "caption_cache_hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+                "embedding": embed_summary(stats),
+                "caption_routes": {
+                    key.removeprefix("caption_route_"): n for key, n in stats.items() if key.startswith("caption_route_")
+                },
+            }
+            self._finish(job, COMPLETED, "Upload complete!")
+            logger.info(f"✅ [JOB {job.id[:8]}] Added {texts_added} texts, {images_added} images, {tables_added} tables "
+                  f"(caption cache {hits}/{hits + misses} hits)")
+        except JobCancelled:
+            self._finish(job, CANCELLED, "Cancelled")
+            logger.info(f"🛑 [JOB {job.id[:8]}] Cancelled")
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, FAILED, f"Error: {e}")
+            logger.info(f"❌ [JOB {job.id[:8]}] Failed: {e}")
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+# Module-level singleton — started and stopped by the app lifespan
+ingestion_queue = IngestionQueue()
+
+INGEST_QUEUE_DEPTH = Gauge("deepretrieve_ingest_queue_depth", "Ingestion jobs waiting for a worker")
+INGEST_QUEUE_DEPTH.set_function(ingestion_queue.queue_depth)
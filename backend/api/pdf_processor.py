@@ -1,8 +1,10 @@
 # PDF processing utilities for the API
 
+import logging
 import os
 import io
 import json
+import time
 import uuid
 import math
 from pathlib import Path
@@ -13,9 +15,23 @@ from PIL import Image
 from qdrant_client.http.models import PointStruct
 
 
-from mcp_server.config import OUTPUT_FOLDER, IMAGES_FOLDER, TABLES_FOLDER
-from mcp_server.embeddings import embed_text
-from mcp_server.retriever import get_qdrant_client, COLLECTION_NAME
+from mcp_server.config import (
+    OUTPUT_FOLDER, IMAGES_FOLDER, TABLES_FOLDER,
+    OCR_DPI, OCR_MIN_DPI, OCR_MAX_DPI, OCR_MAX_PIXELS, OCR_TILE_OVERLAP_PTS,
+    CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+)
+from mcp_server.compute import compute_stage
+from mcp_server.embeddings import embed_texts, embed_summary, token_offsets
+from mcp_server.retriever import get_qdrant_client, ensure_namespace, COLLECTION_NAME
+from mcp_server.namespaces import Namespace
+from mcp_server.telemetry import span, observe, count
+from mcp_server import resilience
+from .image_store import store_image
+from .caption_cache import caption_cache, perceptual_hash
+from .caption_router import route_image, ROUTE_OCR, ROUTE_BLIP, ROUTE_BOTH
+
+logger = logging.getLogger(__name__)
+
 
 class _ImageCaptioner:
     """Singleton wrapper around BLIP and EasyOCR.
@@ -47,7 +63,7 @@ class _ImageCaptioner:
             from transformers import BlipProcessor, BlipForConditionalGeneration
 
             self._device = "cuda" if torch.cuda.is_available() else "cpu"
-            print(f"[ImageCaptioner] Loading BLIP on {self._device.upper()}...")
+            logger.info(f"[ImageCaptioner] Loading BLIP on {self._device.upper()}...")
 
             self._blip_processor = BlipProcessor.from_pretrained(
                 "Salesforce/blip-image-captioning-base"
@@ -56,11 +72,11 @@ class _ImageCaptioner:
                 "Salesforce/blip-image-captioning-base"
             ).to(self._device)
             self._blip_model.eval()
-            print("[ImageCaptioner] BLIP ready.")
+            logger.info("[ImageCaptioner] BLIP ready.")
 
         except Exception as e:
-            print(f"[ImageCaptioner] ⚠️  BLIP failed to load: {e}")
-            print("[ImageCaptioner]    Images will use EasyOCR-only fallback.")
+            logger.info(f"[ImageCaptioner] ⚠️  BLIP failed to load: {e}")
+            logger.info("[ImageCaptioner]    Images will use EasyOCR-only fallback.")
             self._blip_load_failed = True
 
     def _load_ocr(self):
@@ -74,29 +90,30 @@ class _ImageCaptioner:
             if self._device is None:
                 self._device = "cuda" if torch.cuda.is_available() else "cpu"
 
-            print("[ImageCaptioner] Loading EasyOCR...")
+            logger.info("[ImageCaptioner] Loading EasyOCR...")
             gpu_flag = (self._device == "cuda")
             self._ocr_reader = easyocr.Reader(["en"], gpu=gpu_flag, verbose=False)
-            print("[ImageCaptioner] EasyOCR ready.")
+            logger.info("[ImageCaptioner] EasyOCR ready.")
 
         except Exception as e:
-            print(f"[ImageCaptioner] ⚠️  EasyOCR failed to load: {e}")
+            logger.info(f"[ImageCaptioner] ⚠️  EasyOCR failed to load: {e}")
             self._ocr_load_failed = True
 
     
     def _ocr_text(self, pil_image: Image.Image) -> str:
         """Run EasyOCR and return joined text."""
         import numpy as np
-        arr = np.array(pil_image.convert("RGB"))
-        results = self._ocr_reader.readtext(arr, detail=0)
+        # EasyOCR converts to grayscale itself; only non-RGB/L modes need a conversion copy
+        arr = np.asarray(pil_image if pil_image.mode in ("RGB", "L") else pil_image.convert("RGB"))
+        with compute_stage("ocr"):
+            results = self._ocr_reader.readtext(arr, detail=0)
         return " ".join(results).strip()
 
     def _blip_caption(self, pil_image: Image.Image) -> str:
         """Run BLIP conditional generation."""
-        import torch
         inputs = self._blip_processor(pil_image.convert("RGB"), return_tensors="pt").to(self._device)
 
-        with torch.no_grad():
+        with compute_stage("caption"):
             output_ids = self._blip_model.generate(
                 **inputs,
                 max_new_tokens=150,
@@ -113,9 +130,87 @@ class _ImageCaptioner:
         return len(ocr_text) > 40
 
    
-    def caption(self, pil_image: Image.Image) -> str:
+    def _models_key(self) -> str:
+        """The models that would caption an image right now; part of the cache key."""
+        models = []
+        if self._blip_model is not None:
+            models.append("blip-base")
+        if self._ocr_reader is not None:
+            models.append("easyocr-en")
+        return "+".join(models)
+
+    def caption(
+        self,
+        pil_image: Image.Image,
+        image_hash: Optional[str] = None,
+        stats: Optional[Dict[str, int]] = None,
+        embedded_text: Optional[str] = None
+    ) -> str:
+        """Caption an image, answering from the persistent caption cache when it was seen before.
+
+        embedded_text is PDF text found under the image's placement; when it is
+        text-dominant it is used as-is and no model runs. image_hash is the
+        SHA-256 of the embedded bytes; without it the cache is bypassed. Hits,
+        misses and routes are added to stats when given.
+        """
+        if embedded_text and self._is_text_dominant(embedded_text):
+            count("ingest.caption_route.embedded_text")
+            if stats is not None:
+                stats["caption_route_embedded_text"] = stats.get("caption_route_embedded_text", 0) + 1
+            return f"[Text in image]: {embedded_text}"
+
+        self._load()
+        models = self._models_key()
+        if image_hash is None or not models:
+            return self._caption(pil_image, stats)
+
+        phash = perceptual_hash(pil_image)
+        try:
+            cached = caption_cache.get(image_hash, phash, models)
+        except Exception as e:
+            logger.info(f"[ImageCaptioner] ⚠️  Caption cache unavailable: {e}")
+            return self._caption(pil_image, stats)
+
+        outcome = "hits" if cached is not None else "misses"
+        count(f"ingest.caption_cache.{outcome}")
+        if stats is not None:
+            stats[f"caption_cache_{outcome}"] = stats.get(f"caption_cache_{outcome}", 0) + 1
+        if cached is not None:
+            return cached
+
+        caption = self._caption(pil_image, stats)
+        # Only real captions are cached; failures should be retried next time
+        if caption.startswith(("[Text in image]", "[Figure]")):
+            try:
+                caption_cache.put(image_hash, phash, models, caption)
+            except Exception as e:
+                logger.info(f"[ImageCaptioner] ⚠️  Could not cache caption: {e}")
+        return caption
+
+    def _route(self, pil_image: Image.Image, stats: Optional[Dict[str, int]]) -> str:
+        """Pick the model(s) to run up front; only meaningful when both models loaded."""
+        if self._blip_model is None or self._ocr_reader is None:
+            return ROUTE_BOTH
+        try:
+            decision = route_image(pil_image)
+        except Exception as e:
+            logger.info(f"[ImageCaptioner] Routing failed, running both models: {e}")
+            return ROUTE_BOTH
+        logger.info(f"[ImageCaptioner] route={decision.route} ({decision.reason}) {decision.features}")
+        count(f"ingest.caption_route.{decision.route}")
+        if stats is not None:
+            key = f"caption_route_{decision.route}"
+            stats[key] = stats.get(key, 0) + 1
+        return decision.route
+
+    def _caption(self, pil_image: Image.Image, stats: Optional[Dict[str, int]] = None) -> str:
         """Return a text description for the given PIL image.
 
+        A pre-classifier (api/caption_router.py) picks the first model:
+          - route 'ocr'  → EasyOCR; BLIP only if it finds ≤ 40 chars
+          - route 'blip' → BLIP; EasyOCR only if BLIP returns nothing
+          - route 'both' → EasyOCR, then BLIP (ambiguous images)
+
         Routing (with graceful degradation):
           - EasyOCR text > 40 chars         → '[Text in image]: ...'
           - BLIP visual caption             → '[Figure]: ...'
@@ -123,14 +218,17 @@ class _ImageCaptioner:
           - Both failed                     → '[Image: captioning unavailable]'
         """
         self._load()
+        route = self._route(pil_image, stats)
         try:
-            # --- OCR pass (always attempted if OCR loaded) ---
+            # --- OCR pass (skipped for images routed to BLIP) ---
             ocr_text = ""
-            if self._ocr_reader is not None:
+            if self._ocr_reader is not None and route != ROUTE_BLIP:
                 ocr_text = self._ocr_text(pil_image)
 
             if self._is_text_dominant(ocr_text):
                 return f"[Text in image]: {ocr_text}"
+            if route == ROUTE_OCR:
+                count("ingest.caption_route.ocr_fallback")  # misrouted: paid for OCR and BLIP
 
             # --- BLIP pass (if loaded) ---
             if self._blip_model is not None:
@@ -139,6 +237,9 @@ class _ImageCaptioner:
                     return f"[Figure]: {blip_desc}"
 
             # --- Fallbacks ---
+            if route == ROUTE_BLIP and self._ocr_reader is not None:
+                count("ingest.caption_route.blip_fallback")
+                ocr_text = self._ocr_text(pil_image)
             if ocr_text:
                 return f"[Text in image]: {ocr_text}"
 
@@ -148,7 +249,7 @@ class _ImageCaptioner:
             return "[Image: no description available]"
 
         except Exception as e:
-            print(f"[ImageCaptioner] Error captioning image: {e}")
+            logger.info(f"[ImageCaptioner] Error captioning image: {e}")
             return "[Image: captioning failed]"
 
 
@@ -156,12 +257,12 @@ class _ImageCaptioner:
 _captioner = _ImageCaptioner()
 
 
-def ensure_output_folders():
+def ensure_output_folders(images_folder: Optional[Path] = None, tables_folder: Optional[Path] = None):
 
     """Ensure output folders exist"""
     OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
-    IMAGES_FOLDER.mkdir(parents=True, exist_ok=True)
-    TABLES_FOLDER.mkdir(parents=True, exist_ok=True)
+    (images_folder or IMAGES_FOLDER).mkdir(parents=True, exist_ok=True)
+    (tables_folder or TABLES_FOLDER).mkdir(parents=True, exist_ok=True)
 
 
 def clean_text(text: str) -> str:
@@ -179,57 +280,179 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
-def _chunk_text(text: str, source: str, page_num: int, chunk_size: int = 512, overlap: int = 50) -> List[Dict]:
-    """Split a text string into overlapping chunks and return as list of dicts."""
+def _chunk_text(
+    text: str,
+    source: str,
+    page_num: int,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap: int = CHUNK_OVERLAP_TOKENS
+) -> List[Dict]:
+    """Split a text string into chunks of at most chunk_tokens model tokens.
+
+    Consecutive chunks share `overlap` tokens. Boundaries are moved back to
+    the start of a word so no word is split across chunks.
+    """
     chunks = []
-    words = text.split(" ")
-    current_chunk: List[str] = []
-    current_len = 0
-
-    for word in words:
-        word_len = len(word) + 1
-        if current_len + word_len > chunk_size and current_chunk:
-            chunk_str = " ".join(current_chunk)
-            chunks.append({"content": chunk_str, "page": page_num, "source": source})
-            overlap_words = current_chunk[-math.ceil(overlap / (len(current_chunk[-1]) + 1)):] if current_chunk else []
-            current_chunk = overlap_words + [word]
-            current_len = sum(len(w) + 1 for w in current_chunk)
-        else:
-            current_chunk.append(word)
-            current_len += word_len
-
-    if current_chunk:
-        chunk_str = " ".join(current_chunk)
-        if len(chunk_str) > 20:
+    offsets = token_offsets(text)  # (start, end) character span of each token
+    n = len(offsets)
+
+    def starts_word(i: int) -> bool:
+        # Sub-word pieces touch the previous token; a word starts after a gap
+        return i == 0 or offsets[i][0] != offsets[i - 1][1]
+
+    start = 0
+    while start < n:
+        end = min(start + chunk_tokens, n)
+        if end < n:
+            boundary = end
+            while boundary > start + 1 and not starts_word(boundary):
+                boundary -= 1
+            if boundary > start + 1:
+                end = boundary
+
+        chunk_str = text[offsets[start][0]:offsets[end - 1][1]]
+        if end < n or len(chunk_str) > 20:
             chunks.append({"content": chunk_str, "page": page_num, "source": source})
+        if end >= n:
+            break
+
+        next_start = max(end - overlap, start + 1)
+        while next_start < end and not starts_word(next_start):
+            next_start += 1
+        start = next_start
 
     return chunks
 
 
-def _ocr_page(page: "fitz.Page") -> str:
-    """Render a PDF page to an image and extract text via EasyOCR.
+def _embedded_text_in(page: "fitz.Page", rect: "fitz.Rect") -> str:
+    """Text objects PyMuPDF can read inside a rectangle of the page (free, no OCR)."""
+    return clean_text(page.get_text("text", clip=rect))
 
-    Used as a fallback for scanned / image-only pages where PyMuPDF finds
-    no embedded text.  Renders at 150 DPI (matrix scale 1.5×1.5) which gives
-    a good accuracy / speed trade-off for EasyOCR.
+
+def _image_regions(page: "fitz.Page", min_points: float = 32) -> List["fitz.Rect"]:
+    """Placement rectangles of the images drawn on a page, ignoring slivers."""
+    regions = []
+    for img_info in page.get_images(full=True):
+        try:
+            rects = page.get_image_rects(img_info[0])
+        except Exception:
+            continue
+        for rect in rects:
+            rect = rect & page.rect
+            if not rect.is_empty and rect.width >= min_points and rect.height >= min_points:
+                regions.append(rect)
+    return regions
+
+
+def _ocr_zoom(rect: "fitz.Rect") -> float:
+    """Render scale for OCR: OCR_DPI, raised for small clips, lowered for huge pages.
+
+    Small regions are rendered up to OCR_MAX_DPI so their short side reaches
+    ~1000 px; large pages drop toward OCR_MIN_DPI to stay within
+    OCR_MAX_PIXELS. Anything still larger is tiled by _render_tiles.
+    """
+    area = max(rect.width * rect.height, 1.0)
+    zoom = OCR_DPI / 72
+    zoom = max(zoom, min(OCR_MAX_DPI / 72, 1000 / max(min(rect.width, rect.height), 1.0)))
+    if area * zoom * zoom > OCR_MAX_PIXELS:
+        zoom = max(OCR_MIN_DPI / 72, math.sqrt(OCR_MAX_PIXELS / area))
+    return zoom
+
+
+def _render_tiles(page: "fitz.Page", rect: "fitz.Rect"):
+    """Yield (grayscale uint8 array, owned box) pairs covering rect, each at most OCR_MAX_PIXELS.
+
+    Neighbouring tiles overlap by OCR_TILE_OVERLAP_PTS, so a line cut by one
+    tile's edge is whole in the next. The owned box (x0, y0, x1, y1 in tile
+    pixels) splits every overlap band down the middle: text centred inside
+    it belongs to this tile, so lines in the band are kept exactly once. It
+    is None when rect fits in a single tile.
+
+    Each array is a view over the pixmap's sample buffer (no PNG round-trip,
+    no copy); the pixmap lives until both this generator and the consumer
+    have dropped it.
     """
     import numpy as np
 
+    zoom = _ocr_zoom(rect)
+    mat = fitz.Matrix(zoom, zoom)
+    # Square tiles in page points that render to at most OCR_MAX_PIXELS
+    tile_pts = math.sqrt(OCR_MAX_PIXELS) / zoom
+    overlap = min(OCR_TILE_OVERLAP_PTS, tile_pts / 4)
+    rows = max(1, math.ceil((rect.height - overlap) / (tile_pts - overlap)))
+    cols = max(1, math.ceil((rect.width - overlap) / (tile_pts - overlap)))
+    # Stretch the tiles so rows × tile_h minus the shared bands covers rect exactly
+    tile_h = (rect.height + (rows - 1) * overlap) / rows
+    tile_w = (rect.width + (cols - 1) * overlap) / cols
+    half = overlap / 2 * zoom
+
+    for row in range(rows):
+        for col in range(cols):
+            x0 = rect.x0 + col * (tile_w - overlap)
+            y0 = rect.y0 + row * (tile_h - overlap)
+            clip = fitz.Rect(x0, y0, x0 + tile_w, y0 + tile_h)
+            pix = page.get_pixmap(matrix=mat, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+            owned = None
+            if rows > 1 or cols > 1:
+                owned = (
+                    half if col > 0 else 0.0, half if row > 0 else 0.0,
+                    pix.width - half if col < cols - 1 else math.inf,
+                    pix.height - half if row < rows - 1 else math.inf,
+                )
+            samples = np.frombuffer(pix.samples_mv, dtype=np.uint8)
+            # Rows may be padded: stride can exceed width × channels
+            yield samples.reshape(pix.height, pix.stride)[:, :pix.width], owned
+            del samples, pix  # with the consumer's view gone too, the pixmap is freed before the next render
+
+
+def _owns(owned: Tuple[float, float, float, float], box) -> bool:
+    """Whether an EasyOCR box (four corner points) is centred inside a tile's owned box."""
+    cx = sum(point[0] for point in box) / len(box)
+    cy = sum(point[1] for point in box) / len(box)
+    return owned[0] <= cx < owned[2] and owned[1] <= cy < owned[3]
+
+
+def _ocr_page(page: "fitz.Page", embedded_text: str = "") -> str:
+    """Return the page text, OCR-ing only what PyMuPDF cannot read.
+
+    Used as a fallback for scanned / image-only pages where PyMuPDF finds
+    little embedded text. On mixed pages only the image regions without
+    embedded text under them are rendered and OCR'd, and the result is added
+    to embedded_text; a page without images (e.g. outlined vector text) is
+    rendered whole. Renders are grayscale numpy views at an adaptive DPI
+    (see _ocr_zoom), tiled with overlap on huge pages to bound peak memory.
+    """
+    images = _image_regions(page)
+    regions = [r for r in images if not _captioner._is_text_dominant(_embedded_text_in(page, r))]
+    if not images:
+        regions = [page.rect]
+    elif not regions:
+        return embedded_text  # every image already has readable text under it
+
     # Ensure EasyOCR is loaded (reuses the captioner singleton — no duplicate load)
     _captioner._load_ocr()
     if _captioner._ocr_reader is None:
         return ""
 
-    # Render page to pixmap (RGB) at 150 DPI
-    mat = fitz.Matrix(1.5, 1.5)          # 1.5 × 72 DPI ≈ 108 DPI; good for OCR
-    pix = page.get_pixmap(matrix=mat, colorspace=fitz.csRGB)
-    img_bytes = pix.tobytes("png")
-
-    pil_img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    arr = np.array(pil_img)
-
-    results = _captioner._ocr_reader.readtext(arr, detail=0, paragraph=True)
-    return " ".join(results).strip()
+    pieces = []
+    for rect in regions:
+        for tile, owned in _render_tiles(page, rect):
+            with span("ingest.ocr_page"), compute_stage("ocr"):
+                if owned is None:
+                    results = _captioner._ocr_reader.readtext(tile, detail=0, paragraph=True)
+                else:
+                    # Line boxes, so text in an overlap band is kept by exactly one tile
+                    results = [
+                        text for box, text, _ in _captioner._ocr_reader.readtext(tile, detail=1)
+                        if _owns(owned, box)
+                    ]
+            del tile  # release the pixmap before the next tile renders
+            pieces.append(" ".join(results).strip())
+
+    ocr_text = " ".join(p for p in pieces if p)
+    if regions == [page.rect]:
+        return ocr_text  # whole-page OCR already contains the embedded text
+    return f"{embedded_text} {ocr_text}".strip()
 
 
 def extract_text_from_pdf(pdf_path: str, progress_callback: Optional[Callable[[str, int], None]] = None) -> List[Dict]:
@@ -264,20 +487,22 @@ def extract_text_from_pdf(pdf_path: str, progress_callback: Optional[Callable[[s
         if len(text) < 50:
             if progress_callback:
                 progress_callback(f"OCR fallback (Page {page_num+1}/{total})...", int(page_num / max(total, 1) * 15))
-            ocr_text = _ocr_page(page)
-            if len(ocr_text) > 50:
+            ocr_text = _ocr_page(page, text)
+            if len(ocr_text) > 50 and ocr_text != text:
                 text = ocr_text
                 ocr_pages += 1
-                print(f"  [OCR] Page {page_num+1}: extracted {len(ocr_text)} chars via EasyOCR")
+                logger.info(f"  [OCR] Page {page_num+1}: extracted {len(ocr_text)} chars via EasyOCR")
 
         if text and len(text) > 50:
             page_chunks = _chunk_text(text, source_name, page_num + 1)
             texts.extend(page_chunks)
 
     doc.close()
+    count("ingest.pages", total)
+    count("ingest.ocr_pages", ocr_pages)
     if ocr_pages:
-        print(f"  [OCR] {ocr_pages}/{total} pages used EasyOCR fallback")
-    print(f"Extracted {len(texts)} text chunks from {pdf_path}")
+        logger.info(f"  [OCR] {ocr_pages}/{total} pages used EasyOCR fallback")
+    logger.info(f"Extracted {len(texts)} text chunks from {pdf_path}")
     return texts
 
 
@@ -286,7 +511,10 @@ def extract_text_from_pdf(pdf_path: str, progress_callback: Optional[Callable[[s
 def extract_images_from_pdf(
     pdf_path: str,
     min_size: int = 100,
-    progress_callback: Optional[Callable[[str, int], None]] = None
+    progress_callback: Optional[Callable[[str, int], None]] = None,
+    stats: Optional[Dict[str, int]] = None,
+    images_folder: Optional[Path] = None,
+    claim_artifacts: Optional[Callable[[List[str]], None]] = None
 ) -> List[Dict]:
     """Extract images from every PDF page and caption each one.
 
@@ -296,14 +524,20 @@ def extract_images_from_pdf(
 
     Images smaller than min_size×min_size pixels are skipped (decorative elements).
     Duplicate xrefs (same image embedded on multiple pages) are processed once.
+    Text objects inside an image's placement rectangle are used as its caption
+    when there is enough of it, so EasyOCR only runs for images without any.
+    Images seen in earlier documents are captioned from the caption cache;
+    hits and misses are added to stats when given. Files go to images_folder
+    (default IMAGES_FOLDER); claim_artifacts is called with their paths
+    before each one is written.
     """
     if progress_callback:
         progress_callback("Extracting images...", 15)
 
-    ensure_output_folders()
+    images_folder = images_folder or IMAGES_FOLDER
+    ensure_output_folders(images_folder=images_folder)
     images = []
     source_name = os.path.basename(pdf_path)
-    stem = Path(pdf_path).stem
     seen_xrefs: set = set()
     seen_fingerprints: set = set()   # catches visually-identical images with different xrefs
 
@@ -340,14 +574,16 @@ def extract_images_from_pdf(
                     # Skip visually-identical images (same chart embedded N times)
                     fp = _image_fingerprint(pil_image)
                     if fp in seen_fingerprints:
-                        print(f"  [Image] Skipping duplicate on page {page_num+1} (xref={xref})")
+                        logger.info(f"  [Image] Skipping duplicate on page {page_num+1} (xref={xref})")
                         continue
                     seen_fingerprints.add(fp)
 
-                    # Save to disk
-                    img_filename = f"{stem}_p{page_num+1}_img{img_idx+1}.png"
-                    img_path = IMAGES_FOLDER / img_filename
-                    pil_image.save(img_path, format="PNG")
+                    # Save to disk under its content hash, in the original encoding when browsers can show it
+                    stored = store_image(
+                        img_bytes, base_image.get("ext", ""), pil_image, images_folder, claim=claim_artifacts
+                    )
+                    count("ingest.images_reused" if stored.reused else "ingest.image_bytes",
+                          1 if stored.reused else stored.size_bytes)
 
                     if progress_callback:
                         pct = 15 + int(((page_num * len(img_list) + img_idx) /
@@ -357,33 +593,54 @@ def extract_images_from_pdf(
                             min(pct, 40)
                         )
 
-                    caption = _captioner.caption(pil_image)
-                    print(f"  [Image] page={page_num+1} size={w}x{h}\n         caption → {caption}")
+                    # Text objects drawn over/under the image are read for free; OCR only if there are none
+                    embedded_text = ""
+                    rects = page.get_image_rects(xref)
+                    if rects:
+                        embedded_text = _embedded_text_in(page, rects[0])
+
+                    with span("ingest.caption_image"):
+                        caption = _captioner.caption(
+                            pil_image, image_hash=stored.image_hash, stats=stats, embedded_text=embedded_text
+                        )
+                    logger.info(f"  [Image] page={page_num+1} size={w}x{h}\n         caption → {caption}")
 
                     images.append({
                         "content": caption,
-                        "path": str(img_path),
+                        "path": str(stored.path),
+                        "thumbnail_path": str(stored.thumbnail_path),
+                        "image_hash": stored.image_hash,
                         "page": page_num + 1,
                         "source": source_name,
                     })
 
                 except Exception as img_err:
-                    print(f"  [Image] Error on page {page_num+1} xref={xref}: {img_err}")
+                    logger.info(f"  [Image] Error on page {page_num+1} xref={xref}: {img_err}")
 
         doc.close()
 
     except Exception as e:
-        print(f"Error during image extraction: {e}")
+        logger.info(f"Error during image extraction: {e}")
 
-    print(f"Extracted {len(images)} images from {pdf_path}")
+    logger.info(f"Extracted {len(images)} images from {pdf_path}")
     return images
 
 
 
-def extract_tables_from_pdf(pdf_path: str, progress_callback: Optional[Callable[[str, int], None]] = None) -> List[Dict]:
+def extract_tables_from_pdf(
+    pdf_path: str,
+    progress_callback: Optional[Callable[[str, int], None]] = None,
+    tables_folder: Optional[Path] = None,
+    claim_artifacts: Optional[Callable[[List[str]], None]] = None,
+    file_id: Optional[str] = None
+) -> List[Dict]:
     """Extract tables from PDF using img2table with our shared EasyOCR instance.
 
-    Results are saved as JSON records to preserve tabular structure for the LLM.
+    Results are saved as JSON records (in tables_folder, default TABLES_FOLDER)
+    to preserve tabular structure for the LLM. They are named after file_id
+    (the doc_id when ingesting a document; a random id otherwise), since PDFs
+    from different folders can share a stem. claim_artifacts is called with
+    each JSON path before it is written.
     """
     from img2table.document import PDF
     from img2table.ocr import EasyOCR
@@ -392,15 +649,17 @@ def extract_tables_from_pdf(pdf_path: str, progress_callback: Optional[Callable[
     if progress_callback:
         progress_callback("Extracting tables (visually)...", 45)
 
-    ensure_output_folders()
+    tables_folder = tables_folder or TABLES_FOLDER
+    ensure_output_folders(tables_folder=tables_folder)
     tables = []
     source_name = os.path.basename(pdf_path)
+    file_id = file_id or uuid.uuid4().hex
     table_index = 0
 
     # Ensure EasyOCR is loaded in memory
     _captioner._load_ocr()
     if _captioner._ocr_reader is None:
-        print("[TableExtractor] EasyOCR not available. Skipping table extraction.")
+        logger.info("[TableExtractor] EasyOCR not available. Skipping table extraction.")
         return []
 
     class SharedEasyOCR(EasyOCR):
@@ -412,12 +671,13 @@ def extract_tables_from_pdf(pdf_path: str, progress_callback: Optional[Callable[
 
     try:
         # Extract tables (pages are 0-indexed in the returned dict)
-        extracted_tables = doc.extract_tables(
-            ocr=ocr_engine,
-            implicit_rows=True,
-            borderless_tables=False,
-            min_confidence=50
-        )
+        with compute_stage("table"):
+            extracted_tables = doc.extract_tables(
+                ocr=ocr_engine,
+                implicit_rows=True,
+                borderless_tables=False,
+                min_confidence=50
+            )
 
         for page_idx, page_tables in extracted_tables.items():
             for tab in page_tables:
@@ -458,8 +718,8 @@ def extract_tables_from_pdf(pdf_path: str, progress_callback: Optional[Callable[
                 table_str = "\n".join(table_context)
 
                 # Save raw JSON disk format
-                json_filename = f"{Path(pdf_path).stem}_p{page_idx + 1}_t{table_index + 1}.json"
-                json_path = TABLES_FOLDER / json_filename
+                json_filename = f"{file_id}_p{page_idx + 1}_t{table_index + 1}.json"
+                json_path = tables_folder / json_filename
 
                 table_data = {
                     "source": source_name,
@@ -467,6 +727,8 @@ def extract_tables_from_pdf(pdf_path: str, progress_callback: Optional[Callable[
                     "headers": headers,
                     "rows": records
                 }
+                if claim_artifacts:
+                    claim_artifacts([str(json_path)])
                 with open(json_path, "w", encoding="utf-8") as f:
                     json.dump(table_data, f, indent=2, ensure_ascii=False)
 
@@ -481,24 +743,31 @@ def extract_tables_from_pdf(pdf_path: str, progress_callback: Optional[Callable[
                 table_index += 1
 
     except Exception as e:
-        print(f"Error extracting tables via img2table: {e}")
+        logger.info(f"Error extracting tables via img2table: {e}")
 
-    print(f"Extracted {len(tables)} tables from {pdf_path}")
+    logger.info(f"Extracted {len(tables)} tables from {pdf_path}")
     return tables
 
 
-def add_texts_to_qdrant(texts: List[Dict], progress_callback: Optional[Callable[[str, int], None]] = None) -> int:
+def add_texts_to_qdrant(
+    texts: List[Dict],
+    progress_callback: Optional[Callable[[str, int], None]] = None,
+    stats: Optional[Dict[str, float]] = None,
+    namespace: Optional[Namespace] = None
+) -> int:
     """Add text chunks to Qdrant"""
     client = get_qdrant_client()
     points = []
     total = len(texts)
-    
-    for i, text_data in enumerate(texts):
-        if progress_callback and i % 5 == 0:
-            progress_callback(f"Embedding text chunks ({i}/{total})...", 50 + int((i/max(total, 1)) * 20))
-            
-        embedding = embed_text(text_data["content"][:512])  # Limit text length
-        
+
+    def on_batch(done: int, total: int):
+        if progress_callback:
+            progress_callback(f"Embedding text chunks ({done}/{total})...", 50 + int((done/max(total, 1)) * 20))
+
+    embed_start = time.perf_counter()
+    # Chunks already fit the model window; anything longer is truncated by the tokenizer
+    embeddings = embed_texts([t["content"] for t in texts], stats=stats, progress_callback=on_batch)
+    for text_data, embedding in zip(texts, embeddings):
         point = PointStruct(
             id=str(uuid.uuid4()),
             vector=embedding,
@@ -506,66 +775,96 @@ def add_texts_to_qdrant(texts: List[Dict], progress_callback: Optional[Callable[
                 "type": "text",
                 "content": text_data["content"],
                 "page": text_data["page"],
-                "source": text_data["source"]
+                "source": text_data["source"],
+                "content_hash": text_data.get("content_hash"),
+                "doc_id": text_data.get("doc_id"),
+                "pending": text_data.get("pending", False),
+                **(namespace.tenant_payload() if namespace else {})
             }
         )
         points.append(point)
+    observe("ingest.embed", time.perf_counter() - embed_start)
     
     if points:
-        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        # Point IDs are fixed before the call, so a retried upsert just rewrites the same points
+        with span("ingest.upsert"):
+            resilience.qdrant.call(
+                client.upsert, collection_name=namespace.collection_name if namespace else COLLECTION_NAME, points=points
+            )
+    count("ingest.chunks.text", len(points))
     
     return len(points)
 
 
-def add_images_to_qdrant(images: List[Dict], progress_callback: Optional[Callable[[str, int], None]] = None) -> int:
+def add_images_to_qdrant(
+    images: List[Dict],
+    progress_callback: Optional[Callable[[str, int], None]] = None,
+    stats: Optional[Dict[str, float]] = None,
+    namespace: Optional[Namespace] = None
+) -> int:
     """Add images to Qdrant"""
     client = get_qdrant_client()
     points = []
-    total = len(images)
-    
-    for i, image_data in enumerate(images):
+
+    def on_batch(done: int, total: int):
         if progress_callback:
-            progress_callback(f"Embedding image captions ({i}/{total})...", 70 + int((i/max(total, 1)) * 15))
-            
-        try:
-            # Embed the caption text (bge-base is text-only; caption carries semantic meaning)
-            embedding = embed_text(image_data["content"])
-            
-            point = PointStruct(
-                id=str(uuid.uuid4()),
-                vector=embedding,
-                payload={
-                    "type": "image",
-                    "content": image_data["content"],
-                    "path": image_data["path"],
-                    "page": image_data["page"],
-                    "source": image_data["source"]
-                }
-            )
-            points.append(point)
-        except Exception as e:
-            print(f"Error embedding image: {e}")
-            continue
+            progress_callback(f"Embedding image captions ({done}/{total})...", 70 + int((done/max(total, 1)) * 15))
+
+    embed_start = time.perf_counter()
+    # Embed the caption text (bge-base is text-only; caption carries semantic meaning).
+    # A failure propagates, like for text chunks: ingest_document rolls the document back
+    # instead of publishing it without its images.
+    embeddings = embed_texts([img["content"] for img in images], stats=stats, progress_callback=on_batch)
+    for image_data, embedding in zip(images, embeddings):
+        point = PointStruct(
+            id=str(uuid.uuid4()),
+            vector=embedding,
+            payload={
+                "type": "image",
+                "content": image_data["content"],
+                "path": image_data["path"],
+                "thumbnail_path": image_data.get("thumbnail_path"),
+                "image_hash": image_data.get("image_hash"),
+                "page": image_data["page"],
+                "source": image_data["source"],
+                "content_hash": image_data.get("content_hash"),
+                "doc_id": image_data.get("doc_id"),
+                "pending": image_data.get("pending", False),
+                **(namespace.tenant_payload() if namespace else {})
+            }
+        )
+        points.append(point)
+    observe("ingest.embed", time.perf_counter() - embed_start)
     
     if points:
-        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        # Point IDs are fixed before the call, so a retried upsert just rewrites the same points
+        with span("ingest.upsert"):
+            resilience.qdrant.call(
+                client.upsert, collection_name=namespace.collection_name if namespace else COLLECTION_NAME, points=points
+            )
+    count("ingest.chunks.image", len(points))
     
     return len(points)
 
 
-def add_tables_to_qdrant(tables: List[Dict], progress_callback: Optional[Callable[[str, int], None]] = None) -> int:
+def add_tables_to_qdrant(
+    tables: List[Dict],
+    progress_callback: Optional[Callable[[str, int], None]] = None,
+    stats: Optional[Dict[str, float]] = None,
+    namespace: Optional[Namespace] = None
+) -> int:
     """Add tables to Qdrant — embeds the LLM-friendly JSON content string."""
     client = get_qdrant_client()
     points = []
-    total = len(tables)
 
-    for i, table_data in enumerate(tables):
+    def on_batch(done: int, total: int):
         if progress_callback:
-            progress_callback(f"Embedding tables ({i+1}/{total})...", 88 + int((i / max(total, 1)) * 9))
-
-        # Embed up to 512 chars of the structured content
-        embedding = embed_text(table_data["content"][:512])
+            progress_callback(f"Embedding tables ({done}/{total})...", 88 + int((done / max(total, 1)) * 9))
 
+    embed_start = time.perf_counter()
+    # The tokenizer truncates to the model window (512 tokens) instead of 512 chars
+    embeddings = embed_texts([t["content"] for t in tables], stats=stats, progress_callback=on_batch)
+    for table_data, embedding in zip(tables, embeddings):
         point = PointStruct(
             id=str(uuid.uuid4()),
             vector=embedding,
@@ -577,47 +876,109 @@ def add_tables_to_qdrant(tables: List[Dict], progress_callback: Optional[Callabl
                 "source": table_data["source"],
                 "table_index": table_data["table_index"],
                 "headers": table_data["headers"],
+                "content_hash": table_data.get("content_hash"),
+                "doc_id": table_data.get("doc_id"),
+                "pending": table_data.get("pending", False),
+                **(namespace.tenant_payload() if namespace else {}),
             }
         )
         points.append(point)
+    observe("ingest.embed", time.perf_counter() - embed_start)
 
     if points:
-        client.upsert(collection_name=COLLECTION_NAME, points=points)
+        # Point IDs are fixed before the call, so a retried upsert just rewrites the same points
+        with span("ingest.upsert"):
+            resilience.qdrant.call(
+                client.upsert, collection_name=namespace.collection_name if namespace else COLLECTION_NAME, points=points
+            )
+    count("ingest.chunks.table", len(points))
 
     return len(points)
 
 
-def process_pdf(pdf_path: str, original_filename: Optional[str] = None, progress_callback: Optional[Callable[[str, int], None]] = None) -> Tuple[int, int, int]:
-    """Process a PDF file and add all content to Qdrant"""
+def process_pdf(
+    pdf_path: str,
+    original_filename: Optional[str] = None,
+    progress_callback: Optional[Callable[[str, int], None]] = None,
+    content_hash: Optional[str] = None,
+    stats: Optional[Dict[str, int]] = None,
+    doc_id: Optional[str] = None,
+    claim_artifacts: Optional[Callable[[List[str]], None]] = None,
+    namespace: Optional[str] = None
+) -> Tuple[int, int, int]:
+    """Process a PDF file and add all content to Qdrant
+
+    content_hash (SHA-256 of the file) is stored on every point so re-uploads
+    of the same bytes can be detected without re-processing. Per-document
+    counters (caption cache hits/misses) are added to stats when given.
+
+    With a doc_id (see api/documents.py) every point is tagged with it and
+    written as pending — hidden from search until the document is published.
+    claim_artifacts is called with the paths of the image, thumbnail and
+    table files before each one is written.
+
+    A namespace (see mcp_server/namespaces.py) sends the points to that
+    tenant's collection / partition and the files to its own folders.
+    """
     
     def cb(msg: str, pct: int):
         if progress_callback:
             progress_callback(msg, pct)
+
+    ns = ensure_namespace(namespace) if namespace else None
+    # Without a namespace the module-level folders apply (the ingestion benchmark patches them)
+    images_folder = ns.images_folder if ns else None
+    tables_folder = ns.tables_folder if ns else None
             
     # Extract content
     cb("Starting text extraction...", 5)
-    texts = extract_text_from_pdf(pdf_path, cb)
+    with span("ingest.extract_text"):
+        texts = extract_text_from_pdf(pdf_path, cb)
 
     cb("Starting image extraction...", 15)
-    images = extract_images_from_pdf(pdf_path, progress_callback=cb)
+    with span("ingest.extract_images"):
+        images = extract_images_from_pdf(
+            pdf_path, progress_callback=cb, stats=stats, images_folder=images_folder, claim_artifacts=claim_artifacts
+        )
 
     cb("Starting table extraction...", 45)
-    tables = extract_tables_from_pdf(pdf_path, cb)
+    with span("ingest.extract_tables"):
+        tables = extract_tables_from_pdf(
+            pdf_path, cb, tables_folder=tables_folder, claim_artifacts=claim_artifacts, file_id=doc_id
+        )
 
     # Replace temp filename with the original upload filename
     if original_filename:
         for item in texts + images + tables:
             item["source"] = original_filename
+    if content_hash:
+        for item in texts + images + tables:
+            item["content_hash"] = content_hash
+    if doc_id:
+        for item in texts + images + tables:
+            item["doc_id"] = doc_id
+            item["pending"] = True
 
     # Add to Qdrant
+    if stats is None:
+        stats = {}
     cb("Embedding text chunks...", 55)
-    texts_added = add_texts_to_qdrant(texts, cb)
+    texts_added = add_texts_to_qdrant(texts, cb, stats, namespace=ns)
 
     cb("Embedding image captions...", 75)
-    images_added = add_images_to_qdrant(images, cb)
+    images_added = add_images_to_qdrant(images, cb, stats, namespace=ns)
 
     cb("Embedding tables...", 88)
-    tables_added = add_tables_to_qdrant(tables, cb)
+    tables_added = add_tables_to_qdrant(tables, cb, stats, namespace=ns)
+
+    summary = embed_summary(stats)
+    count("ingest.embed_tokens", stats.get("embed_tokens", 0))
+    count("ingest.embed_padded_tokens", stats.get("embed_padded_tokens", 0))
+    logger.info(
+        f"📐 [EMBED] {summary['chunks']} chunks, {summary['tokens']} tokens — padding "
+        f"{summary['padding_ratio']:.1%} (arrival order: {summary['padding_ratio_unsorted']:.1%}), "
+        f"{summary['chunks_per_second']} chunks/s, {summary['tokens_per_second']} tokens/s"
+    )
     
     cb("Upload complete!", 100)
     return texts_added, images_added, tables_added
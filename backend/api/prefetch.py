@@ -0,0 +1,129 @@
+# Speculative retrieval for the agent loop
+#
+# The system prompt makes Gemini call rag_retrieve first, so the query
+# handlers start that retrieval themselves while the first model turn runs.
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Any
+
+from mcp_server.config import TOP_K, RELEVANCE_THRESHOLD
+from mcp_server.telemetry import count, run_in_context
+
+logger = logging.getLogger(__name__)
+
+# Dedicated pool so prefetches never queue behind PDF processing in the default executor
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="prefetch")
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class SpeculativeRetrieval:
+    """Embedding + Qdrant retrieval started before the agent asks for it.
+
+    When the prefetched scores are all below RELEVANCE_THRESHOLD, the agent
+    will most likely fall back to the web next, so that search is warmed too.
+    Tool functions call take_rag / take_web; a mismatch in arguments (e.g. the
+    model rewrote the query) returns None and the caller searches as usual.
+    """
+
+    def __init__(
+        self, query: str, top_k: int = TOP_K, web_max_results: int = 5, namespace: Optional[str] = None
+    ):
+        from mcp_server.retriever import search_similar
+
+        self.query = query
+        self.namespace = namespace
+        self.top_k = max(top_k, TOP_K)
+        self.web_max_results = web_max_results
+        self._key = _normalize(query)
+        self._lock = threading.Lock()
+        # Signalled once the warm-up decision is made: Future.result() can return before
+        # done-callbacks have run, so waiting on retrieval alone could miss a warm-up
+        self._decided = threading.Condition(self._lock)
+        self._web_decided = False
+        self._web: Optional[Future] = None
+        self._closed = False
+
+        logger.info(f"⚡ [PREFETCH] Starting retrieval for '{query}'")
+        self._rag: Future = _executor.submit(run_in_context(
+            search_similar, query=query, top_k=self.top_k, namespace=namespace
+        ))
+        self._rag.add_done_callback(self._maybe_warm_web)
+
+    def _maybe_warm_web(self, future: Future):
+        """Runs when retrieval finishes; warms web search on low relevance."""
+        warm = (
+            not future.cancelled() and future.exception() is None
+            and not any(r.get("score", 0) >= RELEVANCE_THRESHOLD for r in future.result())
+        )
+        if warm:
+            from mcp_server.web_search import web_search
+        with self._decided:
+            if warm and not self._closed:
+                logger.info("⚡ [PREFETCH] Low relevance — warming web search")
+                self._web = _executor.submit(self._web_task(web_search))
+            self._web_decided = True
+            self._decided.notify_all()
+
+    def _web_task(self, web_search):
+        # Built while the retrieval callback runs, which already carries the request context
+        return run_in_context(
+            web_search, query=self.query, max_results=self.web_max_results, include_answer=True
+        )
+
+    def take_rag(self, query: str, top_k: int, timeout: Optional[float] = None) -> Optional[List[Dict]]:
+        """Return prefetched results if the tool arguments match, else None.
+
+        timeout bounds the wait for a retrieval that is still running.
+        """
+        if _normalize(query) != self._key or top_k > self.top_k:
+            count("prefetch.rag_miss")
+            return None
+        try:
+            results = self._rag.result(timeout=timeout)
+        except FutureTimeout:
+            logger.info("⚡ [PREFETCH] Retrieval still running at the deadline")
+            return None
+        except Exception as e:
+            logger.info(f"⚡ [PREFETCH] Retrieval failed, searching again: {e}")
+            return None
+        logger.info("⚡ [PREFETCH] rag_retrieve served from prefetch")
+        count("prefetch.rag_hit")
+        return [dict(r) for r in results[:top_k]]
+
+    def take_web(self, query: str, max_results: int = 5, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the warmed web search if one was started for this query, else None."""
+        if _normalize(query) != self._key or max_results > self.web_max_results:
+            return None
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # Wait for the warm-up decision and read its outcome under the same lock
+        with self._decided:
+            if not self._decided.wait_for(lambda: self._web_decided, timeout=timeout):
+                return None
+            web = self._web
+        if web is None:
+            count("prefetch.web_miss")
+            return None
+        try:
+            result = web.result(timeout=max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        except FutureTimeout:
+            return None
+        except Exception as e:
+            logger.info(f"⚡ [PREFETCH] Web warm-up failed, searching again: {e}")
+            return None
+        logger.info("⚡ [PREFETCH] web_search served from prefetch")
+        count("prefetch.web_hit")
+        return result
+
+    def close(self):
+        """Drop any work the agent never asked for."""
+        with self._decided:
+            self._closed = True
+            if self._web is not None:
+                self._web.cancel()
+        self._rag.cancel()  # Runs the callback if it was still pending, which wakes any waiters
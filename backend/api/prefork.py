@@ -0,0 +1,141 @@
+# Pre-fork launcher — N uvicorn workers sharing models loaded once
+#
+# The parent process imports the app and loads the embedding, captioning and
+# (optional) reranking models, then forks the workers. Model weights are only
+# read after that, so the children share the parent's pages copy-on-write
+# instead of each loading its own copy. Every worker accepts connections on
+# the same inherited socket; ingestion jobs and progress live in the shared
+# state database, so any worker can answer any request.
+#
+# Nothing runs inference before the fork: PyTorch's intra-op thread pool and
+# CUDA contexts don't survive fork(). On a CUDA host the parent therefore skips
+# preloading and each worker loads its models on startup.
+#
+# Each worker's compute scheduler is per process, so unless COMPUTE_THREADS
+# is set every worker gets cpu_count // workers threads instead of all cores.
+
+import gc
+import os
+import signal
+import socket
+import time
+import traceback
+from typing import Dict
+
+import uvicorn
+
+from mcp_server.config import QDRANT_PATH, RERANK_ENABLED, COMPUTE_THREADS
+from mcp_server.telemetry import configure_logging
+
+_RESTART_DELAY_SECONDS = 1.0  # Pause before replacing a crashed worker, so a crash loop doesn't spin
+
+
+def _cuda_available() -> bool:
+    # NVML-based check: unlike the default one it doesn't initialize CUDA, which would break fork()
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+
+def preload():
+    """Import the app and load every model the workers use. Returns the ASGI app."""
+    from .app import app
+
+    if _cuda_available():
+        print("⚠️ CUDA device found — models load in each worker after the fork (CUDA contexts can't be inherited)")
+        return app
+
+    start = time.time()
+    # Importing the pipeline loads the embedding model and connects to Qdrant
+    from .pdf_processor import _captioner
+    _captioner._load()
+    if RERANK_ENABLED:
+        from mcp_server.reranker import _reranker
+        _reranker._load()
+
+    # Keep objects created so far out of the cyclic GC: collecting them would
+    # write to their pages and undo the copy-on-write sharing
+    gc.collect()
+    gc.freeze()
+    print(f"✅ Models preloaded in {time.time() - start:.1f}s ({gc.get_freeze_count()} objects frozen)")
+    return app
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, workers: int) -> int:
+    """Child-side body: serve requests on the inherited socket until told to stop."""
+    from mcp_server.compute import scheduler
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if not COMPUTE_THREADS:
+        # Siblings share the cores: N workers each sized to the whole machine would oversubscribe it N times
+        scheduler.resize(max(1, (os.cpu_count() or 4) // workers))
+    try:
+        uvicorn.Server(uvicorn.Config(app, lifespan="on")).run(sockets=[sock])
+        return 0
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def serve(workers: int, host: str = "0.0.0.0", port: int = 8000):
+    """Preload models, fork `workers` API processes and keep that many running until SIGINT/SIGTERM."""
+    if workers > 1 and QDRANT_PATH:
+        raise SystemExit("Embedded Qdrant (QDRANT_PATH) can only be opened by one process — use --workers 1 or a Qdrant server")
+
+    configure_logging()
+    sock = _bind(host, port)
+    app = preload()
+    children: Dict[int, int] = {}  # pid → worker number
+    stopping = False
+
+    def spawn(n: int):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(_run_worker(app, sock, workers))
+        children[pid] = n
+        print(f"👷 Worker {n} started (pid {pid})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"🚀 DeepRetrieve API at http://{host}:{port} with {workers} worker(s)")
+    for n in range(workers):
+        spawn(n)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        n = children.pop(pid, None)
+        if n is None or stopping:
+            continue
+        print(f"⚠️ Worker {n} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)} — restarting")
+        time.sleep(_RESTART_DELAY_SECONDS)
+        if not stopping:
+            spawn(n)
+
+    sock.close()
+    print("👋 All workers stopped")
@@ -0,0 +1,165 @@
+# Push-based progress channel for ingestion jobs
+#
+# Publishers (executor threads running process_pdf) record the latest state in
+# the shared state database, so an SSE stream served by any API worker can
+# follow a job running in another one. Subscribers sleep on an
+# asyncio.Condition: publishes in the same process wake them at once, and
+# every PROGRESS_POLL_SECONDS they re-check for publishes from other workers.
+# Database reads and writes block (up to the 30s busy timeout while another
+# worker writes), so code on the event loop runs them in the default executor.
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Any, AsyncIterator, Tuple
+
+from mcp_server.config import JOB_RETENTION_SECONDS, PROGRESS_POLL_SECONDS, STATE_DB_PATH
+
+KEEPALIVE_SECONDS = 15
+
+
+class ProgressChannel:
+    """Latest-state pub/sub keyed by job ID.
+
+    Progress is a state, not a log, so each job keeps only its newest event
+    and a monotonically increasing event ID. A subscriber resuming with
+    Last-Event-ID gets the current state if it missed anything, otherwise it
+    waits for the next change. Finished jobs are dropped after
+    JOB_RETENTION_SECONDS.
+    """
+
+    def __init__(self, path: Path = STATE_DB_PATH, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._conditions: Dict[str, asyncio.Condition] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._conn = None
+        self._lock = threading.Lock()
+        self._conditions = {}
+        self._loop = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS progress (
+                    job_id TEXT PRIMARY KEY,
+                    seq INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    finished_at REAL
+                )"""
+            )
+            self._conn = conn
+        return self._conn
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach the event loop that subscribers run on (called at startup)."""
+        self._loop = loop
+
+    def publish(self, job_id: str, state: Dict[str, Any], final: bool = False):
+        """Record a new state for job_id. Safe to call from any thread or worker process.
+
+        Identical consecutive states are dropped so subscribers never see repeats.
+        """
+        encoded = json.dumps(state, sort_keys=True)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute("SELECT seq, state FROM progress WHERE job_id = ?", (job_id,)).fetchone()
+                if current is not None and current[1] == encoded and not final:
+                    conn.execute("ROLLBACK")
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO progress (job_id, seq, state, finished_at) VALUES (?, ?, ?, ?)",
+                    (job_id, current[0] + 1 if current else 1, encoded, time.time() if final else None),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._loop.create_task(self._notify(job_id))
+        else:
+            asyncio.run_coroutine_threadsafe(self._notify(job_id), self._loop)
+
+    async def _notify(self, job_id: str):
+        cond = self._conditions.get(job_id)
+        if cond is not None:
+            async with cond:
+                cond.notify_all()
+
+    def _row(self, job_id: str) -> Optional[Tuple[int, str, Optional[float]]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT seq, state, finished_at FROM progress WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+    def latest(self, job_id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        row = self._row(job_id)
+        return (row[0], json.loads(row[1])) if row else None
+
+    async def subscribe(self, job_id: str, last_event_id: int = 0) -> AsyncIterator[Optional[Tuple[int, Dict[str, Any]]]]:
+        """Yield (event_id, state) on every change after last_event_id.
+
+        Yields None every KEEPALIVE_SECONDS of silence so the caller can send
+        a keep-alive. Stops after the final state has been delivered.
+        """
+        cond = self._conditions.setdefault(job_id, asyncio.Condition())
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        while True:
+            row = await loop.run_in_executor(None, self._row, job_id)
+            if row is not None and row[0] > last_event_id:
+                last_event_id = row[0]
+                last_sent = loop.time()
+                yield row[0], json.loads(row[1])
+                continue
+            if row is not None and row[2] is not None:
+                return  # Finished, and the final state was delivered
+
+            async with cond:
+                # Re-check under the condition lock so a local publish can't slip in unseen
+                row = await loop.run_in_executor(None, self._row, job_id)
+                if row is None or row[0] <= last_event_id:
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=PROGRESS_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+            if loop.time() - last_sent >= KEEPALIVE_SECONDS:
+                last_sent = loop.time()
+                yield None
+
+    def gc(self) -> int:
+        """Drop finished jobs older than the retention window. Returns how many were removed."""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            conn = self._connect()
+            expired = [r[0] for r in conn.execute("SELECT job_id FROM progress WHERE finished_at < ?", (cutoff,))]
+            conn.execute("DELETE FROM progress WHERE finished_at < ?", (cutoff,))
+        for job_id in expired:
+            self._conditions.pop(job_id, None)
+        return len(expired)
+
+
+# Module-level singleton — shared by the job queue and the SSE routes
+progress_channel = ProgressChannel()
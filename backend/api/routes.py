@@ -1,16 +1,18 @@
 # API routes - 3 essential endpoints only
 
-from typing import Optional, List
+import logging
+from typing import Optional, List, Dict
 import asyncio
 import os
-import tempfile
-import shutil
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Depends, Header, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 import json
 
+logger = logging.getLogger(__name__)
+
 
 # Request/Response Models
 
@@ -46,9 +48,32 @@ class UploadResponse(BaseModel):
     success: bool
     message: str
     filename: str
+    doc_id: Optional[str] = None
+    replaced: Optional[str] = None  # doc_id of the version this upload replaced
     texts_added: int = 0
     images_added: int = 0
     tables_added: int = 0
+    caption_cache_hits: int = 0
+    caption_cache_misses: int = 0
+    caption_cache_hit_rate: Optional[float] = None
+    caption_routes: Dict[str, int] = {}  # images per captioning route (ocr / blip / both)
+    embedding: Dict[str, float] = {}  # chunks, tokens, padding ratio, throughput
+
+
+class ProfilingRequest(BaseModel):
+    requests: int = Field(default=1, ge=0, le=100, description="Profile the next N requests (0 disarms)")
+
+
+class UploadJobResponse(BaseModel):
+    success: bool
+    message: str
+    filename: str
+    job_id: Optional[str] = None
+    doc_id: Optional[str] = None
+    replaces: Optional[str] = None
+    status: str
+    content_hash: Optional[str] = None
+    duplicate: bool = False
 
 
 # Lazy imports
@@ -66,10 +91,19 @@ def get_llm():
     return generate_response, prepare_context_from_results, check_context_relevance, RELEVANCE_THRESHOLD
 
 
-router = APIRouter()
+def request_namespace(
+    namespace: Optional[str] = Query(default=None, description="Tenant namespace (default namespace if omitted)"),
+    x_deepretrieve_namespace: Optional[str] = Header(default=None),
+) -> str:
+    """Namespace a request works in: ?namespace= or the X-DeepRetrieve-Namespace header"""
+    from mcp_server.namespaces import get_namespace, InvalidNamespace
+    try:
+        return get_namespace(namespace or x_deepretrieve_namespace).name
+    except InvalidNamespace as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-# Global store for upload progress (filename -> {status, progress})
-UPLOAD_PROGRESS = {}
+
+router = APIRouter()
 
 
 @router.get("/ping")
@@ -97,28 +131,44 @@ async def list_tools():
 
 
 @router.post("/query", response_model=QueryResponse)
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, namespace: str = Depends(request_namespace)):
     """Ask a question - Truly Agentic RAG where Gemini decides which tools to use"""
     try:
         from mcp_server.retriever import search_similar
         from mcp_server.web_search import web_search
-        from mcp_server.llm import get_gemini_client
+        from mcp_server.llm import get_gemini_client, agent_config
         from mcp_server.config import GEMINI_MODEL
-        from google import genai
-        from google.genai import types
         
-        print(f"\n🤖 [AGENTIC RAG] Query: '{request.query}'")
+        from .prefetch import SpeculativeRetrieval
+        from mcp_server.telemetry import TurnTimer, agent_tool, run_in_context
+        from mcp_server.tool_results import ResultSet
+        from mcp_server.deadlines import Deadline, current_deadline, deadline_exceeded_result
+        from mcp_server.config import QUERY_DEADLINE_SECONDS
+        from mcp_server import resilience
+        
+        logger.info(f"\n🤖 [AGENTIC RAG] Query: '{request.query}' (namespace: {namespace})")
+        # Set on arrival by the admission middleware, so time spent queued counts
+        deadline = current_deadline() or Deadline(QUERY_DEADLINE_SECONDS)
+        
+        # Start retrieval now, in parallel with Gemini's first turn
+        prefetch = SpeculativeRetrieval(request.query, top_k=request.top_k, namespace=namespace)
         
         client = get_gemini_client()
         sources = []
         used_web = False
         tool_calls = []
+        results = ResultSet()  # Full tool results; the model gets compact ones and fetches by ID
         
         # Define Python functions that can be called
         def rag_retrieve_func(query: str, top_k: int = 5):
             """Search the multimodal RAG vector database for relevant documents, images, and tables. Use this first to find information from uploaded documents."""
-            print(f"🔍 [TOOL] rag_retrieve | query: '{query}' | top_k: {top_k}")
-            res = search_similar(query=query, top_k=int(top_k))
+            logger.info(f"🔍 [TOOL] rag_retrieve | query: '{query}' | top_k: {top_k}")
+            res = prefetch.take_rag(query, int(top_k), timeout=deadline.remaining())
+            if res is None:
+                if deadline.too_late_for_tools():
+                    logger.info("⏰ [TOOL] rag_retrieve skipped: deadline reached")
+                    return deadline_exceeded_result()
+                res = search_similar(query=query, top_k=int(top_k), namespace=namespace, timeout=deadline.remaining())
             for r in res:
                 if r.get("content"):
                     sources.append(Source(
@@ -129,12 +179,17 @@ async def query(request: QueryRequest):
                         score=r.get("score", 0)
                     ))
             tool_calls.append("rag_retrieve")
-            return res
+            return results.compact_rag(res)
         
         def web_search_func(query: str):
             """Search the web for information. Use this as fallback when RAG doesn't have sufficient information."""
-            print(f"🌐 [TOOL] web_search | query: '{query}'")
-            result = web_search(query=query, max_results=5, include_answer=True)
+            logger.info(f"🌐 [TOOL] web_search | query: '{query}'")
+            result = prefetch.take_web(query, timeout=deadline.remaining())
+            if result is None:
+                if deadline.too_late_for_tools():
+                    logger.info("⏰ [TOOL] web_search skipped: deadline reached")
+                    return deadline_exceeded_result()
+                result = web_search(query=query, max_results=5, include_answer=True, timeout=deadline.remaining())
             nonlocal used_web
             used_web = True
             if result.get("success") and isinstance(result.get("results"), list):
@@ -147,7 +202,18 @@ async def query(request: QueryRequest):
                         score=r.get("score", 0)
                     ))
             tool_calls.append("web_search")
-            return {"success": result.get("success"), "results": result.get("results"), "answer": result.get("answer")}
+            return results.compact_web(result)
+        
+        def fetch_result_func(result_id: str):
+            """Fetch the full content of one rag_retrieve or web_search result by its ID (e.g. "r2"). Use this when a trimmed snippet is not enough, such as for a complete table."""
+            logger.info(f"📄 [TOOL] fetch_result | id: '{result_id}'")
+            tool_calls.append("fetch_result")
+            return results.fetch(result_id)
+        
+        turns = TurnTimer()
+        rag_retrieve_func = agent_tool(rag_retrieve_func, "query.tool.rag_retrieve", turns)
+        web_search_func = agent_tool(web_search_func, "query.tool.web_search", turns)
+        fetch_result_func = agent_tool(fetch_result_func, "query.tool.fetch_result", turns)
         
         # Build conversation memory context
         history_text = ""
@@ -166,6 +232,7 @@ TOOL SELECTION GUIDELINES:
 2. If the knowledge base results are NOT relevant or insufficient for the question, use web_search
 3. Use web_search when asked about topics clearly outside your knowledge base (e.g., current events, general knowledge, frameworks, technologies not in your documents)
 4. Use the conversation history to understand follow-up questions and resolve pronouns/references
+5. Search results are trimmed snippets with IDs; call fetch_result_func with an ID when you need a result's full content
 
 RESPONSE GUIDELINES:
 1. Provide highly detailed, comprehensive, and exhaustive answers. Never be brief unless explicitly asked.
@@ -178,20 +245,46 @@ RESPONSE GUIDELINES:
         prompt = f"""{history_section}
 Question: {request.query}"""
 
-        config = types.GenerateContentConfig(
-            tools=[rag_retrieve_func, web_search_func],
+        config = agent_config(
+            tools=[rag_retrieve_func, web_search_func, fetch_result_func],
             system_instruction=system_instruction,
-            temperature=0.3
+            temperature=0.3,
+            # Each model request may use at most what is left of the deadline
+            timeout=deadline.remaining()
         )
 
-        print("🤖 [AGENT] Gemini deciding which tools to use...")
+        logger.info("🤖 [AGENT] Gemini deciding which tools to use...")
         chat = client.chats.create(model=GEMINI_MODEL, config=config)
-        response = chat.send_message(prompt)
+
+        def answer():
+            # A retry replays the whole function-calling loop, tools included: start each
+            # attempt from scratch so its sources and tool calls aren't recorded twice
+            nonlocal used_web, results
+            sources.clear()
+            tool_calls.clear()
+            used_web = False
+            results = ResultSet()
+            return chat.send_message(prompt)
+
+        try:
+            # Off the event loop, so other requests keep being served while the agent runs.
+            # Transient Gemini errors are retried. run_in_context registers the thread with
+            # the request's profile, like the prefetch
+            response = await asyncio.wait_for(
+                asyncio.to_thread(run_in_context(resilience.gemini.call, answer)), timeout=deadline.remaining()
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"No answer within the {deadline.budget:g}s deadline")
+        except resilience.CircuitOpen as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        finally:
+            turns.finish()
+            prefetch.close()
         
         # Get final answer from agent
         answer = response.text if response.text else "I couldn't generate an answer."
         
-        print(f"✅ [AGENT] Completed. Tools used: {tool_calls}")
+        logger.info(f"✅ [AGENT] Completed. Tools used: {tool_calls}")
         
         return QueryResponse(
             success=True,
@@ -202,22 +295,36 @@ Question: {request.query}"""
             error=None
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/query-stream")
-async def query_stream(request: QueryRequest):
+async def query_stream(request: QueryRequest, namespace: str = Depends(request_namespace)):
     """Ask a question with streaming response using Server-Sent Events (SSE)"""
     try:
         from mcp_server.retriever import search_similar
         from mcp_server.web_search import web_search
-        from mcp_server.llm import get_gemini_client
+        from mcp_server.llm import get_gemini_client, agent_config
         from mcp_server.config import GEMINI_MODEL
-        from google import genai
-        from google.genai import types
         
-        print(f"\n🤖 [AGENTIC RAG STREAM] Query: '{request.query}'")
+        from .prefetch import SpeculativeRetrieval
+        from mcp_server.telemetry import TurnTimer, agent_tool, run_in_context
+        from mcp_server.tool_results import ResultSet
+        from mcp_server.deadlines import Deadline, current_deadline, deadline_exceeded_result
+        from mcp_server.config import QUERY_DEADLINE_SECONDS
+        from mcp_server import resilience
+        
+        from mcp_server.namespaces import get_namespace
+        
+        logger.info(f"\n🤖 [AGENTIC RAG STREAM] Query: '{request.query}' (namespace: {namespace})")
+        deadline = current_deadline() or Deadline(QUERY_DEADLINE_SECONDS)
+        images_url = f"http://localhost:8000{get_namespace(namespace).images_url}"
+        
+        # Start retrieval now, in parallel with Gemini's first turn
+        prefetch = SpeculativeRetrieval(request.query, top_k=request.top_k, namespace=namespace)
         
         # Build generator that yields SSE strings
         async def event_generator():
@@ -225,11 +332,17 @@ async def query_stream(request: QueryRequest):
             sources = []
             used_web = False
             tool_calls = []
+            results = ResultSet()  # Full tool results; the model gets compact ones and fetches by ID
             
             def rag_retrieve_func(query: str, top_k: int = 5):
                 """Search the multimodal RAG vector database for relevant documents, images, and tables. Use this first to find information from uploaded documents."""
-                print(f"🔍 [TOOL] rag_retrieve | query: '{query}'")
-                res = search_similar(query=query, top_k=int(top_k))
+                logger.info(f"🔍 [TOOL] rag_retrieve | query: '{query}'")
+                res = prefetch.take_rag(query, int(top_k), timeout=deadline.remaining())
+                if res is None:
+                    if deadline.too_late_for_tools():
+                        logger.info("⏰ [TOOL] rag_retrieve skipped: deadline reached")
+                        return deadline_exceeded_result()
+                    res = search_similar(query=query, top_k=int(top_k), namespace=namespace, timeout=deadline.remaining())
                 for r in res:
                     if r.get("content"):
                         src_type = r.get("type", "unknown")
@@ -243,10 +356,12 @@ async def query_stream(request: QueryRequest):
                             
                         # If the source actually has an image path, format its URL
                         image_url = None
+                        thumbnail_url = None
                         if r.get("path"):
-                            import os
                             filename = os.path.basename(r.get("path"))
-                            image_url = f"http://localhost:8000/images/{filename}"
+                            image_url = f"{images_url}/{filename}"
+                        if r.get("thumbnail_path"):
+                            thumbnail_url = f"{images_url}/thumbs/{os.path.basename(r.get('thumbnail_path'))}"
                             
                         sources.append({
                             "type": src_type,
@@ -254,16 +369,22 @@ async def query_stream(request: QueryRequest):
                             "source": r.get("source"),
                             "page": r.get("page"),
                             "image_url": image_url,
+                            "thumbnail_url": thumbnail_url,
                             "score": r.get("score", 0)
                         })
                 tool_calls.append("rag_retrieve")
-                return res
+                return results.compact_rag(res)
             
             def web_search_func(query: str):
                 """Search the web for information. Use this as fallback when RAG doesn't have sufficient information."""
                 nonlocal used_web
-                print(f"🌐 [TOOL] web_search | query: '{query}'")
-                result = web_search(query=query, max_results=5, include_answer=True)
+                logger.info(f"🌐 [TOOL] web_search | query: '{query}'")
+                result = prefetch.take_web(query, timeout=deadline.remaining())
+                if result is None:
+                    if deadline.too_late_for_tools():
+                        logger.info("⏰ [TOOL] web_search skipped: deadline reached")
+                        return deadline_exceeded_result()
+                    result = web_search(query=query, max_results=5, include_answer=True, timeout=deadline.remaining())
                 used_web = True
                 if result.get("success") and isinstance(result.get("results"), list):
                     for r in result["results"][:5]:
@@ -274,7 +395,18 @@ async def query_stream(request: QueryRequest):
                             "score": r.get("score", 0)
                         })
                 tool_calls.append("web_search")
-                return {"success": result.get("success"), "results": result.get("results", []), "answer": result.get("answer")}
+                return results.compact_web(result)
+            
+            def fetch_result_func(result_id: str):
+                """Fetch the full content of one rag_retrieve or web_search result by its ID (e.g. "r2"). Use this when a trimmed snippet is not enough, such as for a complete table."""
+                logger.info(f"📄 [TOOL] fetch_result | id: '{result_id}'")
+                tool_calls.append("fetch_result")
+                return results.fetch(result_id)
+            
+            turns = TurnTimer()
+            rag_retrieve_func = agent_tool(rag_retrieve_func, "query.tool.rag_retrieve", turns)
+            web_search_func = agent_tool(web_search_func, "query.tool.web_search", turns)
+            fetch_result_func = agent_tool(fetch_result_func, "query.tool.fetch_result", turns)
             
             history_text = ""
             if request.conversation_history:
@@ -294,6 +426,7 @@ TOOL SELECTION GUIDELINES:
 1. CRITICAL: YOU MUST ALWAYS trigger `rag_retrieve` FIRST to check the local document knowledge base before answering ANY user request! Do NOT answer general or theoretical questions using your own parametric memory. Prove you are a RAG agent by ALWAYS doing a search.
 2. If the local knowledge base results are NOT relevant, insufficient, or the user asks for modern/recent events, YOU MUST invoke `web_search`.
 3. Use the conversation history to understand follow-up questions.
+4. Search results are trimmed snippets with IDs; call `fetch_result_func` with an ID when you need a result's full content (e.g. a complete table).
 
 RESPONSE GUIDELINES:
 1. Provide highly detailed, comprehensive, and exhaustive answers. Never be brief unless explicitly asked.
@@ -303,10 +436,11 @@ RESPONSE GUIDELINES:
 5. CRITICAL: If the retrieved information contains tabular data, you MUST convert and format it perfectly as a strict Markdown table so it renders correctly on the frontend!
 6. IMPORTANT: Do NOT include source citations, file names, or page numbers in your answer. The sources will be provided separately."""
 
-            config = types.GenerateContentConfig(
-                tools=[rag_retrieve_func, web_search_func],
+            config = agent_config(
+                tools=[rag_retrieve_func, web_search_func, fetch_result_func],
                 system_instruction=system_instruction,
-                temperature=0.3
+                temperature=0.3,
+                timeout=deadline.remaining()
             )
 
             prompt = f"""{history_section}
@@ -314,11 +448,36 @@ Question: {request.query}"""
             
             try:
                 chat = client.chats.create(model=GEMINI_MODEL, config=config)
-                stream_response = chat.send_message_stream(prompt)
+                stream_response = None
+
+                def open_stream():
+                    # Opening the stream and reading its first chunk can be retried; nothing
+                    # has reached the client yet. Later chunks can't, they were already sent.
+                    # A retry replays the tool calls before the first chunk, so each attempt
+                    # starts from scratch instead of recording its sources twice
+                    nonlocal stream_response, used_web, results
+                    sources.clear()
+                    tool_calls.clear()
+                    used_web = False
+                    results = ResultSet()
+                    stream_response = iter(chat.send_message_stream(prompt))
+                    return next(stream_response, None)
                 
                 metadata_sent = False
                 
-                for chunk in stream_response:
+                while True:
+                    # Each model turn (and the tools it calls) runs off the event loop, bounded by the deadline
+                    try:
+                        # run_in_context registers the thread with the request's profile
+                        if stream_response is None:
+                            step = asyncio.to_thread(run_in_context(resilience.gemini.call, open_stream))
+                        else:
+                            step = asyncio.to_thread(run_in_context(next, stream_response, None))
+                        chunk = await asyncio.wait_for(step, timeout=deadline.remaining())
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(f"No complete answer within the {deadline.budget:g}s deadline")
+                    if chunk is None:
+                        break
                     if chunk.text:
                         if not metadata_sent:
                             # Send metadata just before the first text chunk
@@ -346,128 +505,443 @@ Question: {request.query}"""
                     
             except Exception as e:
                 yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            finally:
+                turns.finish()
+                prefetch.close()
 
-            print(f"✅ [AGENT STR] Done. Tools: {tool_calls}")
+            logger.info(f"✅ [AGENT STR] Done. Tools: {tool_calls}")
             yield "event: done\ndata: {}\n\n"
 
-        return StreamingResponse(event_generator(), media_type="text/event-stream")
+        # The generator's finally never runs if the client leaves before streaming starts
+        return StreamingResponse(
+            event_generator(), media_type="text/event-stream", background=BackgroundTask(prefetch.close)
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/upload", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
-    """Upload a PDF to the knowledge base"""
+async def _queue_upload(
+    received, filename: str, priority: int, namespace: str,
+    replace: bool = False, replaces: Optional[str] = None
+) -> UploadJobResponse:
+    """Queue a received upload for ingestion unless the same bytes are already indexed in the namespace
+
+    replace=True swaps out the active document with the same filename;
+    replaces names the doc_id to swap out explicitly (PUT /documents/{doc_id}).
+    """
+    from .jobs import ingestion_queue
+    from .documents import get_registry
+    from mcp_server.retriever import find_document_by_hash
+    
+    logger.info(f"💾 Received {filename}: {received.size} bytes, sha256={received.sha256[:12]}")
+    
+    # Until a job owns the spooled file it is ours to remove, also when a lookup or the submit fails
+    try:
+        loop = asyncio.get_running_loop()
+        document_registry = get_registry(namespace)
+        if replace and replaces is None:
+            target = await loop.run_in_executor(None, document_registry.active_for_filename, filename)
+            replaces = target["doc_id"] if target else None
+
+        if replaces is not None:
+            target = await loop.run_in_executor(None, document_registry.get, replaces)
+            # Same bytes as the version being replaced — nothing to do
+            if target is not None and target["content_hash"] == received.sha256:
+                os.unlink(received.path)
+                return UploadJobResponse(
+                    success=True, message=f"{filename} is unchanged", filename=filename, doc_id=replaces,
+                    status="completed", content_hash=received.sha256, duplicate=True
+                )
+            # Two replacements of one document would both publish — keep it to one at a time
+            pending = await loop.run_in_executor(None, ingestion_queue.active_replacing, replaces)
+            if pending is not None:
+                raise HTTPException(
+                    status_code=409, detail=f"Document {replaces} is already being replaced by job {pending.id}"
+                )
+        else:
+            # Same file already being processed — follow that job instead
+            active = await loop.run_in_executor(None, ingestion_queue.active_for_hash, received.sha256, namespace)
+            if active is not None:
+                os.unlink(received.path)
+                return UploadJobResponse(
+                    success=True, message=f"{filename} is already being processed", filename=filename,
+                    job_id=active.id, doc_id=active.doc_id, status=active.status,
+                    content_hash=received.sha256, duplicate=True
+                )
+
+            # Same file already ingested — nothing to do
+            existing = await loop.run_in_executor(
+                None, lambda: find_document_by_hash(received.sha256, namespace=namespace)
+            )
+            if existing is not None:
+                os.unlink(received.path)
+                logger.info(f"♻️  {filename} matches already-ingested {existing.get('source')}")
+                return UploadJobResponse(
+                    success=True, message=f"Already ingested as {existing.get('source')}", filename=filename,
+                    doc_id=existing.get("doc_id"), status="completed", content_hash=received.sha256, duplicate=True
+                )
+
+        # The job takes ownership of the temp file and removes it when finished
+        job = await ingestion_queue.submit(
+            received.path, filename=filename, priority=priority, content_hash=received.sha256,
+            replaces=replaces, namespace=namespace
+        )
+    except BaseException:
+        try:
+            os.unlink(received.path)
+        except OSError:
+            pass  # Already removed by an early return
+        raise
+    logger.info(f"📥 Queued job {job.id} for {filename}" + (f" (replaces {replaces})" if replaces else ""))
+    
+    return UploadJobResponse(
+        success=True,
+        message=f"Queued {filename}" + (" as a replacement" if replaces else ""),
+        filename=filename,
+        job_id=job.id,
+        doc_id=job.doc_id,
+        replaces=replaces,
+        status=job.status,
+        content_hash=received.sha256
+    )
+
+
+@router.post("/upload", response_model=UploadJobResponse, status_code=202)
+async def upload_pdf(
+    file: UploadFile = File(...), priority: int = 0, replace: bool = False,
+    namespace: str = Depends(request_namespace)
+):
+    """Upload a PDF and queue it for ingestion — returns a job ID immediately
+
+    replace=true swaps out the current document with the same filename once
+    the new version is fully indexed.
+    """
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
     try:
-        from .pdf_processor import process_pdf
-        import logging
-        logger = logging.getLogger(__name__)
-        
-        logger.info(f"📄 Starting upload: {file.filename}")
+        from .upload_receiver import receive_upload, iter_upload_file
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
+        received = await receive_upload(iter_upload_file(file))
+        return await _queue_upload(received, file.filename, priority, namespace, replace=replace)
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload-stream", response_model=UploadJobResponse, status_code=202)
+async def upload_pdf_stream(
+    request: Request, filename: str, priority: int = 0, replace: bool = False,
+    namespace: str = Depends(request_namespace)
+):
+    """Upload a PDF as the raw request body — hashed and spooled while it arrives"""
+    if not filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    
+    try:
+        from .upload_receiver import receive_upload
         
-        logger.info(f"💾 Saved to temp: {tmp_path}")
+        received = await receive_upload(request.stream())
+        if received.size == 0:
+            os.unlink(received.path)
+            raise HTTPException(status_code=400, detail="Empty request body")
+        return await _queue_upload(received, filename, priority, namespace, replace=replace)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/namespaces")
+async def list_namespaces():
+    """Namespaces with data on this server and where each one's vectors live"""
+    from mcp_server.namespaces import get_namespace, known_namespaces
+    from mcp_server.config import NAMESPACE_MODE
+    return {"mode": NAMESPACE_MODE, "namespaces": [get_namespace(n).describe() for n in known_namespaces()]}
+
+
+@router.get("/documents")
+async def list_documents(source: Optional[str] = None, namespace: str = Depends(request_namespace)):
+    """Registered documents, newest first (optionally only those with this filename)"""
+    from .documents import get_registry
+    loop = asyncio.get_running_loop()
+    documents = await loop.run_in_executor(None, get_registry(namespace).list, source)
+    return {"namespace": namespace, "documents": documents, "count": len(documents)}
+
+
+@router.get("/documents/{doc_id}")
+async def get_document(doc_id: str, namespace: str = Depends(request_namespace)):
+    """One registered document with the image and table files it owns"""
+    from .documents import get_registry
+    document_registry = get_registry(namespace)
+    loop = asyncio.get_running_loop()
+    document = await loop.run_in_executor(None, document_registry.get, doc_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    document["artifacts"] = await loop.run_in_executor(None, document_registry.artifacts, doc_id)
+    return document
+
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str, namespace: str = Depends(request_namespace)):
+    """Delete one document's chunks and the images/tables no other document uses"""
+    from .documents import delete_document as delete_registered, DocumentBusy
+    from .jobs import ingestion_queue
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, ingestion_queue.active_replacing, doc_id) is not None:
+        raise HTTPException(status_code=409, detail=f"Document {doc_id} is being replaced")
+    try:
+        deleted = await loop.run_in_executor(None, delete_registered, doc_id, namespace)
+    except DocumentBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if deleted is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    return {"success": True, **deleted}
+
+
+@router.delete("/documents")
+async def delete_documents_by_source(source: str, namespace: str = Depends(request_namespace)):
+    """Delete everything ingested under a filename, including chunks from before the registry"""
+    from .documents import delete_source
+    try:
+        loop = asyncio.get_running_loop()
+        deleted = await loop.run_in_executor(None, delete_source, source, namespace)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not deleted["documents_deleted"] and not deleted["points_deleted"]:
+        if deleted["indexing"]:
+            raise HTTPException(status_code=409, detail=f"{source} is still being indexed")
+        raise HTTPException(status_code=404, detail=f"Nothing ingested from {source}")
+    return {"success": True, **deleted}
+
+
+@router.put("/documents/{doc_id}", response_model=UploadJobResponse, status_code=202)
+async def replace_document(
+    doc_id: str, file: UploadFile = File(...), priority: int = 0,
+    namespace: str = Depends(request_namespace)
+):
+    """Upload a new version of a document — it replaces the old one atomically once indexed"""
+    from .documents import get_registry
+    if not file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, get_registry(namespace).get, doc_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+    
+    try:
+        from .upload_receiver import receive_upload, iter_upload_file
         
-        try:
-            logger.info("🔄 Processing PDF in background thread...")
-            loop = asyncio.get_event_loop()
-            
-            # Initialize progress state
-            UPLOAD_PROGRESS[file.filename] = {"status": "Starting processing...", "progress": 0}
-            
-            def update_progress(msg: str, pct: int):
-                UPLOAD_PROGRESS[file.filename] = {"status": msg, "progress": pct}
-                
-            texts_added, images_added, tables_added = await loop.run_in_executor(
-                None, lambda: process_pdf(tmp_path, original_filename=file.filename, progress_callback=update_progress)
-            )
-            logger.info(f"✅ Done! Added {texts_added} texts, {images_added} images, {tables_added} tables")
-            
-            # Mark complete explicitly (just in case)
-            UPLOAD_PROGRESS[file.filename] = {"status": "Upload complete!", "progress": 100}
-            
-            return UploadResponse(
-                success=True,
-                message=f"Processed {file.filename}",
-                filename=file.filename,
-                texts_added=texts_added,
-                images_added=images_added,
-                tables_added=tables_added
-            )
-        except Exception as process_err:
-            UPLOAD_PROGRESS[file.filename] = {"status": f"Error: {process_err}", "progress": 100}
-            raise process_err
-        finally:
-            os.unlink(tmp_path)
-            
+        received = await receive_upload(iter_upload_file(file))
+        return await _queue_upload(received, file.filename, priority, namespace, replaces=doc_id)
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/jobs")
+async def list_jobs():
+    """List ingestion jobs, newest first"""
+    from .jobs import ingestion_queue
+    loop = asyncio.get_running_loop()
+    jobs = [job.to_dict() for job in await loop.run_in_executor(None, ingestion_queue.list)]
+    return {"jobs": jobs, "count": len(jobs), "queued": await loop.run_in_executor(None, ingestion_queue.queue_depth)}
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Get the status of an ingestion job"""
+    from .jobs import ingestion_queue
+    job = await asyncio.get_running_loop().run_in_executor(None, ingestion_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+
+@router.get("/jobs/{job_id}/result", response_model=UploadResponse)
+async def job_result(job_id: str):
+    """Get the ingestion result of a completed job"""
+    from .jobs import ingestion_queue, COMPLETED
+    job = await asyncio.get_running_loop().run_in_executor(None, ingestion_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}")
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=job.error or f"Job was {job.status}")
+    return UploadResponse(success=True, message=f"Processed {job.filename}", **job.result)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running ingestion job"""
+    from .jobs import ingestion_queue
+    loop = asyncio.get_running_loop()
+    job = await loop.run_in_executor(None, ingestion_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    cancelled = await loop.run_in_executor(None, ingestion_queue.cancel, job_id)
+    # Re-read: the job may have changed state in another worker meanwhile
+    job = await loop.run_in_executor(None, ingestion_queue.get, job_id) or job
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return {"success": True, "job_id": job_id, "status": job.status}
+
+
+def _last_event_id(request: Request) -> int:
+    """Parse the SSE Last-Event-ID header sent by reconnecting clients"""
+    try:
+        return int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        return 0
+
+
+async def _job_progress_events(job_id: str, last_event_id: int = 0):
+    """SSE events for one job — pushed only when its progress changes"""
+    from .progress import progress_channel
+    
+    async for event in progress_channel.subscribe(job_id, last_event_id):
+        if event is None:
+            yield ": keep-alive\n\n"
+            continue
+        event_id, state = event
+        yield f"id: {event_id}\ndata: {json.dumps(state)}\n\n"
+
+
+@router.get("/jobs/{job_id}/progress")
+async def job_progress_stream(job_id: str, request: Request):
+    """Stream an ingestion job's progress over SSE (supports Last-Event-ID resume)"""
+    from .progress import progress_channel
+    if await asyncio.get_running_loop().run_in_executor(None, progress_channel.latest, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    last_event_id = _last_event_id(request)
+    
+    async def event_generator():
+        yield "retry: 1000\n"
+        if not last_event_id:
+            # Send an immediate connection confirmation
+            yield f"data: {json.dumps({'status': 'Connected context stream...', 'progress': 0})}\n\n"
+        async for event in _job_progress_events(job_id, last_event_id):
+            yield event
+    
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
 @router.get("/upload-progress/{filename}")
 async def upload_progress_stream(filename: str):
-    """Stream PDF processing progress over SSE"""
+    """Stream progress of the next job for a filename over SSE (legacy, prefer /jobs/{id}/progress)"""
+    from .jobs import ingestion_queue
+    import time
+    connected_at = time.time()
+    
     async def event_generator():
-        # Send an immediate connection confirmation
         yield f"data: {json.dumps({'status': 'Connected context stream...', 'progress': 0})}\n\n"
         
-        while True:
-            # Poll the global dictionary for this filename's state
-            state = UPLOAD_PROGRESS.get(filename)
-            if state:
-                yield f"data: {json.dumps(state)}\n\n"
-                
-                # Stop if it reached completion or hit an error
-                if state["progress"] >= 100 or "Error" in state["status"]:
-                    break
-            else:
-                # If the key doesn't exist yet, it's just initializing
-                yield f"data: {json.dumps({'status': 'Waiting for processor to begin...', 'progress': 0})}\n\n"
-                
-            await asyncio.sleep(0.5)
-            
+        # Clients open this stream before the upload finishes, so wait for the job to appear
+        job = None
+        while job is None:
+            yield f"data: {json.dumps({'status': 'Waiting for processor to begin...', 'progress': 0})}\n\n"
+            job = await ingestion_queue.wait_for_filename(filename, since=connected_at, timeout=15)
+        
+        async for event in _job_progress_events(job.id):
+            yield event
+    
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
 @router.delete("/reset")
-async def reset_collection():
-    """Reset Qdrant collection and clear all extracted images/tables"""
+async def reset_collection(namespace: str = Depends(request_namespace)):
+    """Reset a namespace's vectors and clear its extracted images/tables"""
     try:
-        from mcp_server.retriever import get_qdrant_client, create_collection, COLLECTION_NAME
-        from mcp_server.config import IMAGES_FOLDER, TABLES_FOLDER
+        from mcp_server.retriever import drop_namespace, ensure_namespace
+        from mcp_server.namespaces import get_namespace
+        from .documents import get_registry
 
-        # 1. Reset Qdrant collection
-        client = get_qdrant_client()
-        if client.collection_exists(COLLECTION_NAME):
-            client.delete_collection(COLLECTION_NAME)
-        create_collection(COLLECTION_NAME)
+        ns = get_namespace(namespace)
 
-        # 2. Clear extracted images
+        # 1. Reset the namespace's collection (or its partition of the shared one)
+        drop_namespace(ns.name)
+        ensure_namespace(ns.name)
+
+        # 2. Clear extracted images and their thumbnails
         images_deleted = 0
-        if IMAGES_FOLDER.exists():
-            for f in IMAGES_FOLDER.iterdir():
+        if ns.images_folder.exists():
+            for f in ns.images_folder.iterdir():
                 if f.is_file():
                     f.unlink()
                     images_deleted += 1
+        if ns.thumbnails_folder.exists():
+            for f in ns.thumbnails_folder.iterdir():
+                if f.is_file():
+                    f.unlink()
 
         # 3. Clear extracted tables
         tables_deleted = 0
-        if TABLES_FOLDER.exists():
-            for f in TABLES_FOLDER.iterdir():
+        if ns.tables_folder.exists():
+            for f in ns.tables_folder.iterdir():
                 if f.is_file():
                     f.unlink()
                     tables_deleted += 1
 
+        # 4. Forget all registered documents
+        await asyncio.get_running_loop().run_in_executor(None, get_registry(ns.name).clear)
+
         return {
             "success": True,
-            "message": f"Reset complete — Qdrant collection recreated, {images_deleted} images and {tables_deleted} tables deleted.",
+            "message": f"Reset complete — namespace '{ns.name}' emptied, {images_deleted} images and {tables_deleted} tables deleted.",
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/admin/profiling")
+async def arm_profiling(request: ProfilingRequest):
+    """Profile the next N API requests (uploads also profile their ingestion job)"""
+    from mcp_server.profiling import arm
+    return {"success": True, "armed": arm(request.requests)}
+
+
+@router.get("/admin/profiles")
+async def list_profiles():
+    """Saved profiles, newest first"""
+    from mcp_server.profiling import profile_ring, armed
+    from mcp_server.config import PROFILING_ENABLED
+    return {"armed": armed(), "header_enabled": PROFILING_ENABLED, "profiles": profile_ring.list()}
+
+
+@router.get("/admin/profiles/{name}")
+async def download_profile(name: str):
+    """Download one profile as collapsed stacks (flamegraph.pl / speedscope)"""
+    from mcp_server.profiling import profile_ring
+    path = profile_ring.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=name)
+
+
+@router.get("/admin/compute")
+async def compute_status():
+    """Compute scheduler state of this worker: per-stage thread budget, priority, queued and running calls"""
+    from mcp_server.compute import scheduler
+    return {"pid": os.getpid(), **scheduler.snapshot()}
+
+
+@router.get("/admin/admission")
+async def admission_status():
+    """Admission control state of this worker: per-endpoint-group slots in use, queue and Retry-After estimate"""
+    from .admission import limiters
+    return {"pid": os.getpid(), **{name: limiter.snapshot() for name, limiter in limiters.items()}}
+
+
+@router.get("/admin/dependencies")
+async def dependency_status():
+    """Resilience state of this worker's external dependencies: circuit, recent latency, hedge delay"""
+    from mcp_server.resilience import dependencies
+    return {"pid": os.getpid(), **{name: dep.snapshot() for name, dep in dependencies.items()}}
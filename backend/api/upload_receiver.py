@@ -0,0 +1,66 @@
+# Streaming upload receiver — spools to disk off-loop while hashing in flight
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO
+
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+@dataclass
+class ReceivedUpload:
+    path: str
+    sha256: str
+    size: int
+
+
+def _write_and_hash(fh: BinaryIO, hasher, chunk: bytes):
+    # hashlib and file writes both release the GIL on large buffers
+    hasher.update(chunk)
+    fh.write(chunk)
+
+
+async def iter_upload_file(file: UploadFile, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read a multipart UploadFile in async chunks."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def receive_upload(chunks: AsyncIterator[bytes], suffix: str = ".pdf") -> ReceivedUpload:
+    """Spool an async stream of chunks to a temp file and SHA-256 it on the way.
+
+    Disk writes and hashing run in the default executor, one chunk behind the
+    reader, so the event loop only awaits I/O. The caller owns the returned file.
+    """
+    loop = asyncio.get_running_loop()
+    hasher = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    fh = os.fdopen(fd, "wb")
+    size = 0
+    pending = None
+
+    try:
+        async for chunk in chunks:
+            if pending is not None:
+                await pending
+            size += len(chunk)
+            pending = loop.run_in_executor(None, _write_and_hash, fh, hasher, chunk)
+        if pending is not None:
+            await pending
+        await loop.run_in_executor(None, fh.close)
+    except BaseException:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        fh.close()
+        os.unlink(path)
+        raise
+
+    return ReceivedUpload(path=path, sha256=hasher.hexdigest(), size=size)
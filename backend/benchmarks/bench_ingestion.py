@@ -0,0 +1,238 @@
+# Ingestion benchmark — process_pdf over synthetic PDFs against embedded Qdrant
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_ingestion --out bench_ingestion.json
+#   python -m benchmarks.bench_ingestion --baseline previous.json
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+# Must be set before mcp_server is imported: keep vectors in memory, off the cloud
+os.environ.setdefault("QDRANT_PATH", ":memory:")
+
+from .synthetic_pdfs import generate_corpus
+
+STAGES = ("extract_text", "extract_images", "extract_tables", "embedding", "upsert")
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None if the platform can't tell us cheaply."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class StageRecorder:
+    """Accumulates wall time, call counts and peak RSS per pipeline stage.
+
+    A sampler thread polls RSS every few milliseconds and raises the peak of
+    every stage that is active at that moment, so stages that run many short
+    calls (embedding, upsert) still get a meaningful peak.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stats: Dict[str, Dict] = {}
+        self._active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {stage: {"seconds": 0.0, "calls": 0, "peak_rss_mb": None} for stage in STAGES}
+
+    def start(self):
+        self.reset()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _raise_peak(self, rss: Optional[int]):
+        if rss is None:
+            return
+        rss_mb = rss / (1024 * 1024)
+        with self._lock:
+            for stage, depth in self._active.items():
+                if depth > 0:
+                    peak = self.stats[stage]["peak_rss_mb"]
+                    if peak is None or rss_mb > peak:
+                        self.stats[stage]["peak_rss_mb"] = round(rss_mb, 1)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._raise_peak(_current_rss_bytes())
+
+    @contextmanager
+    def stage(self, name: str):
+        with self._lock:
+            self._active[name] = self._active.get(name, 0) + 1
+        self._raise_peak(_current_rss_bytes())
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._raise_peak(_current_rss_bytes())
+            with self._lock:
+                self._active[name] -= 1
+                self.stats[name]["seconds"] += elapsed
+                self.stats[name]["calls"] += 1
+
+    def wrap(self, name: str, fn):
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return fn(*args, **kwargs)
+        return timed
+
+
+def instrument(recorder: StageRecorder, artifacts_dir: Path):
+    """Patch the pdf_processor module so process_pdf reports each stage to recorder.
+
+    process_pdf resolves its stage functions and output folders through module
+    globals, so wrapping them here times exactly what a real upload runs while
+    keeping extracted images/tables out of the real extracted_content folder.
+    """
+    from api import pdf_processor
+
+    pdf_processor.OUTPUT_FOLDER = artifacts_dir
+    pdf_processor.IMAGES_FOLDER = artifacts_dir / "images"
+    pdf_processor.TABLES_FOLDER = artifacts_dir / "tables"
+    # Fresh caption cache per run, so earlier runs don't turn captioning into cache hits
+    pdf_processor.caption_cache.path = artifacts_dir / "caption_cache.sqlite3"
+
+    pdf_processor.extract_text_from_pdf = recorder.wrap("extract_text", pdf_processor.extract_text_from_pdf)
+    pdf_processor.extract_images_from_pdf = recorder.wrap("extract_images", pdf_processor.extract_images_from_pdf)
+    pdf_processor.extract_tables_from_pdf = recorder.wrap("extract_tables", pdf_processor.extract_tables_from_pdf)
+    pdf_processor.embed_texts = recorder.wrap("embedding", pdf_processor.embed_texts)
+
+    client = pdf_processor.get_qdrant_client()
+    client.upsert = recorder.wrap("upsert", client.upsert)
+    return pdf_processor
+
+
+def run(out_dir: Path, scale: int = 1, repeat: int = 1) -> Dict:
+    from mcp_server.retriever import create_collection
+
+    corpus = generate_corpus(out_dir, scale=scale)
+    recorder = StageRecorder()
+    pdf_processor = instrument(recorder, out_dir / "extracted_content")
+    recorder.start()
+
+    # Warm-up: load BLIP / EasyOCR / BGE once so model loading isn't billed to the first document
+    create_collection(recreate=True)
+    pdf_processor._captioner._load()
+    pdf_processor.embed_texts(["warm-up"])
+
+    documents = []
+    try:
+        for item in corpus:
+            for attempt in range(repeat):
+                create_collection(recreate=True)
+                recorder.reset()
+                rss_before = _current_rss_bytes()
+
+                stats: Dict[str, float] = {}
+                start = time.perf_counter()
+                texts, images, tables = pdf_processor.process_pdf(str(item["path"]), stats=stats)
+                wall = time.perf_counter() - start
+
+                stages = {}
+                for stage, stat in recorder.stats.items():
+                    stages[stage] = {
+                        "seconds": round(stat["seconds"], 4),
+                        "calls": stat["calls"],
+                        "pages_per_second": round(item["pages"] / stat["seconds"], 3) if stat["seconds"] else None,
+                        "peak_rss_mb": stat["peak_rss_mb"],
+                    }
+
+                documents.append({
+                    "kind": item["kind"],
+                    "attempt": attempt,
+                    "pages": item["pages"],
+                    "size_bytes": item["path"].stat().st_size,
+                    "wall_seconds": round(wall, 4),
+                    "pages_per_second": round(item["pages"] / wall, 3) if wall else None,
+                    "rss_before_mb": round(rss_before / (1024 * 1024), 1) if rss_before else None,
+                    "texts": texts,
+                    "images": images,
+                    "tables": tables,
+                    "stages": stages,
+                    "embedding": pdf_processor.embed_summary(stats),
+                })
+                print(f"  {item['kind']:<14} {wall:7.2f}s  {item['pages'] / wall:6.2f} pages/s")
+    finally:
+        recorder.stop()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale": scale,
+            "repeat": repeat,
+        },
+        "documents": documents,
+    }
+
+
+def compare(current: Dict, baseline: Dict):
+    """Print wall-time ratios, chunk counts and embedding padding against a previous results file."""
+    base = {(d["kind"], d["attempt"]): d for d in baseline.get("documents", [])}
+    print("\nvs baseline (wall time, lower is better):")
+    for doc in current["documents"]:
+        prev = base.get((doc["kind"], doc["attempt"]))
+        if prev and prev["wall_seconds"]:
+            ratio = doc["wall_seconds"] / prev["wall_seconds"]
+            line = f"  {doc['kind']:<14} {prev['wall_seconds']:7.2f}s → {doc['wall_seconds']:7.2f}s  ({ratio:.2f}×)"
+            line += f"  text chunks {prev['texts']} → {doc['texts']}"
+            if prev.get("embedding") and doc.get("embedding"):
+                line += (f"  padding {prev['embedding']['padding_ratio']:.1%} → {doc['embedding']['padding_ratio']:.1%}"
+                         f"  {prev['embedding']['chunks_per_second']} → {doc['embedding']['chunks_per_second']} chunks/s")
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process_pdf on synthetic PDFs")
+    parser.add_argument("--out", default="bench_ingestion.json", help="Where to write JSON results")
+    parser.add_argument("--scale", type=int, default=1, help="Multiply synthetic page counts")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per document")
+    parser.add_argument("--pdf-dir", default=None, help="Keep generated PDFs here (default: temp dir)")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(args.pdf_dir) if args.pdf_dir else Path(tmp)
+        print(f"📏 Ingestion benchmark (scale={args.scale}, repeat={args.repeat})")
+        results = run(out_dir, scale=args.scale, repeat=args.repeat)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
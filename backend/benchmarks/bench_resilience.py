@@ -0,0 +1,111 @@
+# Resilience benchmark — tail latency with/without hedging, success rate with/without retries
+#
+# Runs mcp_server.resilience against local fakes (no network, no Qdrant):
+#   - a "search" that is fast except for an occasional stall, called plain and
+#     hedged, to show what hedging does to p99;
+#   - a "flaky" call failing transiently at a fixed rate, called with and
+#     without retries, to show the success rate and the latency retries cost.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_resilience --out bench_resilience.json
+#   python -m benchmarks.bench_resilience --stall-rate 0.02 --stall-ms 300 --percentile 95
+
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from mcp_server.resilience import Dependency
+
+
+def fake_search(rng: random.Random, base_ms: float, stall_rate: float, stall_ms: float) -> Callable[[], int]:
+    """A Qdrant-like call: ~base_ms, but stall_rate of calls stall for stall_ms."""
+    def call():
+        time.sleep((stall_ms if rng.random() < stall_rate else base_ms) / 1000)
+        return 1
+    return call
+
+
+def fake_flaky(rng: random.Random, base_ms: float, failure_rate: float) -> Callable[[], int]:
+    """A call that fails with a transient error at failure_rate."""
+    def call():
+        time.sleep(base_ms / 1000)
+        if rng.random() < failure_rate:
+            raise ConnectionError("connection reset by fake peer")
+        return 1
+    return call
+
+
+def run(dependency: Dependency, fn: Callable[[], int], calls: int, hedge: bool = False) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            dependency.call(fn, hedge=hedge)
+        except Exception:
+            errors += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    def pct(p):
+        return round(float(np.percentile(latencies, p)), 2)
+
+    return {
+        "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99), "max": round(max(latencies), 2)},
+        "error_rate": round(errors / calls, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retries and hedging against local fakes")
+    parser.add_argument("--out", default="bench_resilience.json", help="Where to write JSON results")
+    parser.add_argument("--calls", type=int, default=500, help="Calls per configuration")
+    parser.add_argument("--base-ms", type=float, default=10, help="Latency of a normal call")
+    parser.add_argument("--stall-rate", type=float, default=0.02, help="Fraction of searches that stall")
+    parser.add_argument("--stall-ms", type=float, default=300, help="Latency of a stalled search")
+    parser.add_argument("--percentile", type=float, default=95, help="Hedge after this latency percentile")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Fraction of flaky calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"📏 Resilience benchmark (calls={args.calls}, stall={args.stall_rate:.0%}×{args.stall_ms:g}ms, "
+          f"failures={args.failure_rate:.0%})")
+
+    results = {}
+    search = fake_search(random.Random(args.seed), args.base_ms, args.stall_rate, args.stall_ms)
+    for name, percentile in (("search_plain", None), ("search_hedged", args.percentile)):
+        dependency = Dependency(f"bench_{name}", max_retries=0, hedge_percentile=percentile)
+        results[name] = run(dependency, search, args.calls, hedge=True)
+        results[name]["hedge_after_ms"] = dependency.snapshot()["hedge_after_ms"]
+
+    flaky = fake_flaky(random.Random(args.seed), args.base_ms, args.failure_rate)
+    for name, retries in (("flaky_no_retry", 0), ("flaky_retry", 3)):
+        # Threshold above the call count: measure retries, not the breaker
+        dependency = Dependency(f"bench_{name}", max_retries=retries, base_delay=args.base_ms / 1000)
+        dependency.breaker.threshold = args.calls + 1
+        results[name] = run(dependency, flaky, args.calls)
+
+    for name, stats in results.items():
+        latency = stats["latency_ms"]
+        print(f"  {name:<16} p50={latency['p50']:.1f}ms p99={latency['p99']:.1f}ms "
+              f"max={latency['max']:.1f}ms errors={stats['error_rate']:.1%}")
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            **{k: v for k, v in vars(args).items() if k != "out"},
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
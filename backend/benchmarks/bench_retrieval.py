@@ -0,0 +1,197 @@
+# Retrieval benchmark — recall@k vs latency for search_similar configurations
+#
+# Builds a synthetic corpus, computes exact top-k ground truth with numpy and
+# measures search_similar under binary quantization with/without rescoring,
+# several hnsw_ef values, and filtered vs unfiltered search.
+#
+# Usage (from backend/, with a local Qdrant on :6333, e.g. `docker run -p 6333:6333 qdrant/qdrant`):
+#   python -m benchmarks.bench_retrieval --out bench_retrieval.json
+#   python -m benchmarks.bench_retrieval --embedded   # no server; exact search only
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Keep the import-time client off the cloud; main() swaps in the local server client
+os.environ.setdefault("QDRANT_PATH", ":memory:")
+
+import numpy as np
+
+from .synthetic_pdfs import _paragraph, _sentence
+
+BENCH_COLLECTION = "bench_retrieval"
+CONTENT_TYPES = ("text", "table", "image")
+
+
+def build_corpus(size: int, seed: int = 0) -> List[Dict]:
+    """Deterministic text chunks, cycling through content types for filtered search."""
+    rng = random.Random(seed)
+    return [
+        {"id": i, "type": CONTENT_TYPES[i % len(CONTENT_TYPES)], "content": _paragraph(rng, sentences=3)}
+        for i in range(size)
+    ]
+
+
+def build_queries(count: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [_sentence(rng, 5, 12) for _ in range(count)]
+
+
+def index_corpus(corpus: List[Dict], batch_size: int = 256) -> np.ndarray:
+    """Embed and upsert the corpus into a fresh collection; returns the (N, dim) matrix."""
+    from qdrant_client import models
+    from mcp_server.embeddings import embed_text
+    from mcp_server.retriever import get_qdrant_client, create_collection
+
+    client = get_qdrant_client()
+    create_collection(BENCH_COLLECTION, recreate=True)
+    # Index right away (the default threshold would leave a small corpus unindexed)
+    client.update_collection(
+        collection_name=BENCH_COLLECTION,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1),
+    )
+    client.create_payload_index(BENCH_COLLECTION, field_name="type", field_schema=models.PayloadSchemaType.KEYWORD)
+
+    print(f"  embedding {len(corpus)} chunks...")
+    vectors = np.array([embed_text(doc["content"]) for doc in corpus], dtype=np.float32)
+
+    for start in range(0, len(corpus), batch_size):
+        batch = corpus[start:start + batch_size]
+        client.upsert(
+            collection_name=BENCH_COLLECTION,
+            points=[
+                models.PointStruct(id=doc["id"], vector=vectors[doc["id"]].tolist(),
+                                   payload={"type": doc["type"], "content": doc["content"]})
+                for doc in batch
+            ],
+        )
+
+    # Wait for the optimizer to finish building the HNSW graph
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        info = client.get_collection(BENCH_COLLECTION)
+        if str(info.status).lower().endswith("green"):
+            break
+        time.sleep(0.5)
+    return vectors
+
+
+def ground_truth(vectors: np.ndarray, query_vectors: np.ndarray, types: np.ndarray,
+                 k: int, content_type: Optional[str] = None) -> List[set]:
+    """Exact top-k ids by cosine similarity (vectors are already normalized)."""
+    scores = query_vectors @ vectors.T
+    if content_type is not None:
+        scores[:, types != content_type] = -np.inf
+    top = np.argpartition(-scores, kth=min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def run_config(queries: List[str], truth: List[set], k: int, search_params,
+               content_type: Optional[str]) -> Dict:
+    from mcp_server.retriever import search_similar
+
+    latencies, search_latencies, recalls = [], [], []
+    wall_start = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        results = search_similar(
+            query, top_k=k, collection_name=BENCH_COLLECTION, content_type=content_type,
+            rerank=False, timings=timings, search_params=search_params,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        search_latencies.append(timings.get("search_ms", 0.0))
+        found = {int(r["id"]) for r in results}
+        recalls.append(len(found & expected) / max(len(expected), 1))
+    wall = time.perf_counter() - wall_start
+
+    def pct(values, p):
+        return round(float(np.percentile(values, p)), 3)
+
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "latency_ms": {"p50": pct(latencies, 50), "p95": pct(latencies, 95), "p99": pct(latencies, 99)},
+        "search_latency_ms": {"p50": pct(search_latencies, 50), "p95": pct(search_latencies, 95),
+                              "p99": pct(search_latencies, 99)},
+        "qps": round(len(queries) / wall, 2) if wall else None,
+    }
+
+
+def configurations(ef_values: List[int]):
+    """(name, SearchParams) pairs covering quantization modes and hnsw_ef values."""
+    from qdrant_client import models
+
+    for ef in ef_values:
+        yield f"bq_rescore_ef{ef}", models.SearchParams(
+            hnsw_ef=ef, quantization=models.QuantizationSearchParams(rescore=True))
+        yield f"bq_no_rescore_ef{ef}", models.SearchParams(
+            hnsw_ef=ef, quantization=models.QuantizationSearchParams(rescore=False))
+        yield f"full_precision_ef{ef}", models.SearchParams(
+            hnsw_ef=ef, quantization=models.QuantizationSearchParams(ignore=True))
+    yield "exact", models.SearchParams(exact=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search_similar recall vs latency")
+    parser.add_argument("--out", default="bench_retrieval.json", help="Where to write JSON results")
+    parser.add_argument("--corpus", type=int, default=3000, help="Number of synthetic chunks")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries per configuration")
+    parser.add_argument("--k", type=int, default=5, help="top_k for recall@k")
+    parser.add_argument("--ef", default="16,32,64,128,256", help="Comma-separated hnsw_ef values")
+    parser.add_argument("--qdrant-url", default="http://localhost:6333", help="Local Qdrant server")
+    parser.add_argument("--embedded", action="store_true",
+                        help="Use in-memory embedded Qdrant (exact search; hnsw_ef/quantization have no effect)")
+    args = parser.parse_args()
+
+    from qdrant_client import QdrantClient
+    from mcp_server import retriever
+    from mcp_server.embeddings import embed_query
+
+    if not args.embedded:
+        retriever._qdrant_client = QdrantClient(url=args.qdrant_url, timeout=60)
+        retriever._qdrant_client.get_collections()
+
+    print(f"📏 Retrieval benchmark (corpus={args.corpus}, queries={args.queries}, k={args.k}, "
+          f"qdrant={'embedded' if args.embedded else args.qdrant_url})")
+
+    corpus = build_corpus(args.corpus)
+    queries = build_queries(args.queries)
+    vectors = index_corpus(corpus)
+    query_vectors = np.array([embed_query(q) for q in queries], dtype=np.float32)
+    types = np.array([doc["type"] for doc in corpus])
+
+    ef_values = [int(x) for x in args.ef.split(",") if x]
+    results = []
+    for filtered in (False, True):
+        content_type = "text" if filtered else None
+        truth = ground_truth(vectors, query_vectors, types, args.k, content_type)
+        for name, params in configurations(ef_values):
+            stats = run_config(queries, truth, args.k, params, content_type)
+            stats.update(config=name, filtered=filtered)
+            results.append(stats)
+            print(f"  {name:<24} filtered={str(filtered):<5} recall@{args.k}={stats['recall_at_k']:.3f} "
+                  f"p50={stats['latency_ms']['p50']:.1f}ms p99={stats['latency_ms']['p99']:.1f}ms "
+                  f"qps={stats['qps']}")
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "corpus": args.corpus,
+            "queries": args.queries,
+            "k": args.k,
+            "qdrant": "embedded" if args.embedded else args.qdrant_url,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# Load test — concurrent query and upload traffic against the API, offline
+#
+# Starts the app in-process (uvicorn on a free local port) with embedded
+# Qdrant and the local LLM and web search fakes (mcp_server/fakes.py), so no
+# API quota is used. Seeds a few synthetic PDFs, then runs closed-loop clients
+# for --duration seconds:
+#   --queries N   clients asking questions via /query-stream (or /query with --no-stream)
+#   --uploads M   clients uploading fresh synthetic PDFs and waiting for their ingestion
+# and reports throughput, latency percentiles (plus time to first token for
+# streams) and error rates per operation, including 429/503 from admission control.
+#
+# Usage (from backend/):
+#   python -m benchmarks.load_test --queries 16 --uploads 2 --duration 60 --out load_test.json
+#   FAKE_LLM_TURN_MS=800 FAKE_ERROR_RATE=0.05 python -m benchmarks.load_test --queries 32
+#   python -m benchmarks.load_test --url http://localhost:8000   # a running server (start it with the fakes)
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Must be set before mcp_server is imported: vectors in memory, local fakes, scratch output folder
+os.environ.setdefault("QDRANT_PATH", ":memory:")
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("WEB_SEARCH_PROVIDER", "fake")
+os.environ.setdefault("OUTPUT_FOLDER", tempfile.mkdtemp(prefix="deepretrieve-load-"))
+
+import numpy as np
+
+from .synthetic_pdfs import born_digital, _sentence
+
+API = "/api/v1"
+FINISHED = ("completed", "failed", "cancelled")
+
+
+class Recorder:
+    """Latency samples and outcomes per operation."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.ttft: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.started = time.perf_counter()
+
+    def record(self, op: str, start: float, error: Optional[str] = None, ttft: Optional[float] = None) -> Optional[str]:
+        self.latencies[op].append((time.perf_counter() - start) * 1000)
+        if error:
+            self.errors[op][error] += 1
+        if ttft is not None:
+            self.ttft[op].append((ttft - start) * 1000)
+        return error
+
+    def report(self, elapsed: float) -> Dict:
+        def pct(values):
+            return {f"p{p}": round(float(np.percentile(values, p)), 1) for p in (50, 90, 95, 99)} if values else {}
+
+        report = {}
+        for op, latencies in self.latencies.items():
+            errors = sum(self.errors[op].values())
+            report[op] = {
+                "requests": len(latencies),
+                "ok": len(latencies) - errors,
+                "throughput_per_s": round((len(latencies) - errors) / elapsed, 2),
+                "error_rate": round(errors / len(latencies), 4),
+                "errors": dict(self.errors[op]),
+                "latency_ms": pct(latencies),
+            }
+            if self.ttft[op]:
+                report[op]["ttft_ms"] = pct(self.ttft[op])
+        return report
+
+
+class PdfFactory:
+    """Distinct small born-digital PDFs (a new seed each), so uploads are never deduplicated."""
+
+    def __init__(self, pages: int, seed: int):
+        self.pages = pages
+        self._seed = seed
+        self._dir = Path(tempfile.mkdtemp(prefix="deepretrieve-load-pdfs-"))
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[str, bytes]:
+        with self._lock:
+            self._seed += 1
+            seed = self._seed
+        path = born_digital(self._dir / f"load_{seed}.pdf", pages=self.pages, seed=seed)
+        data = path.read_bytes()
+        path.unlink()
+        return path.name, data
+
+
+async def ask(client, recorder: Recorder, question: str, top_k: int, stream: bool) -> Optional[str]:
+    start = time.perf_counter()
+    payload = {"query": question, "top_k": top_k}
+    try:
+        if not stream:
+            response = await client.post(f"{API}/query", json=payload)
+            error = None if response.status_code == 200 else f"http_{response.status_code}"
+            return recorder.record("query", start, error)
+
+        error, first_text, event = None, None, None
+        async with client.stream("POST", f"{API}/query-stream", json=payload) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return recorder.record("query_stream", start, f"http_{response.status_code}")
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    if event == "error":
+                        error = "stream_error"
+                    elif first_text is None and '"text"' in line:
+                        first_text = time.perf_counter()
+                elif not line:
+                    event = None
+        return recorder.record("query_stream", start, error, ttft=first_text)
+    except Exception as e:
+        return recorder.record("query_stream" if stream else "query", start, type(e).__name__)
+
+
+async def upload(client, recorder: Recorder, pdfs: PdfFactory, poll_seconds: float, wait: bool = True):
+    filename, data = await asyncio.to_thread(pdfs.next)
+    start = time.perf_counter()
+    try:
+        response = await client.post(f"{API}/upload", files={"file": (filename, data, "application/pdf")})
+        if response.status_code != 202:
+            return recorder.record("upload", start, f"http_{response.status_code}")
+        recorder.record("upload", start)
+        job_id = response.json().get("job_id")
+        if not wait or not job_id:
+            return job_id
+        # End to end: from sending the upload until its ingestion job finishes
+        while True:
+            await asyncio.sleep(poll_seconds)
+            job = (await client.get(f"{API}/jobs/{job_id}")).json()
+            if job.get("status") in FINISHED:
+                error = None if job["status"] == "completed" else f"job_{job['status']}"
+                return recorder.record("ingest", start, error)
+    except Exception as e:
+        recorder.record("upload", start, type(e).__name__)
+
+
+async def run_load(args, base_url: str) -> Dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    questions = [_sentence(rng, 5, 12) for _ in range(200)]
+    pdfs = PdfFactory(args.pages, args.seed * 100_000)
+    limits = httpx.Limits(max_connections=args.queries + args.uploads + 4)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        print(f"  seeding {args.seed_docs} document(s)...")
+        warmup = Recorder()
+        await asyncio.gather(*(upload(client, warmup, pdfs, args.poll) for _ in range(args.seed_docs)))
+        if sum(sum(c.values()) for c in warmup.errors.values()):
+            print(f"  ⚠️ seeding had errors: {dict(warmup.errors)}")
+
+        recorder = Recorder()
+        stop_at = time.perf_counter() + args.duration
+
+        async def query_client(n: int):
+            client_rng = random.Random(args.seed + n)
+            while time.perf_counter() < stop_at:
+                if await ask(client, recorder, client_rng.choice(questions), args.top_k, args.stream):
+                    await asyncio.sleep(args.error_pause)  # Don't spin on instant 429s
+
+        async def upload_client():
+            while time.perf_counter() < stop_at:
+                await upload(client, recorder, pdfs, args.poll)
+
+        print(f"  running {args.queries} query + {args.uploads} upload client(s) for {args.duration:g}s...")
+        await asyncio.gather(*(query_client(n) for n in range(args.queries)), *(upload_client() for _ in range(args.uploads)))
+        elapsed = time.perf_counter() - recorder.started
+
+        server = {}
+        for name in ("admission", "dependencies", "compute"):
+            try:
+                server[name] = (await client.get(f"{API}/admin/{name}")).json()
+            except Exception as e:
+                server[name] = {"error": str(e)}
+    return {"elapsed_s": round(elapsed, 1), "operations": recorder.report(elapsed), "server": server}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server():
+    """Run the app in this process on a free port; returns (uvicorn server, base URL)."""
+    import uvicorn
+    from api.app import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="load-test-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test query and upload endpoints with local fakes")
+    parser.add_argument("--out", default="load_test.json", help="Where to write JSON results")
+    parser.add_argument("--url", default=None, help="Target a running server instead of starting one in-process")
+    parser.add_argument("--queries", type=int, default=8, help="Concurrent query clients")
+    parser.add_argument("--uploads", type=int, default=1, help="Concurrent upload clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=True,
+                        help="Query via /query-stream (default) or /query")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=2, help="Pages per uploaded PDF")
+    parser.add_argument("--seed-docs", type=int, default=3, help="Documents ingested before the load starts")
+    parser.add_argument("--poll", type=float, default=0.5, help="Seconds between ingestion job polls")
+    parser.add_argument("--timeout", type=float, default=120, help="Client timeout per request (seconds)")
+    parser.add_argument("--error-pause", type=float, default=0.2, help="Seconds a query client waits after a failed request")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, base_url = start_local_server()
+
+    if server is not None:
+        print(f"🔥 Load test in-process at {base_url} (LLM={os.environ['LLM_PROVIDER']}, "
+              f"web={os.environ['WEB_SEARCH_PROVIDER']}, qdrant={os.environ['QDRANT_PATH']})")
+    else:
+        print(f"🔥 Load test against {base_url}")
+    try:
+        results = asyncio.run(run_load(args, base_url))
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    for op, stats in results["operations"].items():
+        latency = stats["latency_ms"]
+        ttft = f" ttft_p50={stats['ttft_ms']['p50']:.0f}ms" if "ttft_ms" in stats else ""
+        print(f"  {op:<13} n={stats['requests']:<5} {stats['throughput_per_s']:>6.2f}/s "
+              f"p50={latency.get('p50', 0):.0f}ms p95={latency.get('p95', 0):.0f}ms p99={latency.get('p99', 0):.0f}ms"
+              f"{ttft} errors={stats['error_rate']:.1%} {stats['errors'] or ''}")
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "target": base_url if args.url else "in-process",
+            **{k: v for k, v in vars(args).items() if k not in ("out", "url")},
+            **{k: v for k, v in os.environ.items() if k.startswith("FAKE_")},
+        },
+        **results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Deterministic synthetic PDFs for benchmarking the ingestion pipeline
+#
+# Every generator is driven by a seeded random.Random, so the same seed
+# always produces the same pages, text, images and tables.
+
+import io
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+from PIL import Image, ImageDraw
+
+_WORDS = (
+    "attention transformer encoder decoder layer embedding vector retrieval query "
+    "document table figure latency throughput model training inference dataset "
+    "benchmark accuracy precision recall token sequence batch gradient parameter "
+    "network architecture residual normalization softmax projection head output "
+    "input position memory compute kernel cache index search score ranking result"
+).split()
+
+A4 = (595, 842)
+SLIDE = (960, 540)
+
+
+def _sentence(rng: random.Random, min_words: int = 8, max_words: int = 20) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _fixed_metadata(doc: fitz.Document, title: str):
+    # No creation/modification timestamps so the output is stable across runs
+    doc.set_metadata({"title": title, "producer": "deepretrieve-bench", "creator": "deepretrieve-bench"})
+
+
+def _save(doc: fitz.Document, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    doc.save(str(path), garbage=4, deflate=True, no_new_id=True)
+    doc.close()
+    return path
+
+
+def born_digital(path: Path, pages: int = 10, seed: int = 0) -> Path:
+    """Text-only pages with a real text layer (PyMuPDF digital extraction path)."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=A4[0], height=A4[1])
+        page.insert_text((72, 72), f"Section {page_num + 1}: {rng.choice(_WORDS).title()}", fontsize=16)
+        body = "\n\n".join(_paragraph(rng) for _ in range(6))
+        page.insert_textbox(fitz.Rect(72, 100, A4[0] - 72, A4[1] - 72), body, fontsize=10)
+    _fixed_metadata(doc, "born-digital")
+    return _save(doc, path)
+
+
+def scanned(path: Path, pages: int = 5, seed: int = 1, dpi: int = 150) -> Path:
+    """Image-only pages: text rendered to a raster with no text layer (OCR fallback path)."""
+    rng = random.Random(seed)
+    source = fitz.open()
+    doc = fitz.open()
+    for page_num in range(pages):
+        text_page = source.new_page(width=A4[0], height=A4[1])
+        body = "\n\n".join(_paragraph(rng) for _ in range(5))
+        text_page.insert_textbox(fitz.Rect(72, 72, A4[0] - 72, A4[1] - 72), body, fontsize=11)
+        pix = text_page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+
+        page = doc.new_page(width=A4[0], height=A4[1])
+        page.insert_image(page.rect, stream=pix.tobytes("png"))
+    source.close()
+    _fixed_metadata(doc, "scanned")
+    return _save(doc, path)
+
+
+def _figure_image(rng: random.Random, width: int, height: int) -> Image.Image:
+    """A diagram-like figure: boxes, arrows and a gradient background."""
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for y in range(height):
+        shade = 235 + int(20 * y / height)
+        draw.line([(0, y), (width, y)], fill=(shade, shade, 255))
+    for _ in range(rng.randint(3, 6)):
+        x0, y0 = rng.randint(0, width - 80), rng.randint(0, height - 60)
+        color = tuple(rng.randint(40, 220) for _ in range(3))
+        draw.rectangle([x0, y0, x0 + rng.randint(40, 80), y0 + rng.randint(30, 60)], fill=color, outline=(0, 0, 0))
+    for _ in range(rng.randint(2, 4)):
+        draw.line([rng.randint(0, width), rng.randint(0, height), rng.randint(0, width), rng.randint(0, height)],
+                  fill=(0, 0, 0), width=2)
+    return img
+
+
+def _chart_image(rng: random.Random, width: int, height: int) -> Image.Image:
+    """A labeled bar chart (text-dominant image)."""
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    bars = rng.randint(4, 7)
+    bar_w = width // (bars * 2)
+    for i in range(bars):
+        bar_h = rng.randint(height // 5, height - 60)
+        x0 = bar_w // 2 + i * bar_w * 2
+        draw.rectangle([x0, height - 40 - bar_h, x0 + bar_w, height - 40], fill=(70, 110, 200))
+        draw.text((x0, height - 30), rng.choice(_WORDS)[:8], fill=(0, 0, 0))
+    draw.text((10, 10), f"{rng.choice(_WORDS).title()} by {rng.choice(_WORDS)}", fill=(0, 0, 0))
+    return img
+
+
+def _photo_image(rng: random.Random, width: int, height: int) -> bytes:
+    """Noisy photo-like content, JPEG-encoded as cameras/slide decks usually embed it."""
+    # Seeded noise (Image.effect_noise uses the unseeded C rand)
+    img = Image.frombytes("L", (width, height), rng.randbytes(width * height)).convert("RGB")
+    tint = Image.new("RGB", (width, height), tuple(rng.randint(0, 255) for _ in range(3)))
+    img = Image.blend(img, tint, 0.5)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def image_deck(path: Path, pages: int = 8, seed: int = 2) -> Path:
+    """Slide-sized pages dominated by figures, charts and photos (captioning path)."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=SLIDE[0], height=SLIDE[1])
+        page.insert_text((40, 50), f"Slide {page_num + 1}: {_sentence(rng, 3, 6)}", fontsize=22)
+
+        slots = [fitz.Rect(40, 90, 460, 500), fitz.Rect(500, 90, 920, 500)]
+        for slot_idx, slot in enumerate(slots):
+            kind = (page_num + slot_idx) % 3
+            w, h = int(slot.width * 1.5), int(slot.height * 1.5)
+            if kind == 0:
+                buf = io.BytesIO()
+                _figure_image(rng, w, h).save(buf, format="PNG")
+                page.insert_image(slot, stream=buf.getvalue())
+            elif kind == 1:
+                buf = io.BytesIO()
+                _chart_image(rng, w, h).save(buf, format="PNG")
+                page.insert_image(slot, stream=buf.getvalue())
+            else:
+                page.insert_image(slot, stream=_photo_image(rng, w, h))
+    _fixed_metadata(doc, "image-deck")
+    return _save(doc, path)
+
+
+def ruled_tables(path: Path, pages: int = 4, seed: int = 3, rows: int = 12, cols: int = 5) -> Path:
+    """Pages with fully ruled grid tables (img2table extraction path)."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=A4[0], height=A4[1])
+        page.insert_text((72, 60), f"Table {page_num + 1}: {_sentence(rng, 3, 6)}", fontsize=13)
+
+        left, top, cell_w, cell_h = 60, 90, (A4[0] - 120) / cols, 24
+        for r in range(rows + 1):
+            y = top + r * cell_h
+            page.draw_line((left, y), (left + cols * cell_w, y), width=0.8)
+        for c in range(cols + 1):
+            x = left + c * cell_w
+            page.draw_line((x, top), (x, top + rows * cell_h), width=0.8)
+
+        for r in range(rows):
+            for c in range(cols):
+                if r == 0:
+                    value = rng.choice(_WORDS).title()
+                elif c == 0:
+                    value = f"{rng.choice(_WORDS)}-{r}"
+                else:
+                    value = f"{rng.uniform(0, 100):.2f}"
+                page.insert_text((left + c * cell_w + 4, top + r * cell_h + 16), value, fontsize=9)
+    _fixed_metadata(doc, "ruled-tables")
+    return _save(doc, path)
+
+
+# kind -> (generator, default page count)
+GENERATORS = {
+    "born_digital": (born_digital, 10),
+    "scanned": (scanned, 5),
+    "image_deck": (image_deck, 8),
+    "ruled_tables": (ruled_tables, 4),
+}
+
+
+def generate_corpus(out_dir: Path, scale: int = 1) -> List[Dict]:
+    """Write one PDF of each kind into out_dir. scale multiplies the page counts."""
+    corpus = []
+    for seed, (kind, (generator, pages)) in enumerate(GENERATORS.items()):
+        path = generator(out_dir / f"{kind}.pdf", pages=pages * scale, seed=seed)
+        corpus.append({"kind": kind, "path": path, "pages": pages * scale})
+    return corpus
@@ -1,5 +1,7 @@
 # DeepRetrieve Backend Entry Point
 
+import argparse
+
 import uvicorn
 
 
@@ -15,6 +17,12 @@ def run_api():
     )
 
 
+def run_production(workers: int, host: str, port: int):
+    """Run the FastAPI server with several worker processes sharing preloaded models"""
+    from api.prefork import serve
+    serve(workers, host=host, port=port)
+
+
 def run_mcp():
     """Run the MCP server"""
     from mcp_server.server import run_server
@@ -22,8 +30,50 @@ def run_mcp():
     run_server()
 
 
+def run_embedding_service(socket_path: str = None):
+    """Run the shared embedding service (one BGE model for all workers)"""
+    from mcp_server.embedding_service import serve
+    serve(socket_path)
+
+
+def run_bulk_ingest(directory: str, workers: int = 2, manifest: str = None, namespace: str = None):
+    """Ingest a directory tree of PDFs, resuming from its checkpoint manifest"""
+    from api.bulk_ingest import ingest_directory
+    from mcp_server.telemetry import configure_logging
+    configure_logging()
+    print(f"📚 Bulk ingesting {directory} with {workers} worker(s)" + (f" into namespace '{namespace}'" if namespace else ""))
+    return ingest_directory(directory, workers=workers, manifest_path=manifest, namespace=namespace)
+
+
 def main():
-    run_api()
+    parser = argparse.ArgumentParser(description="DeepRetrieve backend")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("api", help="Run the FastAPI server with auto-reload (default)")
+    prod = commands.add_parser("serve", help="Run the FastAPI server with N pre-forked workers")
+    prod.add_argument("--workers", type=int, default=None, help="Worker processes (default: API_WORKERS)")
+    prod.add_argument("--host", default="0.0.0.0")
+    prod.add_argument("--port", type=int, default=8000)
+    commands.add_parser("mcp", help="Run the MCP server")
+    embed = commands.add_parser("embed", help="Run the shared embedding service")
+    embed.add_argument("--socket", default=None, help="Unix socket path (default: EMBEDDING_SERVICE_SOCKET or /tmp/deepretrieve-embed.sock)")
+    ingest = commands.add_parser("ingest", help="Bulk-ingest a directory of PDFs")
+    ingest.add_argument("directory", help="Directory to walk for *.pdf files")
+    ingest.add_argument("--workers", type=int, default=2, help="Documents processed concurrently")
+    ingest.add_argument("--manifest", default=None, help="Checkpoint file (default: <directory>/.deepretrieve_manifest.jsonl)")
+    ingest.add_argument("--namespace", default=None, help="Tenant namespace to ingest into (default: the default namespace)")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from mcp_server.config import API_WORKERS
+        run_production(args.workers or API_WORKERS, args.host, args.port)
+    elif args.command == "mcp":
+        run_mcp()
+    elif args.command == "embed":
+        run_embedding_service(args.socket)
+    elif args.command == "ingest":
+        run_bulk_ingest(args.directory, workers=args.workers, manifest=args.manifest, namespace=args.namespace)
+    else:
+        run_api()
 
 
 if __name__ == "__main__":
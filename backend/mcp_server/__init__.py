@@ -1,24 +1,38 @@
 # DeepRetrieve MCP Server
 # Exposes RAG retriever and web search as MCP tools
+#
+# Exports resolve lazily, so processes that only need part of the package
+# (e.g. the embedding service, which must not load Qdrant or its own embedder
+# client) import just the submodules they use.
 
-from .server import mcp as mcp_app, run_server
-from .retriever import search_similar, get_collection_info, create_collection
-from .web_search import web_search, format_web_results_as_context
-from .embeddings import embed_text, embed_image, embed_image_base64
-from .llm import generate_response, prepare_context_from_results, check_context_relevance
+import importlib
 
-__all__ = [
-    "mcp_app",
-    "run_server",
-    "search_similar",
-    "get_collection_info",
-    "create_collection",
-    "web_search",
-    "format_web_results_as_context",
-    "embed_text",
-    "embed_image",
-    "embed_image_base64",
-    "generate_response",
-    "prepare_context_from_results",
-    "check_context_relevance"
-]
+_EXPORTS = {
+    "mcp_app": ("server", "mcp"),
+    "run_server": ("server", "run_server"),
+    "search_similar": ("retriever", "search_similar"),
+    "get_collection_info": ("retriever", "get_collection_info"),
+    "create_collection": ("retriever", "create_collection"),
+    "get_namespace": ("namespaces", "get_namespace"),
+    "Namespace": ("namespaces", "Namespace"),
+    "web_search": ("web_search", "web_search"),
+    "format_web_results_as_context": ("web_search", "format_web_results_as_context"),
+    "embed_text": ("embeddings", "embed_text"),
+    "embed_texts": ("embeddings", "embed_texts"),
+    "embed_image": ("embeddings", "embed_image"),
+    "embed_image_base64": ("embeddings", "embed_image_base64"),
+    "generate_response": ("llm", "generate_response"),
+    "prepare_context_from_results": ("llm", "prepare_context_from_results"),
+    "check_context_relevance": ("llm", "check_context_relevance"),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module, attr = _EXPORTS[name]
+    value = getattr(importlib.import_module(f".{module}", __name__), attr)
+    globals()[name] = value
+    return value
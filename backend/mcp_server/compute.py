@@ -0,0 +1,184 @@
+# CPU compute scheduler for model stages
+#
+# BGE, the cross-encoder, BLIP, EasyOCR and img2table each default to a thread
+# pool as wide as the machine, so a few concurrent uploads and queries run
+# many times more threads than there are cores and every call slows down.
+# Each stage instead gets a thread budget (COMPUTE_STAGES): a call waits until
+# that many of COMPUTE_THREADS are free, and runs with its intra-op thread
+# count set to the budget. Waiting calls are admitted in priority order, and
+# background stages always leave COMPUTE_INTERACTIVE_RESERVE threads free, so
+# query embedding and reranking never queue behind a captioning backlog.
+#
+# The budget is per process: each pre-forked API worker gets its share of
+# the cores (see api/prefork.py), unless COMPUTE_THREADS sets it explicitly.
+#
+# Every stage also runs under torch.inference_mode() (no autograd bookkeeping).
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional
+
+from prometheus_client import Gauge
+
+from .config import COMPUTE_THREADS, COMPUTE_INTERACTIVE_RESERVE, COMPUTE_STAGES
+from .telemetry import observe
+
+INTERACTIVE_PRIORITY = 0  # Stages at this priority may use the reserved threads
+
+COMPUTE_QUEUE_DEPTH = Gauge(
+    "deepretrieve_compute_queue_depth", "Model calls waiting for CPU threads", ["stage"]
+)
+COMPUTE_RUNNING = Gauge(
+    "deepretrieve_compute_running", "Model calls currently running", ["stage"]
+)
+
+
+class _Waiter:
+    __slots__ = ("stage", "threads", "priority")
+
+    def __init__(self, stage: str, threads: int, priority: int):
+        self.stage = stage
+        self.threads = threads
+        self.priority = priority
+
+
+class ComputeScheduler:
+    """Admits model calls against a shared CPU thread budget, in priority order."""
+
+    def __init__(
+        self,
+        total_threads: int = COMPUTE_THREADS or (os.cpu_count() or 4),
+        stages: Optional[Dict[str, tuple]] = None,
+        interactive_reserve: int = COMPUTE_INTERACTIVE_RESERVE
+    ):
+        self._configured_stages = stages or COMPUTE_STAGES
+        self._configured_reserve = interactive_reserve
+        self.resize(total_threads)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def resize(self, total_threads: int):
+        """Set the thread budget, clamping stage budgets and the reserve to it. Call before any stage runs."""
+        self.total_threads = max(1, total_threads)
+        self.interactive_reserve = min(max(0, self._configured_reserve), self.total_threads - 1)
+        self.stages = {
+            name: (max(1, min(threads, self.total_threads)), priority)
+            for name, (threads, priority) in self._configured_stages.items()
+        }
+        self._reset()
+
+    def _reset(self):
+        self._cond = threading.Condition()
+        self._waiting: List = []  # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._in_use = 0
+        self._queued: Dict[str, int] = {name: 0 for name in self.stages}
+        self._running: Dict[str, int] = {name: 0 for name in self.stages}
+        self._local = threading.local()
+
+    def _budget(self, stage: str, priority: Optional[int]):
+        threads, default_priority = self.stages.get(stage, (1, INTERACTIVE_PRIORITY + 1))
+        return threads, default_priority if priority is None else priority
+
+    def _fits(self, waiter: _Waiter) -> bool:
+        limit = self.total_threads
+        if waiter.priority > INTERACTIVE_PRIORITY:
+            limit -= self.interactive_reserve
+        # A stage wider than the limit still runs once nothing else holds threads
+        return self._in_use + waiter.threads <= limit or self._in_use == 0
+
+    @contextmanager
+    def stage(self, stage: str, priority: Optional[int] = None):
+        """Run the block as `stage`: wait for its thread budget, then run with
+        that many intra-op threads under inference mode.
+
+        priority overrides the stage's configured priority (e.g. a micro-batch
+        holding a query). Nested stages on the same thread reuse the outer
+        stage's threads instead of queueing again.
+        """
+        if getattr(self._local, "stage", None) is not None:
+            with _inference(self._local.threads):
+                yield
+            return
+
+        threads, priority = self._budget(stage, priority)
+        waiter = _Waiter(stage, threads, priority)
+        entry = (priority, next(self._seq), waiter)
+        start = time.perf_counter()
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._count(self._queued, stage, 1, COMPUTE_QUEUE_DEPTH)
+            # Strict priority order: only the head waiter may take threads
+            while self._waiting[0] is not entry or not self._fits(waiter):
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._count(self._queued, stage, -1, COMPUTE_QUEUE_DEPTH)
+            self._in_use += threads
+            self._count(self._running, stage, 1, COMPUTE_RUNNING)
+            self._cond.notify_all()  # The next head may fit too
+        observe(f"compute.wait.{stage}", time.perf_counter() - start)
+
+        self._local.stage, self._local.threads = stage, threads
+        try:
+            with _inference(threads):
+                yield
+        finally:
+            self._local.stage = self._local.threads = None
+            with self._cond:
+                self._in_use -= threads
+                self._count(self._running, stage, -1, COMPUTE_RUNNING)
+                self._cond.notify_all()
+
+    @staticmethod
+    def _count(counts: Dict[str, int], stage: str, delta: int, gauge: Gauge):
+        counts[stage] = counts.get(stage, 0) + delta
+        gauge.labels(stage).set(counts[stage])
+
+    def snapshot(self) -> Dict:
+        """Per-stage budget, priority, queued and running calls, plus threads in use."""
+        with self._cond:
+            return {
+                "total_threads": self.total_threads,
+                "interactive_reserve": self.interactive_reserve,
+                "threads_in_use": self._in_use,
+                "stages": {
+                    name: {
+                        "threads": threads,
+                        "priority": priority,
+                        "queued": self._queued.get(name, 0),
+                        "running": self._running.get(name, 0),
+                    }
+                    for name, (threads, priority) in self.stages.items()
+                },
+            }
+
+
+@contextmanager
+def _inference(threads: int):
+    # Only touch libraries the process already loaded — the API workers of a
+    # remote embedding service never import torch for this
+    with ExitStack() as stack:
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            # With the OpenMP backend this sets the calling thread's intra-op width only
+            torch.set_num_threads(threads)
+            stack.enter_context(torch.inference_mode())
+        cv2 = sys.modules.get("cv2")
+        if cv2 is not None:
+            # Process-wide in OpenCV: approximate, the most recently started stage sets it
+            cv2.setNumThreads(threads)
+        yield
+
+
+# Module-level singleton — shared by every model stage in the process
+scheduler = ComputeScheduler()
+
+
+def compute_stage(stage: str, priority: Optional[int] = None):
+    """Shorthand for scheduler.stage()."""
+    return scheduler.stage(stage, priority)
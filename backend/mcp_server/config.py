@@ -12,6 +12,7 @@ load_dotenv(dotenv_path=env_path, override=True)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+QDRANT_PATH = os.getenv("QDRANT_PATH")  # Optional embedded Qdrant (":memory:" or a folder) instead of QDRANT_URL
 
 # Tavily API for web search (get free key at https://tavily.com)
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
@@ -24,16 +25,120 @@ EMBEDDING_DIM = 768  # BAAI/bge-base-en-v1.5 output dimension
 # Gemini Configuration (LLM only — embeddings are handled locally)
 GEMINI_MODEL = "gemini-2.5-flash"
 
+# Providers — "fake" swaps in deterministic local stand-ins (mcp_server/fakes.py), e.g. for load tests
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()  # "gemini" or "fake"
+WEB_SEARCH_PROVIDER = os.getenv("WEB_SEARCH_PROVIDER", "tavily").lower()  # "tavily" or "fake"
+FAKE_LLM_TURN_MS = float(os.getenv("FAKE_LLM_TURN_MS", "400"))  # Latency of each fake model turn (tool decision or answer)
+FAKE_LLM_ANSWER_CHARS = int(os.getenv("FAKE_LLM_ANSWER_CHARS", "800"))  # Length of a fake answer
+FAKE_LLM_STREAM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_STREAM_CHUNK_CHARS", "120"))  # Characters per streamed chunk
+FAKE_LLM_CHUNK_MS = float(os.getenv("FAKE_LLM_CHUNK_MS", "30"))  # Gap between streamed chunks
+FAKE_WEB_LATENCY_MS = float(os.getenv("FAKE_WEB_LATENCY_MS", "600"))  # Latency of a fake web search
+FAKE_LATENCY_JITTER = float(os.getenv("FAKE_LATENCY_JITTER", "0.2"))  # ± fraction of latency, fixed per input text
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))  # Fraction of fake calls failing with a transient 503
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+
 # Local Embedding Model
 BGE_MODEL_NAME = "BAAI/bge-base-en-v1.5"  # ~438 MB, 768 dims
+EMBED_BATCH_SIZE = 32  # Chunks per encode call; batches are built from length-sorted chunks
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))  # How long a lone embed call waits for others to share its batch
+EMBEDDING_SERVICE_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET")  # Shared embedding service (python main.py embed); unset = load BGE in-process
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "60"))  # Seconds a call waits for the service (less if the request's deadline is sooner)
+
+# Chunking (in BGE tokens — the model reads at most 512 per chunk, including [CLS]/[SEP])
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "480"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "48"))
 
 # RAG Configuration
 TOP_K = 5
 RELEVANCE_THRESHOLD = 0.5  # Minimum score to consider context sufficient
 
-MAX_RETRIES = 3  # Max retries on transient errors
+# Agent tool results (see mcp_server/tool_results.py)
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TOOL_RESULT_MAX_TOKENS", "1200"))  # Budget for one search tool result
+TOOL_SNIPPET_CHARS = int(os.getenv("TOOL_SNIPPET_CHARS", "400"))  # Longest snippet per result
+TOOL_FETCH_MAX_CHARS = int(os.getenv("TOOL_FETCH_MAX_CHARS", "6000"))  # Longest content fetch_result returns
+
+# Admission control and deadlines (see api/admission.py, mcp_server/deadlines.py)
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "8"))  # /query + /query-stream in flight per API worker
+QUERY_QUEUE_SIZE = int(os.getenv("QUERY_QUEUE_SIZE", "16"))  # Waiting beyond this → 429
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))  # Uploads being received per API worker
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "8"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10"))  # Longer wait → 503
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "60"))  # End-to-end budget of one query
+TOOL_MIN_SECONDS = 2.0  # Tools stop searching once less than this is left of the deadline
+
+MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))  # Max retries on transient errors (idempotent external calls)
+RETRY_BASE_DELAY_MS = float(os.getenv("RETRY_BASE_DELAY_MS", "200"))  # Backoff before the 1st retry, doubled per retry (full jitter)
+RETRY_MAX_DELAY_MS = float(os.getenv("RETRY_MAX_DELAY_MS", "2000"))  # Backoff cap
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # Consecutive failures that open a dependency's circuit
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))  # Fail fast this long before a trial call
+QDRANT_HEDGE_PERCENTILE = float(os.getenv("QDRANT_HEDGE_PERCENTILE", "95"))  # Duplicate searches slower than this latency percentile (0 disables)
+QDRANT_HEDGE_MIN_MS = float(os.getenv("QDRANT_HEDGE_MIN_MS", "20"))  # Never hedge sooner than this
+
+# Reranking (optional cross-encoder stage after vector search, runs on CPU)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # ~90 MB
+RERANK_CANDIDATES = 30  # Candidates over-fetched from Qdrant before rescoring
+RERANK_BATCH_SIZE = 16
+RERANK_LATENCY_BUDGET_MS = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "250"))
+
+# Ingestion
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))  # Concurrent process_pdf pipelines, across all API workers
+JOB_RETENTION_SECONDS = 600  # Finished jobs and their progress are dropped after this
+JOB_POLL_SECONDS = 1.0  # How often idle workers look for jobs submitted through other API workers
+PROGRESS_POLL_SECONDS = 0.5  # How often SSE streams check for progress published by other API workers
+JOB_LEASE_SECONDS = 120  # A running job whose worker stops renewing its lease for this long is failed by another
+
+# Production launch (`python main.py serve`)
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))  # Forked uvicorn worker processes sharing preloaded models
+
+# Compute scheduler (CPU thread budgets for model stages, see mcp_server/compute.py)
+# CPU threads shared by all stages of one process; 0 = the machine's cores, split evenly between `serve` workers
+COMPUTE_THREADS = int(os.getenv("COMPUTE_THREADS", "0"))
+COMPUTE_INTERACTIVE_RESERVE = int(os.getenv("COMPUTE_INTERACTIVE_RESERVE", "2"))  # Threads background stages leave free for queries
+# Stage → (intra-op threads, priority); lower priority runs first. Override as "stage=threads:priority,..."
+COMPUTE_STAGES = {
+    "query_embed": (2, 0),  # Query embedding
+    "rerank": (2, 0),       # Cross-encoder rescoring
+    "embed": (4, 1),        # Document chunk embedding
+    "caption": (4, 1),      # BLIP
+    "ocr": (2, 1),          # EasyOCR (image captions and scanned pages)
+    "table": (2, 1),        # img2table (OpenCV + EasyOCR)
+}
+for _item in filter(None, (i.strip() for i in os.getenv("COMPUTE_STAGE_BUDGETS", "").split(","))):
+    _stage, _budget = _item.split("=")
+    _threads, _, _priority = _budget.partition(":")
+    COMPUTE_STAGES[_stage.strip()] = (int(_threads), int(_priority) if _priority else COMPUTE_STAGES.get(_stage.strip(), (0, 1))[1])
+
+# Page OCR rendering (scanned pages / text-less image regions)
+OCR_DPI = 108  # Default render resolution (1.5× PDF points)
+OCR_MIN_DPI = 72  # Floor when shrinking large pages to fit OCR_MAX_PIXELS
+OCR_MAX_DPI = 300  # Ceiling when enlarging small regions
+OCR_MAX_PIXELS = 4_000_000  # Per render; larger pages are OCR'd in tiles (~4 MB grayscale each)
+OCR_TILE_OVERLAP_PTS = 36  # Neighbouring tiles share this band (~3 lines of body text) so no line is cut
+
+# Extracted images (stored under content-hash names, see api/image_store.py)
+THUMBNAIL_SIZE = 256  # Longest side of the sources-panel thumbnails, px
+IMAGE_WEBP_QUALITY = 85  # Used only for embedded encodings browsers can't display
+
+# Namespaces (tenants, see mcp_server/namespaces.py)
+DEFAULT_NAMESPACE = "default"  # Uses COLLECTION_NAME and the top-level output folders
+NAMESPACE_MODE = os.getenv("NAMESPACE_MODE", "collection").lower()  # "collection" (one per tenant) or "partition" (shared, tenant-indexed)
+DEDICATED_NAMESPACES = {n.strip() for n in os.getenv("DEDICATED_NAMESPACES", "").split(",") if n.strip()}  # Own collection even in partition mode
+DEDICATED_SHARD_NUMBER = int(os.getenv("DEDICATED_SHARD_NUMBER", "2"))  # Shards for DEDICATED_NAMESPACES collections
+
+# Profiling (per-request sampling profiler, see mcp_server/profiling.py)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"  # Honour the X-DeepRetrieve-Profile header
+PROFILE_ARMED_REQUESTS = int(os.getenv("PROFILE_ARMED_REQUESTS", "0"))  # Profile the first N requests/tool calls after startup
+PROFILE_RING_SIZE = 50  # Profiles kept on disk; oldest are deleted first
+PROFILE_SAMPLE_INTERVAL_MS = 5
 
 # Output Paths
-OUTPUT_FOLDER = Path(__file__).parent.parent / "extracted_content"
+OUTPUT_FOLDER = Path(os.getenv("OUTPUT_FOLDER") or Path(__file__).parent.parent / "extracted_content")
 IMAGES_FOLDER = OUTPUT_FOLDER / "images"
+THUMBNAILS_FOLDER = IMAGES_FOLDER / "thumbs"
 TABLES_FOLDER = OUTPUT_FOLDER / "tables"
+CAPTION_CACHE_PATH = OUTPUT_FOLDER / "caption_cache.sqlite3"
+DOCUMENTS_DB_PATH = OUTPUT_FOLDER / "documents.sqlite3"
+STATE_DB_PATH = OUTPUT_FOLDER / "state.sqlite3"  # Ingestion jobs and progress, shared by all API workers
+PROFILE_FOLDER = OUTPUT_FOLDER / "profiles"
+NAMESPACES_FOLDER = OUTPUT_FOLDER / "namespaces"  # Tables and document registry of non-default namespaces
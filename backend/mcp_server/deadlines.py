@@ -0,0 +1,50 @@
+# End-to-end request deadlines
+#
+# A query gets one time budget when it arrives (see api/admission.py). Every
+# tool call and model request below it takes its timeout from what is left,
+# and once too little is left the agent's tools stop searching and tell the
+# model to answer with what it already has.
+
+import contextvars
+import time
+from typing import Any, Dict, Optional
+
+from .config import TOOL_MIN_SECONDS
+
+
+class Deadline:
+    """Absolute point in time a request must be answered by."""
+
+    __slots__ = ("budget", "expires_at")
+
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left (0 once expired)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self, margin: float = 0.0) -> bool:
+        """True once less than margin seconds are left."""
+        return self.remaining() <= margin
+
+    def too_late_for_tools(self) -> bool:
+        return self.expired(TOOL_MIN_SECONDS)
+
+
+# Deadline of the current request — copied into executor threads with the rest of the context
+deadline_var: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return deadline_var.get()
+
+
+def deadline_exceeded_result() -> Dict[str, Any]:
+    """Tool result returned instead of searching once the request is out of time."""
+    return {
+        "error": "deadline_exceeded",
+        "message": "The time budget for this question is used up. Do not call more tools; "
+                   "answer now using the information already retrieved.",
+    }
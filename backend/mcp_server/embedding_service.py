@@ -0,0 +1,343 @@
+# Shared embedding service — one BGE model for every API worker and the MCP server
+#
+# `python main.py embed` loads the model once and serves encode requests over a
+# Unix socket. Processes with EMBEDDING_SERVICE_SOCKET set only load the
+# tokenizer and send their texts here. Concurrent requests (from any process)
+# are gathered into micro-batches: a lone request waits up to
+# EMBED_BATCH_WINDOW_MS for others to share its forward pass, and queries are
+# batched ahead of ingestion chunks.
+#
+# Wire format: every message is a 4-byte big-endian length followed by the
+# payload. Requests are JSON; a reply is a JSON header, followed for
+# successful encodes by one frame of float32 vectors (count × dim).
+
+import heapq
+import itertools
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .compute import compute_stage, scheduler
+from .config import (
+    BGE_MODEL_NAME, EMBED_BATCH_SIZE, EMBED_BATCH_WINDOW_MS, EMBEDDING_SERVICE_SOCKET, EMBEDDING_SERVICE_TIMEOUT
+)
+from .deadlines import current_deadline
+from .telemetry import count
+
+DEFAULT_SOCKET_PATH = "/tmp/deepretrieve-embed.sock"
+
+# Lower runs first
+PRIORITY_QUERY = 0
+PRIORITY_INGEST = 1
+
+_FRAME = struct.Struct("!I")
+
+
+def load_model():
+    """Load the BGE SentenceTransformer (GPU if available)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Loading embedding model: {BGE_MODEL_NAME} on {device.upper()}...")
+    model = SentenceTransformer(BGE_MODEL_NAME, device=device)
+    print(f"✅ Embedding model ready! (dim={model.get_sentence_embedding_dimension()}, device={device})")
+    return model
+
+
+def model_encoder(model) -> Callable[[List[str], int], np.ndarray]:
+    """encode(texts, priority) for a loaded model, run under the compute scheduler."""
+    def encode(texts: List[str], priority: int = PRIORITY_INGEST) -> np.ndarray:
+        with compute_stage("query_embed" if priority == PRIORITY_QUERY else "embed"):
+            return model.encode(texts, batch_size=len(texts), normalize_embeddings=True)
+    return encode
+
+
+def load_tokenizer():
+    """Tokenizer only (a few MB) and the model's sequence limit, for processes using the service."""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(BGE_MODEL_NAME)
+    return tokenizer, min(tokenizer.model_max_length, 512)
+
+
+class _Request:
+    __slots__ = ("texts", "priority", "vectors", "error", "done")
+
+    def __init__(self, texts: List[str], priority: int):
+        self.texts = texts
+        self.priority = priority
+        self.vectors: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Runs encode calls from many threads as shared batches on one worker thread.
+
+    A batch is started once EMBED_BATCH_SIZE texts are waiting or the oldest
+    request has waited window_ms. Requests are taken in priority order
+    (queries before ingestion) and are never split across batches. encode
+    receives the batch's most urgent priority.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str], int], np.ndarray],
+        max_batch: int = EMBED_BATCH_SIZE,
+        window_ms: float = EMBED_BATCH_WINDOW_MS
+    ):
+        self._encode = encode
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._pending: List = []  # heap of (priority, seq, request)
+        self._pending_texts = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+
+    def submit(self, texts: List[str], priority: int = PRIORITY_QUERY) -> np.ndarray:
+        """Encode texts (normalized float32 rows, input order), blocking until their batch ran."""
+        request = _Request(texts, priority)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+            heapq.heappush(self._pending, (priority, next(self._seq), request))
+            self._pending_texts += len(texts)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.vectors
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def _next_batch(self) -> List[_Request]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Give concurrent callers a short window to join this batch
+            deadline = time.monotonic() + self.window
+            while self._pending_texts < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch: List[_Request] = []
+            size = 0
+            while self._pending and (not batch or size + len(self._pending[0][2].texts) <= self.max_batch):
+                request = heapq.heappop(self._pending)[2]
+                batch.append(request)
+                size += len(request.texts)
+            self._pending_texts -= size
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            texts = [t for request in batch for t in request.texts]
+            try:
+                priority = min(request.priority for request in batch)
+                vectors = np.asarray(self._encode(texts, priority), dtype=np.float32)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            offset = 0
+            for request in batch:
+                request.vectors = vectors[offset:offset + len(request.texts)]
+                offset += len(request.texts)
+                request.done.set()
+
+            self.stats["requests"] += len(batch)
+            self.stats["texts"] += len(texts)
+            self.stats["batches"] += 1
+            count("embed.batches")
+            count("embed.batched_requests", len(batch))
+
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_FRAME.pack(len(payload)))
+    sock.sendall(payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Embedding service connection closed")
+        received += n
+    return buf
+
+
+def _recv_frame(sock: socket.socket) -> bytearray:
+    (size,) = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    return _recv_exact(sock, size)
+
+
+# ---- Server ----
+
+class _Handler(socketserver.BaseRequestHandler):
+    """One client connection: a sequence of request/reply exchanges."""
+
+    def handle(self):
+        batcher: MicroBatcher = self.server.batcher
+        while True:
+            try:
+                request = json.loads(_recv_frame(self.request))
+            except (ConnectionError, OSError):
+                return
+
+            try:
+                if request.get("op") == "stats":
+                    reply = {
+                        "ok": True, "model": BGE_MODEL_NAME, "queued": batcher.queue_depth(),
+                        "compute": scheduler.snapshot(), **batcher.stats
+                    }
+                    _send_frame(self.request, json.dumps(reply).encode())
+                    continue
+
+                texts = request["texts"]
+                vectors = batcher.submit(texts, int(request.get("priority", PRIORITY_QUERY)))
+                header = {"ok": True, "count": len(texts), "dim": int(vectors.shape[1]) if len(texts) else 0}
+                _send_frame(self.request, json.dumps(header).encode())
+                _send_frame(self.request, vectors.astype("<f4", copy=False).tobytes())
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                _send_frame(self.request, json.dumps({"ok": False, "error": str(e)}).encode())
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: Optional[str] = None):
+    """Load the model and serve encode requests on a Unix socket until interrupted."""
+    socket_path = socket_path or EMBEDDING_SERVICE_SOCKET or DEFAULT_SOCKET_PATH
+    model = load_model()
+    batcher = MicroBatcher(model_encoder(model))
+    batcher.submit(["warm-up"])
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # stale socket from a previous run
+    server = _Server(socket_path, _Handler)
+    os.chmod(socket_path, 0o600)
+    server.batcher = batcher
+    print(f"🧮 Embedding service listening on {socket_path} "
+          f"(batch ≤{batcher.max_batch}, window {EMBED_BATCH_WINDOW_MS:g}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print(f"🧮 Embedding service stopped — {batcher.stats['texts']} texts in {batcher.stats['batches']} batches")
+
+
+# ---- Client ----
+
+class EmbeddingClient:
+    """Client for the embedding service. Each thread keeps its own connection,
+    so concurrent calls from one process reach the service concurrently and
+    can share a batch."""
+
+    def __init__(self, socket_path: str, connect_timeout: float = 10.0, timeout: float = EMBEDDING_SERVICE_TIMEOUT):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _timeout(self) -> float:
+        """Socket timeout for one call: the configured one, cut to what is left of the request's deadline."""
+        deadline = current_deadline()
+        if deadline is None:
+            return self.timeout
+        if deadline.expired():
+            raise TimeoutError("Request deadline passed before the embedding call")
+        return min(self.timeout, deadline.remaining())
+
+    def _connect(self) -> socket.socket:
+        # The service may still be loading the model when workers start
+        deadline = time.monotonic() + min(self.connect_timeout, self._timeout())
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(max(0.001, deadline - time.monotonic()))
+                sock.connect(self.socket_path)
+                return sock
+            except TimeoutError:
+                sock.close()
+                raise
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(
+                        f"Embedding service not reachable at {self.socket_path} — "
+                        f"start it with `python main.py embed` or unset EMBEDDING_SERVICE_SOCKET"
+                    ) from e
+                time.sleep(0.2)
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._local.sock = self._connect()
+        return sock
+
+    def _drop(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _call(self, request: Dict) -> Dict:
+        sock = self._connection()
+        # Covers this request and its reply frames, so a stuck service can't hold the thread forever
+        sock.settimeout(self._timeout())
+        _send_frame(sock, json.dumps(request).encode())
+        reply = json.loads(_recv_frame(sock))
+        if not reply.get("ok"):
+            raise RuntimeError(f"Embedding service error: {reply.get('error')}")
+        return reply
+
+    def embed(self, texts: List[str], priority: int = PRIORITY_QUERY) -> np.ndarray:
+        """Normalized embeddings for texts, one float32 row each."""
+        # One reconnect covers a service restart between calls
+        for attempt in range(2):
+            try:
+                header = self._call({"texts": texts, "priority": priority})
+                data = _recv_frame(self._connection())
+                return np.frombuffer(data, dtype="<f4").reshape(header["count"], header["dim"])
+            except TimeoutError:
+                # Out of time: no retry, and the late reply must not be read as the next call's
+                self._drop()
+                raise
+            except (ConnectionError, OSError):
+                self._drop()
+                if attempt:
+                    raise
+
+    def stats(self) -> Dict:
+        try:
+            return self._call({"op": "stats"})
+        except TimeoutError:
+            self._drop()
+            raise
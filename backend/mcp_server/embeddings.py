@@ -1,25 +1,128 @@
 # Embedding functions — powered by BAAI/bge-base-en-v1.5 
+#
+# By default the model is loaded in this process. With EMBEDDING_SERVICE_SOCKET
+# set, only the tokenizer is loaded here and encoding goes to the shared
+# embedding service (see embedding_service.py), so API workers and the MCP
+# server don't each hold their own copy of the weights. Either way, concurrent
+# single-text calls (queries, captions) are micro-batched together.
 
-import torch
-from typing import List
-from sentence_transformers import SentenceTransformer
+import time
+from typing import Callable, Dict, List, Optional, Tuple
 
-from .config import BGE_MODEL_NAME
+from .config import EMBED_BATCH_SIZE, EMBEDDING_SERVICE_SOCKET
+from .embedding_service import PRIORITY_QUERY, PRIORITY_INGEST
 
-# Use GPU if available
-_device = "cuda" if torch.cuda.is_available() else "cpu"
+if EMBEDDING_SERVICE_SOCKET:
+    from .embedding_service import EmbeddingClient, load_tokenizer
 
-# Load model once at startup (singleton) — ~438 MB, cached after first download
-print(f"Loading embedding model: {BGE_MODEL_NAME} on {_device.upper()}...")
-_model = SentenceTransformer(BGE_MODEL_NAME, device=_device)
-print(f"✅ Embedding model ready! (dim={_model.get_sentence_embedding_dimension()}, device={_device})")
+    _client = EmbeddingClient(EMBEDDING_SERVICE_SOCKET)
+    _tokenizer, _max_seq_length = load_tokenizer()
+    print(f"✅ Using shared embedding service at {EMBEDDING_SERVICE_SOCKET}")
 
+    def _encode(texts: List[str], priority: int):
+        return _client.embed(texts, priority)
+else:
+    from .embedding_service import MicroBatcher, load_model, model_encoder
+
+    # Load model once at startup (singleton) — ~438 MB, cached after first download
+    _model = load_model()
+    _tokenizer, _max_seq_length = _model.tokenizer, _model.max_seq_length
+    _model_encode = model_encoder(_model)  # Runs under the compute scheduler's thread budget
+    _batcher = MicroBatcher(_model_encode)
+
+    def _encode(texts: List[str], priority: int):
+        # Lone texts wait briefly to share a forward pass; full batches run directly
+        if len(texts) == 1:
+            return _batcher.submit(texts, priority)
+        return _model_encode(texts, priority)
 
 
 def embed_text(text: str) -> List[float]:
     """Embed a document text chunk for indexing."""
-    embedding = _model.encode(text, normalize_embeddings=True)
-    return embedding.tolist()
+    return _encode([text], PRIORITY_INGEST)[0].tolist()
+
+
+def token_offsets(text: str) -> List[Tuple[int, int]]:
+    """Character span of every model token in text (no special tokens, no truncation)."""
+    encoded = _tokenizer(
+        text, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+    )
+    return [tuple(span) for span in encoded["offset_mapping"]]
+
+
+def token_lengths(texts: List[str]) -> List[int]:
+    """Sequence length of each text as the model sees it (special tokens included, truncated)."""
+    encoded = _tokenizer(
+        texts, add_special_tokens=True, truncation=True, max_length=_max_seq_length
+    )
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def _padded_tokens(lengths: List[int], batch_size: int) -> int:
+    """Token slots a batch run occupies when each batch pads to its longest sequence."""
+    return sum(
+        len(batch) * max(batch)
+        for batch in (lengths[i:i + batch_size] for i in range(0, len(lengths), batch_size))
+    )
+
+
+def embed_texts(
+    texts: List[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+    stats: Optional[Dict[str, float]] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> List[List[float]]:
+    """Embed document chunks in batches of similar token length; returns vectors in input order.
+
+    Sorting by length keeps each batch close to its longest member, so little
+    of the batch is padding. Chunk/token counts, padded slots (and what arrival
+    order would have padded) and embed time are added to stats when given.
+    """
+    if not texts:
+        return []
+
+    lengths = token_lengths(texts)
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+
+    start = time.perf_counter()
+    for b in range(0, len(order), batch_size):
+        batch = order[b:b + batch_size]
+        embeddings = _encode([texts[i] for i in batch], PRIORITY_INGEST)
+        for i, embedding in zip(batch, embeddings):
+            vectors[i] = embedding.tolist()
+        if progress_callback:
+            progress_callback(min(b + batch_size, len(texts)), len(texts))
+    elapsed = time.perf_counter() - start
+
+    if stats is not None:
+        sorted_lengths = [lengths[i] for i in order]
+        for key, value in (
+            ("embed_chunks", len(texts)),
+            ("embed_tokens", sum(lengths)),
+            ("embed_padded_tokens", _padded_tokens(sorted_lengths, batch_size)),
+            ("embed_padded_tokens_unsorted", _padded_tokens(lengths, batch_size)),
+            ("embed_seconds", elapsed),
+        ):
+            stats[key] = stats.get(key, 0) + value
+    return vectors
+
+
+def embed_summary(stats: Dict[str, float]) -> Dict[str, float]:
+    """Padding ratio and throughput from the counters embed_texts accumulates."""
+    chunks = stats.get("embed_chunks", 0)
+    tokens = stats.get("embed_tokens", 0)
+    padded = stats.get("embed_padded_tokens", 0)
+    unsorted = stats.get("embed_padded_tokens_unsorted", 0)
+    seconds = stats.get("embed_seconds", 0)
+    return {
+        "chunks": chunks,
+        "tokens": tokens,
+        "padding_ratio": round(1 - tokens / padded, 3) if padded else 0.0,
+        "padding_ratio_unsorted": round(1 - tokens / unsorted, 3) if unsorted else 0.0,
+        "chunks_per_second": round(chunks / seconds, 2) if seconds else 0.0,
+        "tokens_per_second": round(tokens / seconds, 1) if seconds else 0.0,
+    }
 
 
 def embed_query(query: str) -> List[float]:
@@ -28,8 +131,7 @@ def embed_query(query: str) -> List[float]:
     BGE models benefit from an instruction prefix for queries.
     """
     prefixed = f"Represent this sentence for searching relevant passages: {query}"
-    embedding = _model.encode(prefixed, normalize_embeddings=True)
-    return embedding.tolist()
+    return _encode([prefixed], PRIORITY_QUERY)[0].tolist()
 
 
 def embed_image_base64(base64_string: str) -> List[float]:
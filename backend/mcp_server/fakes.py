@@ -0,0 +1,224 @@
+# Deterministic local stand-ins for Gemini and Tavily
+#
+# Selected with LLM_PROVIDER=fake / WEB_SEARCH_PROVIDER=fake, so the agent
+# endpoints can be load-tested (see benchmarks/load_test.py) without API keys
+# or quota. Each fake implements only the part of the real client's API this
+# codebase calls:
+#   FakeGeminiClient: chats.create(model, config) → send_message / send_message_stream,
+#                     models.generate_content(model, contents)
+#   FakeTavilyClient: search(query, max_results, search_depth, include_answer, timeout)
+#
+# The fake chat runs a fixed agent script through the tools in config.tools,
+# just as automatic function calling would: rag_retrieve_func first, then
+# web_search_func if no result scores at least FAKE_WEB_THRESHOLD, then
+# fetch_result_func for the best hit. Each model turn takes FAKE_LLM_TURN_MS.
+# The answer is FAKE_LLM_ANSWER_CHARS long and is streamed in
+# FAKE_LLM_STREAM_CHUNK_CHARS pieces, FAKE_LLM_CHUNK_MS apart. Latency jitter
+# and text are derived from the input, so the same question always behaves
+# the same. FAKE_ERROR_RATE of calls fail with a transient 503.
+
+import hashlib
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .config import (
+    FAKE_LLM_TURN_MS, FAKE_LLM_ANSWER_CHARS, FAKE_LLM_STREAM_CHUNK_CHARS, FAKE_LLM_CHUNK_MS,
+    FAKE_WEB_LATENCY_MS, FAKE_LATENCY_JITTER, FAKE_ERROR_RATE, FAKE_SEED
+)
+
+FAKE_WEB_THRESHOLD = 0.5  # Best RAG score below this sends the fake agent to web search
+
+_WORDS = (
+    "the results show that retrieval quality depends on chunking embedding model and reranking "
+    "latency grows with corpus size while recall stays stable across configurations tables and "
+    "figures summarize the measurements reported in each section of the document"
+).split()
+
+
+class FakeServiceError(Exception):
+    """Transient failure injected by a fake (looks like an HTTP 503 to the resilience layer)."""
+
+    status_code = 503
+
+
+def _rng(*parts: Any) -> random.Random:
+    """Random generator seeded from FAKE_SEED and the given inputs."""
+    key = "\x1f".join(str(p) for p in (FAKE_SEED, *parts))
+    return random.Random(int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big"))
+
+
+class _Faults:
+    """Shared seeded source of injected failures."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._rng = random.Random(FAKE_SEED)
+        self._lock = threading.Lock()
+
+    def maybe_fail(self, what: str):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            fail = self._rng.random() < self.rate
+        if fail:
+            raise FakeServiceError(f"Injected failure in fake {what} (503)")
+
+
+def _sleep_ms(ms: float, text: str):
+    """Sleep ms, varied by ±FAKE_LATENCY_JITTER as a fixed function of text."""
+    jitter = 1 + FAKE_LATENCY_JITTER * (2 * _rng("latency", text).random() - 1)
+    time.sleep(max(0.0, ms * jitter) / 1000)
+
+
+def _filler(rng: random.Random, words: List[str], chars: int) -> str:
+    sentences = []
+    length = 0
+    while length < chars:
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 16))).capitalize() + "."
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)[:chars]
+
+
+class FakeResponse:
+    """Stands in for GenerateContentResponse (and its streamed chunks): only .text is read."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _question(message: str) -> str:
+    """The user's question from an agent prompt (last 'Question:' line), else the whole message."""
+    for line in reversed(message.splitlines()):
+        if line.startswith("Question:"):
+            return line[len("Question:"):].strip()
+    return message.strip()
+
+
+class FakeChat:
+    """One agent conversation: runs the tool script, then answers."""
+
+    def __init__(self, tools: Dict[str, Callable], faults: _Faults):
+        self._tools = tools
+        self._faults = faults
+
+    def _turn(self, text: str):
+        self._faults.maybe_fail("model turn")
+        _sleep_ms(FAKE_LLM_TURN_MS, text)
+
+    def _call_tool(self, name: str, **kwargs) -> Optional[Dict[str, Any]]:
+        tool = self._tools.get(name)
+        if tool is None:
+            return None
+        try:
+            result = tool(**kwargs)
+        except Exception as e:
+            # Automatic function calling hands tool errors back to the model too
+            return {"error": str(e)}
+        return result if isinstance(result, dict) else None
+
+    def _run_agent(self, message: str) -> str:
+        question = _question(message)
+        self._turn(question)
+        snippets: List[str] = []
+        cited: List[str] = []
+
+        rag = self._call_tool("rag_retrieve_func", query=question, top_k=5) or {}
+        hits = rag.get("results") or []
+        best = max((h.get("score") or 0 for h in hits), default=0)
+        if rag.get("error") != "deadline_exceeded" and best < FAKE_WEB_THRESHOLD and "web_search_func" in self._tools:
+            self._turn(question + "\x1fweb")
+            web = self._call_tool("web_search_func", query=question) or {}
+            hits = hits + (web.get("results") or [])
+            if web.get("answer"):
+                snippets.append(web["answer"])
+
+        hits = sorted(hits, key=lambda h: h.get("score") or 0, reverse=True)
+        if hits and hits[0].get("id") and "fetch_result_func" in self._tools:
+            self._turn(question + "\x1ffetch")
+            full = self._call_tool("fetch_result_func", result_id=hits[0]["id"]) or {}
+            if full.get("content"):
+                snippets.append(full["content"])
+        for hit in hits[:3]:
+            cited.append(hit.get("id") or "?")
+            if hit.get("content"):
+                snippets.append(hit["content"])
+
+        self._turn(question + "\x1fanswer")
+        words = " ".join(snippets).split() or _WORDS
+        lead = f"Answer to: {question}\n\n" + (f"Based on {', '.join(cited)}: " if cited else "")
+        return lead + _filler(_rng("answer", question), words, max(0, FAKE_LLM_ANSWER_CHARS - len(lead)))
+
+    def send_message(self, message: str) -> FakeResponse:
+        return FakeResponse(self._run_agent(message))
+
+    def send_message_stream(self, message: str) -> Iterator[FakeResponse]:
+        # Tool calls happen before the first chunk, as with the real SDK
+        answer = self._run_agent(message)
+        size = max(1, FAKE_LLM_STREAM_CHUNK_CHARS)
+        for start in range(0, len(answer), size):
+            if start:
+                _sleep_ms(FAKE_LLM_CHUNK_MS, answer[start:start + size])
+            yield FakeResponse(answer[start:start + size])
+
+
+class _FakeChats:
+    def __init__(self, faults: _Faults):
+        self._faults = faults
+
+    def create(self, model: str, config: Any = None, **kwargs) -> FakeChat:
+        tools = {getattr(t, "__name__", ""): t for t in (getattr(config, "tools", None) or []) if callable(t)}
+        return FakeChat(tools, self._faults)
+
+
+class _FakeModels:
+    def __init__(self, faults: _Faults):
+        self._faults = faults
+
+    def generate_content(self, model: str, contents: Any, config: Any = None, **kwargs) -> FakeResponse:
+        text = str(contents)
+        self._faults.maybe_fail("generate_content")
+        _sleep_ms(FAKE_LLM_TURN_MS, text)
+        return FakeResponse(_filler(_rng("generate", text), text.split() or _WORDS, FAKE_LLM_ANSWER_CHARS))
+
+
+class FakeGeminiClient:
+    """Local stand-in for genai.Client."""
+
+    def __init__(self, error_rate: float = FAKE_ERROR_RATE):
+        faults = _Faults(error_rate)
+        self.chats = _FakeChats(faults)
+        self.models = _FakeModels(faults)
+
+
+class FakeTavilyClient:
+    """Local stand-in for TavilyClient."""
+
+    def __init__(self, latency_ms: float = FAKE_WEB_LATENCY_MS, error_rate: float = FAKE_ERROR_RATE):
+        self.latency_ms = latency_ms
+        self._faults = _Faults(error_rate)
+
+    def search(
+        self, query: str, max_results: int = 5, search_depth: str = "basic",
+        include_answer: bool = False, timeout: Optional[float] = None, **kwargs
+    ) -> Dict[str, Any]:
+        self._faults.maybe_fail("web search")
+        _sleep_ms(self.latency_ms, query)
+        rng = _rng("web", query)
+        words = query.split() + _WORDS
+        results = [
+            {
+                "title": f"{query[:60]} — result {i + 1}",
+                "url": f"https://example.com/{hashlib.sha1(f'{query}{i}'.encode()).hexdigest()[:12]}",
+                "content": _filler(rng, words, 600),
+                "score": round(0.9 - 0.1 * i - 0.05 * rng.random(), 3),
+            }
+            for i in range(max_results)
+        ]
+        return {
+            "query": query,
+            "answer": _filler(rng, words, 240) if include_answer else None,
+            "results": results,
+        }
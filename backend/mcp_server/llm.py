@@ -1,21 +1,54 @@
 # Gemini LLM integration for RAG responses
 
+from types import SimpleNamespace
 from typing import List, Dict, Optional, Any
-from google import genai
 
-from .config import GOOGLE_API_KEY, GEMINI_MODEL, MAX_RETRIES
+from .config import GOOGLE_API_KEY, GEMINI_MODEL, MAX_RETRIES, LLM_PROVIDER
+from . import resilience
 
-# Initialize Gemini immediately
-print(f"Initializing Gemini ({GEMINI_MODEL})...")
-_gemini_client = genai.Client(api_key=GOOGLE_API_KEY)
-print("✅ Gemini client ready!")
+
+def _gemini():
+    from google import genai
+    return genai.Client(api_key=GOOGLE_API_KEY)
+
+
+def _fake():
+    from .fakes import FakeGeminiClient
+    return FakeGeminiClient()
+
+
+# LLM providers: anything exposing the genai.Client surface used here
+# (chats.create → send_message / send_message_stream, models.generate_content)
+LLM_PROVIDERS = {"gemini": _gemini, "fake": _fake}
+
+if LLM_PROVIDER not in LLM_PROVIDERS:
+    raise ValueError(f"Unknown LLM_PROVIDER '{LLM_PROVIDER}' (expected one of: {', '.join(LLM_PROVIDERS)})")
+
+# Initialize the LLM client immediately
+print(f"Initializing LLM ({LLM_PROVIDER}, {GEMINI_MODEL})...")
+_gemini_client = LLM_PROVIDERS[LLM_PROVIDER]()
+print("✅ LLM client ready!")
 
 
 def get_gemini_client():
-    """Get Gemini client instance"""
+    """Get the LLM client instance (Gemini, or the local fake with LLM_PROVIDER=fake)"""
     return _gemini_client
 
 
+def agent_config(tools: List[Any], system_instruction: str, temperature: float, timeout: float):
+    """Chat config for the agent loop (automatic function calling over tools),
+    in the active provider's type. timeout (seconds) bounds each model request."""
+    if LLM_PROVIDER == "fake":
+        return SimpleNamespace(tools=tools, system_instruction=system_instruction, temperature=temperature)
+    from google.genai import types
+    return types.GenerateContentConfig(
+        tools=tools,
+        system_instruction=system_instruction,
+        temperature=temperature,
+        http_options=types.HttpOptions(timeout=int(timeout * 1000))
+    )
+
+
 def prepare_context_from_results(results: List[Dict]) -> str:
     """Prepare clean context string from search results"""
     if not results:
@@ -89,7 +122,10 @@ USER QUESTION: {query}
 
 ANSWER:"""
     
-    response = client.models.generate_content(
+    # Retries transient errors (429 / 5xx / timeouts) up to max_retries times with backoff
+    response = resilience.gemini.call(
+        client.models.generate_content,
+        max_retries=max_retries,
         model=GEMINI_MODEL,
         contents=prompt
     )
@@ -0,0 +1,102 @@
+# Tenant namespaces — each maps to its own slice of the index and its own artifact folders
+#
+# The default namespace is the original single-tenant layout: COLLECTION_NAME,
+# IMAGES_FOLDER, TABLES_FOLDER and DOCUMENTS_DB_PATH. Any other namespace
+# either gets a collection of its own (NAMESPACE_MODE=collection) or shares
+# one payload-partitioned collection, where every point carries a tenant field
+# backed by a tenant index (NAMESPACE_MODE=partition). Namespaces listed in
+# DEDICATED_NAMESPACES always get their own collection with
+# DEDICATED_SHARD_NUMBER shards, so a large tenant can be moved off the shared one.
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .config import (
+    COLLECTION_NAME, DEFAULT_NAMESPACE, NAMESPACE_MODE, DEDICATED_NAMESPACES, DEDICATED_SHARD_NUMBER,
+    IMAGES_FOLDER, TABLES_FOLDER, DOCUMENTS_DB_PATH, NAMESPACES_FOLDER
+)
+
+TENANT_FIELD = "tenant"
+SHARED_COLLECTION = f"{COLLECTION_NAME}_shared"
+
+# Lowercase so names are safe as collection names, folder names and URL segments
+_NAME = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+
+class InvalidNamespace(ValueError):
+    """Namespace name that can't be used as a collection / folder name."""
+
+
+@dataclass(frozen=True)
+class Namespace:
+    name: str
+    collection_name: str
+    partitioned: bool  # Shares SHARED_COLLECTION; points and queries carry TENANT_FIELD
+    shard_number: Optional[int]  # Set for dedicated collections; None keeps the Qdrant default
+    images_folder: Path
+    tables_folder: Path
+    documents_db: Path
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_NAMESPACE
+
+    @property
+    def thumbnails_folder(self) -> Path:
+        return self.images_folder / "thumbs"
+
+    @property
+    def images_url(self) -> str:
+        """URL prefix the /images mount serves this namespace's images under."""
+        return "/images" if self.is_default else f"/images/namespaces/{self.name}"
+
+    def tenant_payload(self) -> Dict[str, str]:
+        """Extra payload stored on every point of this namespace."""
+        return {TENANT_FIELD: self.name} if self.partitioned else {}
+
+    def describe(self) -> Dict:
+        return {
+            "namespace": self.name,
+            "collection": self.collection_name,
+            "partitioned": self.partitioned,
+            "shard_number": self.shard_number,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_namespace(name: Optional[str] = None) -> Namespace:
+    """Resolve a namespace name (None → DEFAULT_NAMESPACE). Raises InvalidNamespace."""
+    name = (name or DEFAULT_NAMESPACE).strip().lower()
+    if not _NAME.match(name):
+        raise InvalidNamespace(
+            f"Invalid namespace '{name}': use 1-63 lowercase letters, digits, '-' or '_'"
+        )
+
+    if name == DEFAULT_NAMESPACE:
+        return Namespace(
+            name=name, collection_name=COLLECTION_NAME, partitioned=False, shard_number=None,
+            images_folder=IMAGES_FOLDER, tables_folder=TABLES_FOLDER, documents_db=DOCUMENTS_DB_PATH,
+        )
+
+    dedicated = name in DEDICATED_NAMESPACES
+    partitioned = NAMESPACE_MODE == "partition" and not dedicated
+    return Namespace(
+        name=name,
+        collection_name=SHARED_COLLECTION if partitioned else f"{COLLECTION_NAME}__{name}",
+        partitioned=partitioned,
+        shard_number=DEDICATED_SHARD_NUMBER if dedicated else None,
+        images_folder=IMAGES_FOLDER / "namespaces" / name,
+        tables_folder=NAMESPACES_FOLDER / name / "tables",
+        documents_db=NAMESPACES_FOLDER / name / "documents.sqlite3",
+    )
+
+
+def known_namespaces() -> List[str]:
+    """The default namespace plus every namespace that has stored anything on disk."""
+    names = [DEFAULT_NAMESPACE]
+    if NAMESPACES_FOLDER.exists():
+        names += sorted(p.name for p in NAMESPACES_FOLDER.iterdir() if p.is_dir() and _NAME.match(p.name))
+    return names
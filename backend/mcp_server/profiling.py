@@ -0,0 +1,262 @@
+# On-demand sampling profiler for single requests, uploads and MCP tool calls
+#
+# A profile follows the request's context: every thread that runs work for it
+# (agent, prefetch and ingestion executor threads, via run_in_context)
+# registers itself while that work runs, and one sampler thread records the
+# stacks of registered threads. The event-loop thread is shared by every
+# request in flight, so it is never registered for an API request: coroutine
+# code running on the loop itself doesn't show up in profiles. Finished profiles are written as collapsed stacks (flamegraph.pl /
+# speedscope format) into a bounded on-disk ring.
+
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .config import (
+    PROFILING_ENABLED, PROFILE_ARMED_REQUESTS, PROFILE_FOLDER,
+    PROFILE_RING_SIZE, PROFILE_SAMPLE_INTERVAL_MS
+)
+from .telemetry import request_id_var
+
+PROFILE_HEADER = "x-deepretrieve-profile"
+PROFILE_SUFFIX = ".folded"
+
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "active_profile", default=None
+)
+
+
+class RequestProfile:
+    """Samples collected for one request across all threads that worked on it."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.request_id = request_id_var.get()
+        self.started_at = time.time()
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.finished = False
+        self._threads: Dict[int, int] = {}  # thread id -> nesting depth
+        self._lock = threading.Lock()
+
+    def enter_thread(self, ident: int):
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def exit_thread(self, ident: int):
+        with self._lock:
+            depth = self._threads.get(ident, 0) - 1
+            if depth <= 0:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] = depth
+
+    def record(self, frames: Dict[int, object]):
+        with self._lock:
+            threads = list(self._threads)
+        for ident in threads:
+            frame = frames.get(ident)
+            if frame is not None:
+                self.samples[_collapse(frame)] += 1
+                self.sample_count += 1
+
+
+def _collapse(frame) -> str:
+    """Root-first `func (file:line);...` stack, the collapsed-stack line format."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class _Sampler:
+    """One daemon thread that samples every active profile; idle when none are running."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self._profiles: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            if profile in self._profiles:
+                self._profiles.remove(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._profiles:
+                    self._wake.wait()
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.record(frames)
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfileRing:
+    """Finished profiles on disk, oldest deleted once more than `size` are kept."""
+
+    def __init__(self, folder: Path, size: int):
+        self.folder = folder
+        self.size = size
+        self._lock = threading.Lock()
+
+    def _files(self) -> List[Path]:
+        if not self.folder.exists():
+            return []
+        return sorted(self.folder.glob(f"*{PROFILE_SUFFIX}"), key=lambda p: p.stat().st_mtime)
+
+    def save(self, profile: RequestProfile, duration_ms: float) -> Path:
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", profile.label).strip("-")[:60] or "request"
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started_at))
+        name = f"{stamp}_{profile.request_id}_{slug}_{duration_ms:.0f}ms{PROFILE_SUFFIX}"
+        lines = [f"{stack} {n}" for stack, n in profile.samples.most_common()]
+
+        with self._lock:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            path = self.folder / name
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            os.replace(tmp, path)
+            for old in self._files()[:-self.size]:
+                old.unlink(missing_ok=True)
+        return path
+
+    def list(self) -> List[Dict]:
+        return [
+            {"name": p.name, "size_bytes": p.stat().st_size, "created_at": p.stat().st_mtime}
+            for p in reversed(self._files())
+        ]
+
+    def path(self, name: str) -> Optional[Path]:
+        """Resolve a profile name from list(); None for anything outside the ring."""
+        if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+            return None
+        path = self.folder / name
+        return path if path.is_file() else None
+
+
+_sampler = _Sampler(PROFILE_SAMPLE_INTERVAL_MS)
+profile_ring = ProfileRing(PROFILE_FOLDER, PROFILE_RING_SIZE)
+
+_armed = PROFILE_ARMED_REQUESTS
+_armed_lock = threading.Lock()
+
+
+def arm(requests: int) -> int:
+    """Profile the next `requests` requests/tool calls in this process. Returns the armed count."""
+    global _armed
+    with _armed_lock:
+        _armed = max(0, requests)
+        return _armed
+
+
+def armed() -> int:
+    return _armed
+
+
+def should_profile(header_value: Optional[str] = None) -> bool:
+    """Decide for a new request: the opt-in header (when PROFILING_ENABLED) or an armed slot."""
+    global _armed
+    if header_value and header_value.lower() in ("1", "true", "yes") and PROFILING_ENABLED:
+        return True
+    with _armed_lock:
+        if _armed > 0:
+            _armed -= 1
+            return True
+    return False
+
+
+def _current() -> Optional[RequestProfile]:
+    # Contexts copied for background jobs can outlive the request that was profiled
+    profile = _active_profile.get()
+    return None if profile is None or profile.finished else profile
+
+
+def is_profiling() -> bool:
+    """True if the current context belongs to a profiled request."""
+    return _current() is not None
+
+
+@contextmanager
+def profile_request(label: str, enabled: bool = True, register_thread: bool = True):
+    """Profile everything run for this context until the block exits, then save it to the ring.
+
+    register_thread also samples the calling thread; only pass True when the
+    block runs nothing else on it (a synchronous tool call), never from the
+    event loop.
+    """
+    if not enabled or _current() is not None:
+        yield None
+        return
+
+    profile = RequestProfile(label)
+    token = _active_profile.set(profile)
+    ident = threading.get_ident()
+    if register_thread:
+        profile.enter_thread(ident)
+    _sampler.add(profile)
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.finished = True
+        _sampler.remove(profile)
+        if register_thread:
+            profile.exit_thread(ident)
+        _active_profile.reset(token)
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            path = profile_ring.save(profile, duration_ms)
+            print(f"🔬 [PROFILE] {label}: {profile.sample_count} samples over {duration_ms:.0f}ms → {path.name}")
+        except OSError as e:
+            print(f"🔬 [PROFILE] Could not save profile for {label}: {e}")
+
+
+@contextmanager
+def profile_thread():
+    """Include the current (executor) thread in the context's profile while the block runs."""
+    profile = _current()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.enter_thread(ident)
+    try:
+        yield
+    finally:
+        profile.exit_thread(ident)
+
+
+def profiled(label: str):
+    """Decorator for MCP tools: profile the call when an armed slot is available."""
+    def decorator(fn: Callable):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Tools called inside an already profiled request don't take an armed slot
+            with profile_request(label, enabled=not is_profiling() and should_profile()):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
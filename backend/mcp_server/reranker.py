@@ -0,0 +1,122 @@
+# Cross-encoder reranking — optional second stage after vector search
+
+import logging
+import time
+from typing import List, Dict, Optional
+
+from .compute import compute_stage
+from .config import RERANK_MODEL_NAME, RERANK_BATCH_SIZE, RERANK_LATENCY_BUDGET_MS
+from .telemetry import count
+
+logger = logging.getLogger(__name__)
+
+
+class _Reranker:
+    """Singleton wrapper around a small CPU cross-encoder.
+
+    Binary-quantized ANN search returns candidates in approximate order; the
+    cross-encoder reads (query, passage) pairs jointly and rescores them.
+    The observed cost per pair is tracked so the stage can shrink or skip
+    itself when it would not fit in the latency budget.
+    """
+
+    def __init__(self):
+        self._model = None
+        self._load_failed = False
+        self._ms_per_pair: Optional[float] = None  # EMA of observed scoring cost
+
+    def _load(self):
+        """Lazy-load the cross-encoder. Loaded at most once."""
+        if self._model is not None or self._load_failed:
+            return
+
+        try:
+            from sentence_transformers import CrossEncoder
+
+            print(f"[Reranker] Loading {RERANK_MODEL_NAME} on CPU...")
+            self._model = CrossEncoder(RERANK_MODEL_NAME, device="cpu")
+            print("[Reranker] Cross-encoder ready.")
+
+        except Exception as e:
+            print(f"[Reranker] ⚠️  Cross-encoder failed to load: {e}")
+            print("[Reranker]    Results will keep their vector search order.")
+            self._load_failed = True
+
+    def _affordable_pairs(self, budget_ms: float) -> Optional[int]:
+        """How many pairs fit in the budget, or None before the first measurement."""
+        if self._ms_per_pair is None:
+            return None
+        return int(budget_ms / max(self._ms_per_pair, 1e-3))
+
+    def _record_cost(self, elapsed_ms: float, n_pairs: int):
+        observed = elapsed_ms / max(n_pairs, 1)
+        if self._ms_per_pair is None:
+            self._ms_per_pair = observed
+        else:
+            self._ms_per_pair = 0.8 * self._ms_per_pair + 0.2 * observed
+
+    def rerank(
+        self,
+        query: str,
+        results: List[Dict],
+        top_n: int,
+        budget_ms: float = RERANK_LATENCY_BUDGET_MS,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
+        """Rescore results with the cross-encoder and return the best top_n.
+
+        Budget handling:
+          - Estimated cost fits              → rescore every candidate
+          - Only part of the list fits       → rescore the leading ANN candidates
+          - Not even top_n candidates fit    → skip, keep vector search order
+        Results without text (nothing for the cross-encoder to read) and
+        candidates past the budget keep their vector search rank; the rescored
+        ones are reordered among the remaining ranks. Each rescored result gets
+        a 'rerank_score'; 'score' stays the vector similarity so
+        RELEVANCE_THRESHOLD keeps its meaning.
+        """
+        self._load()
+        if self._model is None or not results:
+            return results[:top_n]
+
+        candidates = [r for r in results if r.get("content")]
+        affordable = self._affordable_pairs(budget_ms)
+        if affordable is not None and affordable < min(top_n, len(candidates)):
+            logger.info(f"[Reranker] Skipped: ~{self._ms_per_pair * len(candidates):.0f}ms needed, budget {budget_ms:.0f}ms")
+            count("rerank.skipped_budget")
+            return results[:top_n]
+        if affordable is not None:
+            candidates = candidates[:affordable]
+
+        start = time.perf_counter()
+        pairs = [(query, r["content"]) for r in candidates]
+        with compute_stage("rerank"):
+            scores = self._model.predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._record_cost(elapsed_ms, len(pairs))
+
+        if timings is not None:
+            timings["rerank_ms"] = elapsed_ms
+
+        for result, score in zip(candidates, scores):
+            result["rerank_score"] = float(score)
+
+        rescored = iter(sorted(candidates, key=lambda r: r["rerank_score"], reverse=True))
+        rescored_ids = {id(r) for r in candidates}
+        ranked = [next(rescored) if id(r) in rescored_ids else r for r in results]
+        return ranked[:top_n]
+
+
+# Module-level singleton — shared across all calls within a server process
+_reranker = _Reranker()
+
+
+def rerank_results(
+    query: str,
+    results: List[Dict],
+    top_n: int,
+    budget_ms: float = RERANK_LATENCY_BUDGET_MS,
+    timings: Optional[Dict[str, float]] = None
+) -> List[Dict]:
+    """Rerank search results with the shared cross-encoder."""
+    return _reranker.rerank(query, results, top_n, budget_ms=budget_ms, timings=timings)
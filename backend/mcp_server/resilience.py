@@ -0,0 +1,317 @@
+# Resilience for external calls — retries, hedged requests, circuit breakers
+#
+# Every external dependency (Qdrant, Gemini, Tavily) is called through a
+# Dependency, which adds:
+#   - retries with full-jitter exponential backoff for idempotent calls that
+#     failed transiently (timeouts, connection errors, 429/5xx), never past
+#     the request's deadline;
+#   - hedging: when a call is slower than the dependency's recent latency
+#     percentile, an identical request is sent and whichever answers first
+#     wins — this cuts the tail caused by one slow replica or GC pause. The
+#     hedge pool is sized for QUERY_CONCURRENCY queries and never queues: with
+#     no thread free a call simply runs unhedged on the caller's thread;
+#   - a circuit breaker: after CIRCUIT_FAILURE_THRESHOLD consecutive
+#     transient failures calls fail fast for CIRCUIT_RESET_SECONDS, then one
+#     trial call decides whether to close it again.
+#
+# Clock, sleep, randomness and the hedge executor are injectable, so the
+# behaviour can be exercised against local fakes without any network.
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional
+
+from prometheus_client import Gauge
+
+from .config import (
+    MAX_RETRIES, RETRY_BASE_DELAY_MS, RETRY_MAX_DELAY_MS, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS,
+    QDRANT_HEDGE_PERCENTILE, QDRANT_HEDGE_MIN_MS, QUERY_CONCURRENCY
+)
+from .deadlines import current_deadline
+from .telemetry import count, run_in_context
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+CIRCUIT_STATE = Gauge(
+    "deepretrieve_circuit_state", "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)", ["dependency"]
+)
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# Exception types of the client libraries that mean "try again", matched by name
+# so this module doesn't import httpx / qdrant_client / google-genai / tavily
+_TRANSIENT_NAMES = ("Timeout", "ConnectError", "ConnectionError", "TransportError", "ResponseHandlingException", "ServerError")
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a failure is worth retrying: timeouts, dropped connections, 429 and 5xx."""
+    if isinstance(exc, CircuitOpen):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError, OSError)):
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if isinstance(status, int):
+        return status in _TRANSIENT_STATUS
+    return any(name in cls.__name__ for cls in type(exc).__mro__ for name in _TRANSIENT_NAMES)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open after `threshold` failures →
+    half-open after `reset_seconds` (one trial call) → closed on success."""
+
+    def __init__(
+        self, name: str, threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _set(self, state: str):
+        if state != self.state:
+            logger.info(f"🔌 [CIRCUIT] {self.name}: {self.state} → {state}")
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUE[state])
+
+    def retry_in(self) -> float:
+        return max(0.0, self._opened_at + self.reset_seconds - self._clock())
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. In half-open, only one trial call at a time."""
+        with self._lock:
+            if self.state == OPEN and self.retry_in() <= 0:
+                self._set(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            self._set(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self._opened_at = self._clock()
+                self._set(OPEN)
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies (seconds)."""
+
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile, or None until min_samples calls were seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class Dependency:
+    """Calls to one external service, with retries, optional hedging and a circuit breaker."""
+
+    def __init__(
+        self,
+        name: str,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = RETRY_BASE_DELAY_MS / 1000,
+        max_delay: float = RETRY_MAX_DELAY_MS / 1000,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_delay: float = QDRANT_HEDGE_MIN_MS / 1000,
+        breaker: Optional[CircuitBreaker] = None,
+        transient: Callable[[BaseException], bool] = is_transient,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+        rand: Callable[[], float] = random.random,
+        executor: Optional[ThreadPoolExecutor] = None,
+        pool_size: int = 2 * QUERY_CONCURRENCY  # A primary and a backup per query in flight
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker(name, clock=clock)
+        self.latency = LatencyTracker()
+        self._transient = transient
+        self._clock = clock
+        self._sleep = sleep
+        self._rand = rand
+        self._executor = executor
+        self.pool_size = max(1, pool_size)
+        self._busy = 0  # Hedge pool threads reserved by running or pending calls
+        self._busy_lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        return self._rand() * min(self.max_delay, self.base_delay * (2 ** attempt))
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before sending a duplicate request, or None (not enough history / disabled)."""
+        if not self.hedge_percentile:
+            return None
+        p = self.latency.percentile(self.hedge_percentile)
+        return None if p is None else max(self.hedge_min_delay, p)
+
+    def call(
+        self, fn: Callable[..., Any], *args, idempotent: bool = True, hedge: bool = False,
+        max_retries: Optional[int] = None, **kwargs
+    ) -> Any:
+        """Call fn(*args, **kwargs) under this dependency's policies.
+
+        Only idempotent calls are retried or hedged. Retries stop after
+        max_retries (default: the dependency's) or once the backoff would run
+        past the current request's deadline. Raises CircuitOpen without
+        calling fn while the breaker is open.
+        """
+        deadline = current_deadline()
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                count(f"resilience.{self.name}.rejected_open")
+                raise CircuitOpen(
+                    f"{self.name} is unavailable (circuit open, retrying in {self.breaker.retry_in():.0f}s)"
+                )
+            start = self._clock()
+            hedged = hedge and idempotent
+            try:
+                if hedged:
+                    result = self._hedged(fn, args, kwargs)  # Records its own latency
+                else:
+                    result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self._transient(e):
+                    # The service answered (e.g. a 4xx): it's up, the request was wrong
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = self.backoff(attempt)
+                late = deadline is not None and delay >= deadline.remaining()
+                if not idempotent or attempt >= max_retries or late or self.breaker.state == OPEN:
+                    raise
+                attempt += 1
+                count(f"resilience.{self.name}.retry")
+                logger.info(f"🔁 [{self.name.upper()}] {type(e).__name__}: {e} — retry {attempt}/{max_retries} in {delay * 1000:.0f}ms")
+                self._sleep(delay)
+                continue
+            if not hedged:
+                self.latency.record(self._clock() - start)
+            self.breaker.record_success()
+            return result
+
+    def _reserve(self) -> bool:
+        """Claim a hedge pool thread, or False if all are taken (the caller must not queue)."""
+        with self._busy_lock:
+            if self._busy >= self.pool_size:
+                return False
+            self._busy += 1
+            return True
+
+    def _release(self, future: Future):
+        with self._busy_lock:
+            self._busy -= 1
+
+    def _submit(self, fn: Callable[[], Any]) -> Future:
+        """Run fn on a thread reserved with _reserve(); the reservation ends when it finishes or is cancelled."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=f"hedge-{self.name}")
+        future = self._executor.submit(fn)
+        future.add_done_callback(self._release)
+        return future
+
+    def _timed(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """fn(*args, **kwargs), recording its latency on success."""
+        start = self._clock()
+        result = fn(*args, **kwargs)
+        self.latency.record(self._clock() - start)
+        return result
+
+    def _hedged(self, fn: Callable[..., Any], args, kwargs) -> Any:
+        """Run fn; if it outlives the hedge delay, run it again and take the first success.
+
+        The latency recorded is the primary request's own, from when it
+        starts running, even if the backup answers first, so the hedge
+        threshold follows the dependency rather than the hedged result.
+        """
+        delay = self.hedge_delay()
+        if delay is None or not self._reserve():
+            # No latency history yet, or the hedge pool is saturated: don't queue behind it
+            return self._timed(fn, *args, **kwargs)
+
+        primary = self._submit(run_in_context(self._timed, fn, *args, **kwargs))
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._reserve():
+            return primary.result()
+
+        count(f"resilience.{self.name}.hedged")
+        backup = self._submit(run_in_context(fn, *args, **kwargs))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        count(f"resilience.{self.name}.hedge_won")
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "p50_ms": _ms(self.latency.percentile(50)),
+            "p95_ms": _ms(self.latency.percentile(95)),
+            "hedge_after_ms": _ms(self.hedge_delay()),
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+# One per external service, shared by every call in the process
+qdrant = Dependency("qdrant", hedge_percentile=QDRANT_HEDGE_PERCENTILE)
+gemini = Dependency("gemini")
+tavily = Dependency("tavily")
+
+dependencies = {d.name: d for d in (qdrant, gemini, tavily)}
@@ -4,35 +4,81 @@ from typing import List, Dict, Optional
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import Distance, VectorParams, PointStruct, BinaryQuantization, BinaryQuantizationConfig
 
-from .config import QDRANT_URL, QDRANT_API_KEY, COLLECTION_NAME, EMBEDDING_DIM
+from .config import (
+    QDRANT_URL, QDRANT_API_KEY, QDRANT_PATH, COLLECTION_NAME, EMBEDDING_DIM,
+    RERANK_ENABLED, RERANK_CANDIDATES, RERANK_LATENCY_BUDGET_MS
+)
 from .embeddings import embed_text, embed_query, embed_image
+from .namespaces import Namespace, get_namespace, TENANT_FIELD
+from .telemetry import span
+from . import resilience
 
-# Connect to Qdrant immediately
-print(f"Connecting to Qdrant Cloud at {QDRANT_URL}...")
+import math
+import os
 import time
-start = time.time()
 
-_qdrant_client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
-    timeout=10,
-    prefer_grpc=False,
-)
+
+def _connect() -> QdrantClient:
+    if QDRANT_PATH:
+        # Embedded Qdrant (benchmarks, offline runs) — no server needed
+        print(f"Opening embedded Qdrant at {QDRANT_PATH}...")
+        if QDRANT_PATH == ":memory:":
+            return QdrantClient(location=":memory:")
+        return QdrantClient(path=QDRANT_PATH)
+    print(f"Connecting to Qdrant Cloud at {QDRANT_URL}...")
+    return QdrantClient(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+        timeout=10,
+        prefer_grpc=False,
+    )
+
+
+# Connect to Qdrant immediately
+start = time.time()
+_qdrant_client = _connect()
 
 # Test connection
 _qdrant_client.get_collections()
 
 elapsed = time.time() - start
-print(f"✅ Qdrant Cloud connected! ({elapsed:.2f}s)")
+print(f"✅ Qdrant connected! ({elapsed:.2f}s)")
+
+
+def _after_fork():
+    # Pooled HTTP connections must not be shared with the parent; reconnect on first use
+    global _qdrant_client
+    _qdrant_client = None
+
+
+if not QDRANT_PATH and hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# Points of a document that is still being ingested carry pending=True and stay out of search
+_PENDING = models.FieldCondition(key="pending", match=models.MatchValue(value=True))
 
 
 def get_qdrant_client() -> QdrantClient:
     """Get Qdrant client instance"""
+    global _qdrant_client
+    if _qdrant_client is None:
+        _qdrant_client = _connect()
     return _qdrant_client
 
 
-def create_collection(collection_name: str = COLLECTION_NAME, recreate: bool = False):
-    """Create a Qdrant collection with Binary Quantization"""
+def create_collection(
+    collection_name: str = COLLECTION_NAME,
+    recreate: bool = False,
+    shard_number: Optional[int] = None,
+    partitioned: bool = False
+):
+    """Create a Qdrant collection with Binary Quantization
+
+    partitioned collections hold several namespaces: the tenant field gets a
+    tenant index and HNSW links are built per tenant (payload_m) instead of
+    across the whole collection, so a tenant's search never walks others' vectors.
+    """
     client = get_qdrant_client()
     
     if recreate and client.collection_exists(collection_name=collection_name):
@@ -52,43 +98,128 @@ def create_collection(collection_name: str = COLLECTION_NAME, recreate: bool = F
                     always_ram=True
                 )
             ),
+            shard_number=shard_number,
+            hnsw_config=models.HnswConfigDiff(m=0, payload_m=16) if partitioned else None,
         )
-        print(f"Created collection: {collection_name}")
+        print(f"Created collection: {collection_name}" + (" (tenant-partitioned)" if partitioned else ""))
     else:
         print(f"Collection '{collection_name}' already exists")
+    
+    if partitioned:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=TENANT_FIELD,
+            field_schema=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+        )
+    
+    # Indexes for duplicate checks, per-document delete and the pending filter (no-op if present)
+    for field_name, schema in (
+        ("content_hash", models.PayloadSchemaType.KEYWORD),
+        ("doc_id", models.PayloadSchemaType.KEYWORD),
+        ("source", models.PayloadSchemaType.KEYWORD),
+        ("pending", models.PayloadSchemaType.BOOL),
+    ):
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=schema,
+        )
+
+
+# Collections known to exist, so namespace lookups don't cost a round-trip per query
+_ready_collections: set = set()
+
+
+def ensure_namespace(namespace: Optional[str] = None) -> Namespace:
+    """Resolve a namespace and create its collection on first use."""
+    ns = get_namespace(namespace)
+    if ns.collection_name not in _ready_collections:
+        create_collection(ns.collection_name, shard_number=ns.shard_number, partitioned=ns.partitioned)
+        _ready_collections.add(ns.collection_name)
+    return ns
+
+
+def _collection_ready(collection_name: str) -> bool:
+    if collection_name not in _ready_collections:
+        if not get_qdrant_client().collection_exists(collection_name):
+            return False
+        _ready_collections.add(collection_name)
+    return True
+
+
+def _scope(namespace: Optional[str], collection_name: str):
+    """Collection and tenant conditions for a call: the namespace's if given, else collection_name as-is."""
+    if namespace is None:
+        return collection_name, []
+    ns = get_namespace(namespace)
+    if not ns.partitioned:
+        return ns.collection_name, []
+    return ns.collection_name, [models.FieldCondition(key=TENANT_FIELD, match=models.MatchValue(value=ns.name))]
 
 
 def search_similar(
     query: str,
     top_k: int = 5,
     collection_name: str = COLLECTION_NAME,
-    content_type: Optional[str] = None
+    content_type: Optional[str] = None,
+    rerank: Optional[bool] = None,
+    timings: Optional[Dict[str, float]] = None,
+    search_params: Optional[models.SearchParams] = None,
+    namespace: Optional[str] = None,
+    timeout: Optional[float] = None
 ) -> List[Dict]:
-    """Search for similar content in Qdrant"""
+    """Search for similar content in Qdrant
+
+    With rerank enabled (defaults to RERANK_ENABLED), RERANK_CANDIDATES results
+    are over-fetched and rescored by the cross-encoder before the top_k are
+    returned. Pass a dict as timings to receive per-stage durations in ms.
+    search_params overrides HNSW / quantization settings (hnsw_ef, rescore).
+    A namespace restricts the search to that tenant's collection / partition
+    and overrides collection_name; a namespace with nothing ingested yet
+    returns no results. timeout (seconds, e.g. what is left of the request's
+    deadline) bounds the Qdrant search; transient failures are retried and
+    slow searches hedged (see resilience.py).
+    """
     client = get_qdrant_client()
+    if rerank is None:
+        rerank = RERANK_ENABLED
+    stage_timings: Dict[str, float] = {}
+    collection_name, tenant = _scope(namespace, collection_name)
+    if namespace is not None and not _collection_ready(collection_name):
+        return []
     
     # Embed the query
-    query_embedding = embed_query(query)
+    with span("query.embed") as s:
+        query_embedding = embed_query(query)
+    stage_timings["embed_ms"] = s.elapsed_ms
     
-    # Build filter if content type specified
-    query_filter = None
+    # Build filter: tenant partition, hide documents still being ingested, optionally restrict content type
+    must = list(tenant)
     if content_type:
-        query_filter = models.Filter(
-            must=[models.FieldCondition(key="type", match=models.MatchValue(value=content_type))]
-        )
+        must.append(models.FieldCondition(key="type", match=models.MatchValue(value=content_type)))
+    query_filter = models.Filter(must=must or None, must_not=[_PENDING])
     
     # Search using query_points (new API)
-    results = client.query_points(
-        collection_name=collection_name,
-        query=query_embedding,
-        limit=top_k,
-        query_filter=query_filter
-    )
+    # Read-only, so safe to retry on transient errors and to hedge when slow
+    # (not embedded Qdrant: a duplicate would just compete for the same CPU)
+    with span("query.qdrant_search") as s:
+        results = resilience.qdrant.call(
+            client.query_points,
+            hedge=not QDRANT_PATH,
+            collection_name=collection_name,
+            query=query_embedding,
+            limit=max(top_k, RERANK_CANDIDATES) if rerank else top_k,
+            query_filter=query_filter,
+            search_params=search_params,
+            timeout=max(1, math.ceil(timeout)) if timeout is not None else None
+        )
+    stage_timings["search_ms"] = s.elapsed_ms
     
     # Format results
     formatted_results = []
     for result in results.points:
         formatted_results.append({
+            "id": str(result.id),
             "score": result.score,
             "type": result.payload.get("type"),
             "content": result.payload.get("content"),
@@ -96,11 +227,24 @@ def search_similar(
             "source": result.payload.get("source"),
             "page": result.payload.get("page"),
             "path": result.payload.get("path"),
+            "thumbnail_path": result.payload.get("thumbnail_path"),
             "json_path": result.payload.get("json_path"),
             "headers": result.payload.get("headers"),
             "table_index": result.payload.get("table_index")
         })
     
+    # Optional cross-encoder rerank
+    if rerank:
+        from .reranker import rerank_results
+        with span("query.rerank"):
+            formatted_results = rerank_results(
+                query, formatted_results, top_k,
+                budget_ms=RERANK_LATENCY_BUDGET_MS, timings=stage_timings
+            )
+    
+    if timings is not None:
+        timings.update(stage_timings)
+    
     return formatted_results
 
 
@@ -140,17 +284,116 @@ def search_by_image(
     return formatted_results
 
 
-def get_collection_info(collection_name: str = COLLECTION_NAME) -> Dict:
-    """Get information about the collection"""
+def find_document_by_hash(
+    content_hash: str, collection_name: str = COLLECTION_NAME, namespace: Optional[str] = None
+) -> Optional[Dict]:
+    """Return the payload of one point from an already-ingested file with this SHA-256, if any"""
+    client = get_qdrant_client()
+    collection_name, tenant = _scope(namespace, collection_name)
+    if namespace is not None and not _collection_ready(collection_name):
+        return None
+    points, _ = client.scroll(
+        collection_name=collection_name,
+        scroll_filter=models.Filter(
+            must=tenant + [models.FieldCondition(key="content_hash", match=models.MatchValue(value=content_hash))],
+            must_not=[_PENDING]
+        ),
+        limit=1,
+        with_payload=True,
+        with_vectors=False,
+    )
+    return points[0].payload if points else None
+
+
+def _match(key: str, value: str, tenant: Optional[List] = None) -> models.Filter:
+    return models.Filter(must=(tenant or []) + [models.FieldCondition(key=key, match=models.MatchValue(value=value))])
+
+
+def publish_document(
+    doc_id: str, replaces: Optional[str] = None,
+    collection_name: str = COLLECTION_NAME, namespace: Optional[str] = None
+):
+    """Make a document's pending points searchable and drop the version it replaces.
+
+    Both operations go to Qdrant as one batch request, so searches see either
+    the old version or the new one, not a gap between them.
+    """
+    client = get_qdrant_client()
+    collection_name, tenant = _scope(namespace, collection_name)
+    operations = [
+        models.SetPayloadOperation(
+            set_payload=models.SetPayload(payload={"pending": False}, filter=_match("doc_id", doc_id, tenant))
+        )
+    ]
+    if replaces:
+        operations.append(
+            models.DeleteOperation(delete=models.FilterSelector(filter=_match("doc_id", replaces, tenant)))
+        )
+    client.batch_update_points(collection_name=collection_name, update_operations=operations, wait=True)
+
+
+def delete_points(
+    key: str, value: str, collection_name: str = COLLECTION_NAME, namespace: Optional[str] = None,
+    skip_pending: bool = False
+) -> int:
+    """Delete every point whose payload `key` equals value (e.g. doc_id or source). Returns how many.
+
+    skip_pending leaves the points of documents still being ingested alone.
+    """
+    client = get_qdrant_client()
+    collection_name, tenant = _scope(namespace, collection_name)
+    if not client.collection_exists(collection_name):
+        return 0
+    point_filter = _match(key, value, tenant)
+    if skip_pending:
+        point_filter.must_not = [_PENDING]
+    matched = client.count(collection_name=collection_name, count_filter=point_filter, exact=True).count
+    if matched:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(filter=point_filter),
+            wait=True,
+        )
+    return matched
+
+
+def drop_namespace(namespace: str):
+    """Delete all of a namespace's points: its partition of the shared collection, or its whole collection."""
+    client = get_qdrant_client()
+    ns = get_namespace(namespace)
+    if ns.partitioned:
+        if client.collection_exists(ns.collection_name):
+            client.delete(
+                collection_name=ns.collection_name,
+                points_selector=models.FilterSelector(filter=_match(TENANT_FIELD, ns.name)),
+                wait=True,
+            )
+    elif client.collection_exists(ns.collection_name):
+        client.delete_collection(ns.collection_name)
+        _ready_collections.discard(ns.collection_name)
+
+
+def get_collection_info(collection_name: str = COLLECTION_NAME, namespace: Optional[str] = None) -> Dict:
+    """Get information about the collection (or a namespace's share of it)"""
     client = get_qdrant_client()
+    collection_name, tenant = _scope(namespace, collection_name)
     
     if not client.collection_exists(collection_name):
         return {"exists": False, "message": f"Collection '{collection_name}' does not exist"}
     
     info = client.get_collection(collection_name)
-    return {
+    result = {
         "exists": True,
         "points_count": info.points_count,
         "indexed_vectors_count": getattr(info, 'indexed_vectors_count', None),
         "status": str(info.status)
     }
+    if namespace is not None:
+        result.update(get_namespace(namespace).describe())
+    if tenant:
+        # Shared collection: report this tenant's points only
+        result["points_count"] = client.count(
+            collection_name=collection_name, count_filter=models.Filter(must=tenant), exact=True
+        ).count
+        result["indexed_vectors_count"] = None
+    return result
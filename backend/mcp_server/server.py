@@ -8,6 +8,7 @@ from .config import COLLECTION_NAME, TOP_K, RELEVANCE_THRESHOLD
 from .retriever import search_similar, get_collection_info
 from .web_search import web_search, format_web_results_as_context
 from .llm import prepare_context_from_results, generate_response, check_context_relevance
+from .profiling import profiled
 
 
 # Initialize FastMCP server
@@ -29,10 +30,13 @@ mcp = FastMCP(
 
 
 @mcp.tool()
+@profiled("mcp.rag_retrieve")
 def rag_retrieve(
     query: str,
     top_k: int = TOP_K,
-    content_type: Optional[str] = None
+    content_type: Optional[str] = None,
+    rerank: Optional[bool] = None,
+    namespace: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Search the multimodal RAG vector database for relevant content.
@@ -41,17 +45,23 @@ def rag_retrieve(
         query: The search query (natural language question)
         top_k: Number of results to return (default: 5)
         content_type: Filter by type - "text", "image", or "table" (optional)
+        rerank: Rescore candidates with the cross-encoder (default: RERANK_ENABLED)
+        namespace: Tenant namespace to search (default namespace if omitted)
     
     Returns:
         Dictionary with search results, relevance info, and formatted context
     """
-    print(f"🔍 [TOOL CALL] rag_retrieve | query: '{query}' | top_k: {top_k}")
+    print(f"🔍 [TOOL CALL] rag_retrieve | query: '{query}' | top_k: {top_k} | namespace: {namespace or 'default'}")
     
     # Search the vector database
+    timings: Dict[str, float] = {}
     results = search_similar(
         query=query,
         top_k=top_k,
-        content_type=content_type
+        content_type=content_type,
+        rerank=rerank,
+        timings=timings,
+        namespace=namespace
     )
     
     # Check relevance
@@ -72,11 +82,13 @@ def rag_retrieve(
         "average_score": avg_score,
         "relevance_threshold": RELEVANCE_THRESHOLD,
         "context": context,
+        "timings_ms": timings,
         "suggestion": None if is_relevant else "Consider using web_search for additional context"
     }
 
 
 @mcp.tool()
+@profiled("mcp.fallback_web_search")
 def fallback_web_search(
     query: str,
     max_results: int = 5
@@ -115,10 +127,12 @@ def fallback_web_search(
 
 
 @mcp.tool()
+@profiled("mcp.hybrid_search")
 def hybrid_search(
     query: str,
     top_k: int = TOP_K,
-    web_fallback: bool = True
+    web_fallback: bool = True,
+    namespace: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Intelligent hybrid search that combines RAG and web search.
@@ -128,6 +142,7 @@ def hybrid_search(
         query: The search query
         top_k: Number of RAG results to retrieve
         web_fallback: Whether to use web search as fallback (default: True)
+        namespace: Tenant namespace to search (default namespace if omitted)
     
     Returns:
         Combined results from RAG and optionally web search
@@ -135,7 +150,7 @@ def hybrid_search(
     print(f"🔀 [TOOL CALL] hybrid_search | query: '{query}' | top_k: {top_k} | fallback: {web_fallback}")
     
     # First, try RAG retrieval
-    rag_results = rag_retrieve(query=query, top_k=top_k)
+    rag_results = rag_retrieve(query=query, top_k=top_k, namespace=namespace)
     
     combined = {
         "query": query,
@@ -165,6 +180,7 @@ Web Context:
 
 
 @mcp.tool()
+@profiled("mcp.generate_answer")
 def generate_answer(
     query: str,
     context: str,
@@ -197,19 +213,24 @@ Use the context to answer the question accurately and comprehensively."""
 
 
 @mcp.tool()
-def get_knowledge_base_info() -> Dict[str, Any]:
+def get_knowledge_base_info(namespace: Optional[str] = None) -> Dict[str, Any]:
     """
     Get information about the knowledge base (vector database).
     
+    Args:
+        namespace: Tenant namespace to describe (default namespace if omitted)
+    
     Returns:
         Dictionary with collection statistics
     """
-    print("📊 [TOOL CALL] get_knowledge_base_info")
-    return get_collection_info()
+    print(f"📊 [TOOL CALL] get_knowledge_base_info | namespace: {namespace or 'default'}")
+    return get_collection_info(namespace=namespace)
 
 
 def run_server():
     """Run the MCP server"""
+    from .telemetry import configure_logging
+    configure_logging()
     print("Starting DeepRetrieve MCP Server...")
     mcp.run()
 
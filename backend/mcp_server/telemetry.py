@@ -0,0 +1,150 @@
+# Timing spans, Prometheus metrics and request-scoped log context
+
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Optional, Tuple
+
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Request ID for the current request/job — copied into executor threads via run_in_context
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+logger = logging.getLogger("deepretrieve")
+
+STAGE_SECONDS = Histogram(
+    "deepretrieve_stage_seconds",
+    "Wall time of query and ingestion pipeline stages",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+STAGE_ERRORS = Counter(
+    "deepretrieve_stage_errors_total",
+    "Pipeline stages that raised",
+    ["stage"],
+)
+EVENTS = Counter(
+    "deepretrieve_events_total",
+    "Counted pipeline events (pages, chunks, cache hits, prefetch hits, ...)",
+    ["event"],
+)
+
+
+class Span:
+    """Result handle of a span; elapsed_ms is set when the block exits."""
+
+    __slots__ = ("stage", "elapsed_ms")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.elapsed_ms = 0.0
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as `stage`: observed in the histogram and logged with the request ID."""
+    result = Span(stage)
+    start = time.perf_counter()
+    try:
+        yield result
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        result.elapsed_ms = elapsed * 1000
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        logger.info("⏱️  %s %.1fms", stage, result.elapsed_ms)
+
+
+def observe(stage: str, seconds: float):
+    """Record a duration measured elsewhere (e.g. gaps between agent tool calls)."""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    logger.info("⏱️  %s %.1fms", stage, seconds * 1000)
+
+
+class TurnTimer:
+    """Times model turns in an automatic function-calling loop.
+
+    The SDK runs the whole loop inside one call, so a turn is measured as the
+    gap between the previous tool returning (or the start) and the next tool
+    being called (or the end).
+    """
+
+    def __init__(self, stage: str = "query.llm_turn"):
+        self.stage = stage
+        self._mark = time.perf_counter()
+
+    def tool_started(self):
+        observe(self.stage, time.perf_counter() - self._mark)
+
+    def tool_finished(self):
+        self._mark = time.perf_counter()
+
+    def finish(self):
+        self.tool_started()
+
+
+def agent_tool(fn: Callable, stage: str, turns: Optional[TurnTimer] = None) -> Callable:
+    """Wrap an agent tool function with a span, keeping the signature and docstring
+    the SDK reads to build the function declaration."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if turns is not None:
+            turns.tool_started()
+        try:
+            with span(stage):
+                return fn(*args, **kwargs)
+        finally:
+            if turns is not None:
+                turns.tool_finished()
+    return wrapper
+
+
+def count(event: str, amount: float = 1):
+    if amount:
+        EVENTS.labels(event).inc(amount)
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Use the caller's request ID if it looks sane, else mint one; bind it to this context."""
+    request_id = incoming if incoming and len(incoming) <= 128 else uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    return request_id
+
+
+def run_in_context(fn: Callable, *args, **kwargs) -> Callable[[], object]:
+    """Wrap fn so it runs in a copy of the caller's context (request ID, profile) on another thread."""
+    ctx = contextvars.copy_context()
+
+    def run():
+        from .profiling import profile_thread
+        with profile_thread():
+            return fn(*args, **kwargs)
+    return lambda: ctx.run(run)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def configure_logging(level: int = logging.INFO):
+    """Log as `time level [request_id] logger: message`. Safe to call more than once."""
+    root = logging.getLogger()
+    if any(isinstance(f, RequestIdFilter) for h in root.handlers for f in h.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Prometheus text exposition of all registered metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,122 @@
+# Compact tool results for the agent loop
+#
+# Whatever a tool returns is serialized into the conversation and re-read on
+# every later turn. Raw search_similar results carry full chunk text, base64
+# images, file paths and table headers, and Tavily results carry whole page
+# extracts. The agent tools instead return short IDs, type, score, location
+# and a trimmed snippet, within a total token budget; the full text of any
+# result stays in a per-request ResultSet, and the model fetches it by ID only
+# when a snippet isn't enough.
+
+import itertools
+from typing import Any, Dict, List, Optional
+
+from .config import TOOL_RESULT_MAX_TOKENS, TOOL_SNIPPET_CHARS, TOOL_FETCH_MAX_CHARS
+
+_CHARS_PER_TOKEN = 4  # Rough size of a token in English text and JSON
+_MIN_SNIPPET_CHARS = 80  # Below this a snippet says nothing useful; list the ID only
+
+
+def approx_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+def trim(text: Optional[str], max_chars: int) -> str:
+    """Collapse whitespace and cut text at a word boundary, marking the cut with '…'."""
+    text = " ".join((text or "").split())
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars] + "…"
+
+
+def _location(item: Dict[str, Any]) -> Optional[str]:
+    if item.get("url"):
+        return item["url"]
+    if not item.get("source"):
+        return None
+    location = item["source"]
+    if item.get("page") is not None:
+        location += f" p.{item['page']}"
+    if item.get("table_index") is not None:
+        location += f" table {item['table_index']}"
+    return location
+
+
+class ResultSet:
+    """Full tool results of one agent request, addressable by short ID (r1, r2, w1, ...)."""
+
+    def __init__(
+        self,
+        max_tokens: int = TOOL_RESULT_MAX_TOKENS,
+        snippet_chars: int = TOOL_SNIPPET_CHARS,
+        fetch_max_chars: int = TOOL_FETCH_MAX_CHARS
+    ):
+        self.max_tokens = max_tokens
+        self.snippet_chars = snippet_chars
+        self.fetch_max_chars = fetch_max_chars
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._ids = {"r": itertools.count(1), "w": itertools.count(1)}
+
+    def _add(self, prefix: str, item: Dict[str, Any]) -> str:
+        result_id = f"{prefix}{next(self._ids[prefix])}"
+        self._items[result_id] = item
+        return result_id
+
+    def _compact(self, prefix: str, items: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """One entry per item; snippets shrink, then disappear, as the token budget runs out."""
+        entries = []
+        remaining = budget
+        for n, item in enumerate(items):
+            entry = {
+                "id": self._add(prefix, item),
+                "type": item.get("type") or "web",
+                "score": round(float(item.get("score") or 0), 3),
+                "location": _location(item),
+            }
+            if item.get("title"):
+                entry["title"] = trim(item["title"], 120)
+            remaining -= approx_tokens(str(entry))
+            # Spread what's left over the items still to come
+            share = remaining * _CHARS_PER_TOKEN // max(len(items) - n, 1)
+            max_chars = min(self.snippet_chars, share)
+            if max_chars >= _MIN_SNIPPET_CHARS and item.get("content"):
+                entry["content"] = trim(item.get("content"), max_chars)
+                remaining -= approx_tokens(entry["content"])
+            entries.append(entry)
+        return entries
+
+    def compact_rag(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Tool result for rag_retrieve: no base64 images, paths or table headers.
+
+        Hits without text (e.g. an image without a caption) are kept as ID and
+        location only, so the model sees every result it asked for.
+        """
+        entries = self._compact("r", results, self.max_tokens)
+        return {
+            "results": entries,
+            "note": "Snippets are trimmed; call fetch_result_func with a result ID for its full content.",
+        }
+
+    def compact_web(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Tool result for web_search: the summary answer plus compact hits."""
+        if not result.get("success"):
+            return {"success": False, "error": result.get("error", "Web search failed")}
+        answer = trim(result.get("answer"), self.snippet_chars) if result.get("answer") else None
+        budget = self.max_tokens - (approx_tokens(answer) if answer else 0)
+        hits = [dict(r, type="web") for r in result.get("results") or []]
+        return {"success": True, "answer": answer, "results": self._compact("w", hits, budget)}
+
+    def fetch(self, result_id: str) -> Dict[str, Any]:
+        """Full content of one result (bounded by fetch_max_chars)."""
+        item = self._items.get(result_id.strip())
+        if item is None:
+            return {"error": f"Unknown result ID '{result_id}'. Use an ID from rag_retrieve or web_search results."}
+        content = item.get("content") or ""
+        return {
+            "id": result_id.strip(),
+            "type": item.get("type") or "web",
+            "location": _location(item),
+            # Keep line breaks: tables and lists are fetched to be read in full
+            "content": content if len(content) <= self.fetch_max_chars else content[:self.fetch_max_chars] + "…",
+        }
@@ -1,18 +1,39 @@
 # Web search fallback using Tavily API
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
-from tavily import TavilyClient
+import math
 
-from .config import TAVILY_API_KEY
+from .config import TAVILY_API_KEY, WEB_SEARCH_PROVIDER
+from .telemetry import span
+from . import resilience
 
-# Initialize Tavily immediately
-print("Initializing Tavily client...")
-_tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
-print("✅ Tavily client ready!")
+
+def _tavily():
+    from tavily import TavilyClient
+    return TavilyClient(api_key=TAVILY_API_KEY)
+
+
+def _fake():
+    from .fakes import FakeTavilyClient
+    return FakeTavilyClient()
+
+
+# Web search providers: anything with TavilyClient.search(query, max_results, search_depth, include_answer, timeout)
+WEB_SEARCH_PROVIDERS = {"tavily": _tavily, "fake": _fake}
+
+if WEB_SEARCH_PROVIDER not in WEB_SEARCH_PROVIDERS:
+    raise ValueError(
+        f"Unknown WEB_SEARCH_PROVIDER '{WEB_SEARCH_PROVIDER}' (expected one of: {', '.join(WEB_SEARCH_PROVIDERS)})"
+    )
+
+# Initialize the web search client immediately
+print(f"Initializing web search ({WEB_SEARCH_PROVIDER})...")
+_tavily_client = WEB_SEARCH_PROVIDERS[WEB_SEARCH_PROVIDER]()
+print("✅ Web search client ready!")
 
 
 def get_tavily_client():
-    """Get Tavily client instance"""
+    """Get the web search client instance (Tavily, or the local fake with WEB_SEARCH_PROVIDER=fake)"""
     return _tavily_client
 
 
@@ -20,7 +41,8 @@ def web_search(
     query: str,
     max_results: int = 5,
     search_depth: str = "basic",
-    include_answer: bool = True
+    include_answer: bool = True,
+    timeout: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Perform web search using Tavily API
@@ -30,18 +52,22 @@ def web_search(
         max_results: Maximum number of results to return
         search_depth: "basic" or "advanced"
         include_answer: Whether to include AI-generated answer
+        timeout: Seconds to wait for Tavily (default: the client's own timeout)
     
     Returns:
         Dictionary with search results and optional answer
     """
     client = get_tavily_client()
     
-    response = client.search(
-        query=query,
-        max_results=max_results,
-        search_depth=search_depth,
-        include_answer=include_answer
-    )
+    with span("web.search"):
+        response = resilience.tavily.call(
+            client.search,
+            query=query,
+            max_results=max_results,
+            search_depth=search_depth,
+            include_answer=include_answer,
+            **({"timeout": max(1, math.ceil(timeout))} if timeout is not None else {})
+        )
     
     results = []
     for result in response.get("results", []):
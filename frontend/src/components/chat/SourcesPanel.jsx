@@ -160,6 +160,17 @@ function SourceCard({ source, index, onOpenImage }) {
                 </div>
             </div>
 
+            {/* Thumbnail for image sources — full image opens in the modal */}
+            {source.thumbnail_url && (
+                <img
+                    src={source.thumbnail_url}
+                    alt=""
+                    loading="lazy"
+                    onClick={(e) => { e.stopPropagation(); onOpenImage(source.image_url || source.thumbnail_url); }}
+                    className="mt-2 max-h-24 rounded border border-white/5 object-contain cursor-zoom-in"
+                />
+            )}
+
             {/* Collapsed preview */}
             {!expanded && (
                 <p className="text-xs text-slate-500 mt-2 line-clamp-2 leading-relaxed">
@@ -93,27 +93,8 @@ function Upload() {
     setUploadProgress(0)
     setUploadStatus('Connecting to backend...')
     
-    // Open Server-Sent Events stream for progress
-    const eventSource = new EventSource(`${API_BASE_URL}/api/v1/upload-progress/${encodeURIComponent(file.name)}`)
-    
-    eventSource.onmessage = (event) => {
-      try {
-        const data = JSON.parse(event.data)
-        if (data.status) setUploadStatus(data.status)
-        if (data.progress !== undefined) setUploadProgress(data.progress)
-        
-        if (data.progress >= 100 || (data.status && data.status.includes('Error'))) {
-          eventSource.close()
-        }
-      } catch (err) {
-        console.error("Error parsing progress SSE", err)
-      }
-    }
-    
-    eventSource.onerror = () => {
-      eventSource.close()
-    }
-    
+    let eventSource = null
+
     try {
       const formData = new FormData()
       formData.append('file', file)
@@ -128,8 +109,40 @@ function Upload() {
         throw new Error(error.detail || 'Upload failed')
       }
       
-      const result = await response.json()
-      eventSource.close()
+      // Upload is queued — follow the ingestion job until it finishes.
+      // An identical file that was already ingested comes back without a job.
+      const { job_id, duplicate } = await response.json()
+      setUploadStatus(duplicate ? 'Document already processed' : 'Queued for processing...')
+
+      if (job_id) await new Promise((resolve, reject) => {
+        eventSource = new EventSource(`${API_BASE_URL}/api/v1/jobs/${job_id}/progress`)
+
+        eventSource.onmessage = (event) => {
+          try {
+            const data = JSON.parse(event.data)
+            if (data.status) setUploadStatus(data.status)
+            if (data.progress !== undefined) setUploadProgress(data.progress)
+
+            if (data.state === 'completed') {
+              resolve()
+            } else if (data.state === 'failed' || data.state === 'cancelled') {
+              reject(new Error(data.status || 'Processing failed'))
+            }
+          } catch (err) {
+            console.error("Error parsing progress SSE", err)
+          }
+        }
+
+        eventSource.onerror = () => {
+          // A dropped connection is retried by the browser, resuming with Last-Event-ID;
+          // only give up once it stops trying
+          if (eventSource.readyState === EventSource.CLOSED) {
+            reject(new Error('Lost connection to progress stream'))
+          }
+        }
+      })
+      // Duplicates and unchanged files come back without a job, so there is no stream to close
+      if (eventSource) eventSource.close()
       
       // Store filename in localStorage for chat page
       localStorage.setItem('uploadedPdfName', file.name)
@@ -140,7 +153,7 @@ function Upload() {
       console.error('Upload error:', error)
       setUploadError(error.message)
       setUploading(false)
-      eventSource.close()
+      if (eventSource) eventSource.close()
     }
   }
 